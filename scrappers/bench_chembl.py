@@ -0,0 +1,175 @@
+import argparse
+import asyncio
+import contextlib
+import io
+import time
+import aiohttp
+from aiohttp import web
+
+import chembl_scrapper
+
+# Local stand-in for the ChEMBL REST endpoints used by chembl_scrapper, with fixed per-request latency.
+
+
+def chembl_id(i):
+    return f"CHEMBL{1000 + i}"
+
+
+def make_molecule(i):
+    return {
+        "molecule_chembl_id": chembl_id(i),
+        "pref_name": f"DRUG{i}",
+        "max_phase": 4,
+        "molecule_type": "Small molecule",
+        "molecule_synonyms": [{"molecule_synonym": f"Drug{i} Hydrochloride"}],
+        "molecule_properties": {"full_mwt": "300.5", "alogp": "2.1", "full_molformula": "C10H12N2O"},
+        "molecule_structures": {"canonical_smiles": "CCO", "standard_inchi_key": f"KEY{i:010d}"},
+    }
+
+
+def make_app(n_molecules, activities, latency):
+    requests = {"count": 0}
+
+    async def delay():
+        requests["count"] += 1
+        await asyncio.sleep(latency)
+
+    def index(name):
+        return int(name.replace("CHEMBL", "")) - 1000
+
+    async def molecule(request):
+        await delay()
+        name = request.match_info["name"]
+        if name == "search":
+            i = int(request.query["q"].replace("Drug", ""))
+            return web.json_response({"molecules": [make_molecule(i)]})
+        if name.endswith(".svg"):
+            return web.Response(text=f"<svg>{name}</svg>", content_type="image/svg+xml")
+        return web.json_response(make_molecule(index(name.removesuffix(".json"))))
+
+    async def drug(request):
+        await delay()
+        return web.json_response({"molecule_chembl_id": request.match_info["name"].removesuffix(".json")})
+
+    def page(key, records, request):
+        offset = int(request.query.get("offset", 0))
+        limit = int(request.query.get("limit", 20))
+        more = offset + limit < len(records)
+        meta = {"total_count": len(records), "offset": offset, "next": "more" if more else None}
+        return web.json_response({key: records[offset:offset + limit], "page_meta": meta})
+
+    def requested_ids(request):
+        if "molecule_chembl_id__in" in request.query:
+            return request.query["molecule_chembl_id__in"].split(",")
+        return [request.query["molecule_chembl_id"]]
+
+    async def mechanism(request):
+        await delay()
+        records = [{"molecule_chembl_id": cid, "action_type": "INHIBITOR"} for cid in requested_ids(request)]
+        return page("mechanisms", records, request)
+
+    async def molecule_list(request):
+        await delay()
+        return page("molecules", [make_molecule(index(cid)) for cid in requested_ids(request)], request)
+
+    async def drug_list(request):
+        await delay()
+        return page("drugs", [{"molecule_chembl_id": cid} for cid in requested_ids(request)], request)
+
+    async def activity(request):
+        await delay()
+        cid = request.query["molecule_chembl_id"]
+        offset = int(request.query.get("offset", 0))
+        limit = int(request.query.get("limit", 20))
+        rows = [{"activity_id": index(cid) * 10**6 + n, "molecule_chembl_id": cid, "standard_value": "1.0"}
+                for n in range(offset, min(offset + limit, activities))]
+        return web.json_response({"activities": rows, "page_meta": {"total_count": activities, "offset": offset}})
+
+    app = web.Application()
+    app.router.add_get("/molecule/{name}", molecule)
+    app.router.add_get("/drug/{name}", drug)
+    app.router.add_get("/mechanism", mechanism)
+    app.router.add_get("/mechanism.json", mechanism)
+    app.router.add_get("/molecule.json", molecule_list)
+    app.router.add_get("/drug.json", drug_list)
+    app.router.add_get("/activity", activity)
+    return app, requests
+
+
+@contextlib.asynccontextmanager
+async def stub_server(n_molecules, activities, latency):
+    app, requests = make_app(n_molecules, activities, latency)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    old_base = chembl_scrapper.BASE
+    chembl_scrapper.BASE = f"http://127.0.0.1:{port}"
+    try:
+        yield requests
+    finally:
+        chembl_scrapper.BASE = old_base
+        await runner.cleanup()
+
+
+class NullWriter:
+    rows_written = 0
+
+    def write_rows(self, rows):
+        self.rows_written += len(rows)
+
+
+async def process_drug_sequential(session, drug_name, sem, writer):
+    """The pre-pipeline flow: every call awaited in turn while holding one global slot."""
+    cs = chembl_scrapper
+    async with sem:
+        cid = await cs.get_chembl_id(session, drug_name)
+        molecule = await cs.fetch(session, f"{cs.BASE}/molecule/{cid}.json")
+        drug = await cs.fetch(session, f"{cs.BASE}/drug/{cid}.json")
+        mech = await cs.fetch(session, f"{cs.BASE}/mechanism", {"molecule_chembl_id": cid})
+        act = await cs.fetch(session, f"{cs.BASE}/activity", {"molecule_chembl_id": cid, "limit": cs.ACTIVITY_PAGE_SIZE})
+        svg = await cs.fetch_image_svg(session, cid)
+        writer.write_rows(act.get("activities", []))
+        return {"drug_name": drug_name, "chembl_id": cid, "molecule": molecule, "drug": drug,
+                "mechanism": mech.get("mechanisms", []), "structure_svg": svg}
+
+
+async def timed(label, drugs, requests, run_all):
+    writer = NullWriter()
+    before = requests["count"]
+    started = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        async with aiohttp.ClientSession() as session:
+            records = await run_all(session, writer)
+    elapsed = time.perf_counter() - started
+    print(f"{label:>10}: {len(records)} drugs in {elapsed:.2f}s ({elapsed / len(records) * 1000:.0f} ms/drug amortised, "
+          f"{requests['count'] - before} requests, {writer.rows_written} activities)")
+    return records, elapsed
+
+
+async def run(n_drugs, activities, latency):
+    drugs = [f"Drug{i}" for i in range(n_drugs)]
+    cs = chembl_scrapper
+    async with stub_server(n_drugs, activities, latency) as requests:
+        sem = asyncio.Semaphore(cs.CONCURRENCY)
+        old, t_old = await timed("sequential", drugs, requests, lambda s, w: asyncio.gather(
+            *(process_drug_sequential(s, d, sem, w) for d in drugs)))
+        sems = cs.endpoint_semaphores()
+        new, t_new = await timed("pipelined", drugs, requests, lambda s, w: asyncio.gather(
+            *(cs.process_drug(s, d, sems, w) for d in drugs)))
+        sems = cs.endpoint_semaphores()
+        batched, t_batch = await timed("batched", drugs, requests, lambda s, w: cs.process_drugs_batched(
+            s, drugs, sems, w))
+    assert [r["chembl_id"] for r in old] == [r["chembl_id"] for r in new]
+    assert [cs.flatten_record(r) for r in new] == [cs.flatten_record(r) for r in batched]
+    print(f"speedup: pipelined {t_old / t_new:.1f}x, batched {t_old / t_batch:.1f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--drugs", type=int, default=110)
+    parser.add_argument("--activities", type=int, default=800)
+    parser.add_argument("--latency", type=float, default=0.05)
+    args = parser.parse_args()
+    asyncio.run(run(args.drugs, args.activities, args.latency))
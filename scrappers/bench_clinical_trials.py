@@ -0,0 +1,90 @@
+import argparse
+import asyncio
+import contextlib
+import io
+import time
+import tracemalloc
+from aiohttp import web
+
+import clinical_trials
+
+# Local stand-in for https://clinicaltrials.gov/api/v2/studies with paged results and fixed latency.
+
+
+def make_study(drug, n):
+    return {
+        "protocolSection": {
+            "identificationModule": {"nctId": f"NCT-{drug}-{n:05d}", "officialTitle": f"{drug} study {n}"},
+            "statusModule": {"overallStatus": "COMPLETED", "startDateStruct": {"date": "2020-01"}},
+            "armsInterventionsModule": {"interventions": [{"interventionName": drug, "interventionType": "DRUG"}]},
+            "conditionsModule": {"conditions": ["Condition A", "Condition B"]},
+        }
+    }
+
+
+class CollectingWriter:
+    def __init__(self):
+        self.ids = set()
+        self.rows_written = 0
+
+    def write_rows(self, rows):
+        self.ids.update(r["NCTId"] for r in rows)
+        self.rows_written += len(rows)
+
+
+def make_app(studies_per_drug, latency):
+    async def studies(request):
+        await asyncio.sleep(latency)
+        drug = request.query["query.term"]
+        size = int(request.query.get("pageSize", 100))
+        offset = int(request.query.get("pageToken", 0))
+        end = min(offset + size, studies_per_drug)
+        body = {"studies": [make_study(drug, n) for n in range(offset, end)]}
+        if end < studies_per_drug:
+            body["nextPageToken"] = str(end)
+        return web.json_response(body)
+
+    app = web.Application()
+    app.router.add_get("/api/v2/studies", studies)
+    return app
+
+
+async def run(drugs, studies_per_drug, latency, concurrency, rate):
+    runner = web.AppRunner(make_app(studies_per_drug, latency))
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    base_url = f"http://127.0.0.1:{port}/api/v2/studies"
+    names = [f"Drug{i}" for i in range(drugs)]
+    writer = CollectingWriter()
+    try:
+        tracemalloc.start()
+        started = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            await clinical_trials.fetch_all(names, writer, base_url=base_url, concurrency=concurrency, rate=rate)
+        elapsed = time.perf_counter() - started
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    finally:
+        await runner.cleanup()
+
+    expected = drugs * studies_per_drug
+    assert writer.rows_written == expected, f"expected {expected} rows, got {writer.rows_written}"
+    assert len(writer.ids) == expected, "duplicate NCTIds across pages"
+    pages = drugs * -(-studies_per_drug // clinical_trials.PAGE_SIZE)
+    serial = pages * (latency + 0.5)
+    print(f"concurrency={concurrency}: {writer.rows_written} studies, {pages} pages in {elapsed:.2f}s "
+          f"({writer.rows_written / elapsed:.0f} studies/sec); serial loop estimate {serial:.1f}s; "
+          f"peak traced memory {peak / 2**20:.1f} MiB")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--drugs", type=int, default=40)
+    parser.add_argument("--studies", type=int, default=350)
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument("--concurrency", type=int, default=clinical_trials.CONCURRENCY)
+    parser.add_argument("--rate", type=float, default=1000)
+    args = parser.parse_args()
+    asyncio.run(run(args.drugs, args.studies, args.latency, args.concurrency, args.rate))
@@ -0,0 +1,194 @@
+import argparse
+import asyncio
+import contextlib
+import logging
+import tempfile
+import time
+from aiohttp import web
+
+from drug_list import load_drug_names
+
+fda = __import__("scrapper_drugs@fda_full_100")
+
+# Local stand-in for the Drugs@FDA browseByLetter / overview / drugDetails pages, with fixed latency.
+
+PAGE_PATH = "/scripts/cder/daf/index.cfm"
+FILLERS_PER_LETTER = 30
+VERSIONS_PER_DRUG = 3
+
+
+def fixture_drugs():
+    """(letter, name, appl_no) for every target drug plus non-matching filler entries."""
+    names = [n.upper() for n in load_drug_names()]
+    drugs = [(n[0], n, f"{20000 + i:06d}") for i, n in enumerate(names) if n[0].isalpha()]
+    for letter in fda.LETTERS:
+        for j in range(FILLERS_PER_LETTER):
+            drugs.append((letter, f"{letter}ZZFILLER{j} TABLETS", f"{90000 + ord(letter) * 100 + j:06d}"))
+    return drugs
+
+
+def table(header, rows):
+    head = "".join(f"<th>{h}</th>" for h in header)
+    body = "".join("<tr>" + "".join(f"<td>{c}</td>" for c in row) + "</tr>" for row in rows)
+    return f"<table><tr>{head}</tr>{body}</table>"
+
+
+def letter_page(letter, drugs):
+    links = [[f'<a href="{PAGE_PATH}?event=overview.process&ApplNo={appl}">{name}</a>', appl]
+             for l, name, appl in drugs if l == letter]
+    return f"<html><body><h1>{letter}</h1>{table(['Drug Name', 'Application'], links)}</body></html>"
+
+
+def overview_page(name, appl):
+    products = table(["Drug Name", "Active Ingredients", "Strength", "Dosage Form/Route", "Marketing Status"],
+                     [[name, name.split()[0], f"{5 * k} MG", "TABLET;ORAL", "Prescription"] for k in range(1, 5)])
+    versions = table(["Action Date", "Submission", "Action Type"], [
+        [f"2020-0{v}-01", f'<a href="{PAGE_PATH}?event=drugDetails.process&ApplNo={appl}&v={v}">SUPPL-{v}</a>',
+         "Approval"] for v in range(1, VERSIONS_PER_DRUG + 1)])
+    return f"<html><body><h2>{name}</h2>{products}{versions}</body></html>"
+
+
+def detail_page(appl, version):
+    rows = [[f"ORIG-{version}", f"2020-0{version}-01", "Labeling", f"Note {k}"] for k in range(6)]
+    return f"<html><body>{table(['Submission', 'Date', 'Type', 'Notes'], rows)}</body></html>"
+
+
+def make_app(latency):
+    drugs = fixture_drugs()
+    by_appl = {appl: name for _, name, appl in drugs}
+    stats = {"pages": 0, "letters": 0}
+
+    async def page(request):
+        stats["pages"] += 1
+        await asyncio.sleep(latency)
+        event = request.query.get("event")
+        if event == "browseByLetter.page":
+            stats["letters"] += 1
+            html = letter_page(request.query["productLetter"], drugs)
+        elif event == "overview.process":
+            appl = request.query["ApplNo"]
+            html = overview_page(by_appl[appl], appl)
+        elif event == "drugDetails.process":
+            html = detail_page(request.query["ApplNo"], int(request.query["v"]))
+        else:
+            raise web.HTTPNotFound()
+        return web.Response(text=html, content_type="text/html")
+
+    app = web.Application()
+    app.router.add_get(PAGE_PATH, page)
+    return app, stats
+
+
+@contextlib.asynccontextmanager
+async def fixture_server(latency):
+    """Serve the fixture site and point the Drugs@FDA scraper at it for the duration."""
+    app, stats = make_app(latency)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    names = "DOMAIN", "BASE_URL", "USE_CACHE", "SAVE_DIR", "PDF_DIR", "CSV_FILE", "JOURNAL_PATH", "INDEX_PATH"
+    saved = {name: getattr(fda, name) for name in names}
+    fda.DOMAIN = f"http://127.0.0.1:{port}"
+    fda.BASE_URL = f"{fda.DOMAIN}{PAGE_PATH}?event=browseByLetter.page&productLetter={{}}&ai=0"
+    fda.USE_CACHE = False
+    with tempfile.TemporaryDirectory() as tmp:
+        fda.SAVE_DIR = tmp
+        fda.PDF_DIR = f"{tmp}/pdfs"
+        fda.CSV_FILE = f"{tmp}/fda_all_tables.csv"
+        fda.JOURNAL_PATH = f"{tmp}/journal.jsonl"
+        fda.INDEX_PATH = f"{tmp}/letter_index.json"
+        try:
+            yield stats
+        finally:
+            for name, value in saved.items():
+                setattr(fda, name, value)
+            await runner.cleanup()
+
+
+async def extract_all_tables_per_cell(page, drug_name, appl_no, version, letter, downloads):
+    """The pre-evaluate extraction: one Playwright round-trip per query, attribute and cell text."""
+    tables = await page.query_selector_all("table")
+    all_data = []
+    for i, table in enumerate(tables):
+        for row in await table.query_selector_all("tr"):
+            row_data = []
+            for cell in await row.query_selector_all("th, td"):
+                link = await cell.query_selector("a")
+                if link:
+                    href = await link.get_attribute("href")
+                    text = await link.inner_text()
+                    if href and href.endswith(".pdf"):
+                        full_url = href if href.startswith("http") else fda.DOMAIN + href
+                        row_data.append(f"{text} ({full_url})")
+                    else:
+                        row_data.append(text)
+                else:
+                    row_data.append(await cell.inner_text())
+            if row_data:
+                all_data.append([drug_name, appl_no, version, letter, f"Table{i+1}"] + row_data)
+    return all_data
+
+
+async def run_extract(n_pages):
+    """Time both table extractions on the same loaded fixture overview pages and check they agree."""
+    timings = {"per-cell": 0.0, "evaluate": 0.0}
+    async with fixture_server(0) as stats:
+        async with fda.async_playwright() as p:
+            browser = await p.firefox.launch(headless=True)
+            page = await browser.new_page()
+            for _, name, appl in fixture_drugs()[:n_pages]:
+                await page.goto(f"{fda.DOMAIN}{PAGE_PATH}?event=overview.process&ApplNo={appl}")
+                results = {}
+                for label, extract in (("per-cell", extract_all_tables_per_cell), ("evaluate", fda.extract_all_tables)):
+                    started = time.perf_counter()
+                    results[label] = await extract(page, name, appl, "Overview", name[0], None)
+                    timings[label] += time.perf_counter() - started
+                assert results["per-cell"] == results["evaluate"], f"extractions differ for {name}"
+            await browser.close()
+    for label, total in timings.items():
+        print(f"{label:>9}: {total / n_pages * 1000:.1f} ms/page")
+    print(f"speedup: {timings['per-cell'] / timings['evaluate']:.1f}x over {n_pages} identical pages")
+
+
+async def run(pool_sizes, letters, latency, http=False):
+    logging.getLogger(fda.__name__).setLevel(logging.WARNING)
+    baseline, expected = None, None
+    async with fixture_server(latency) as stats:
+        for size in pool_sizes:
+            before = stats["pages"]
+            started = time.perf_counter()
+            rows = await fda.scrape_fda(letters=letters, pool_size=size, rate=1000, http=http, refresh_index=True)
+            elapsed = time.perf_counter() - started
+            pages = stats["pages"] - before
+            rate = pages / elapsed
+            baseline = baseline or rate
+            expected = expected or rows
+            assert rows == expected, "row order depends on the pool size"
+            print(f"workers={size:2d}: {pages} pages, {len(rows)} rows in {elapsed:.2f}s "
+                  f"({rate:.1f} pages/sec, {rate / baseline:.1f}x)")
+
+        before, letters_before = stats["pages"], stats["letters"]
+        started = time.perf_counter()
+        rows = await fda.scrape_fda(letters=letters, pool_size=pool_sizes[-1], rate=1000, http=http)
+        elapsed = time.perf_counter() - started
+        assert rows == expected, "the letter index changed the rows"
+        print(f"warm index: {stats['pages'] - before} pages ({stats['letters'] - letters_before} letter pages), "
+              f"{len(rows)} rows in {elapsed:.2f}s; a cold run read {len(fda.target_letters(load_drug_names(), letters))}"
+              f" of {len(letters)} letter pages")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure Drugs@FDA crawl throughput against local fixture pages")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--letters", default="ABCDEFGHIJKLMNOPQRSTUVWXYZ")
+    parser.add_argument("--latency", type=float, default=0.2)
+    parser.add_argument("--http", action="store_true", help="crawl with plain HTTP pages instead of Firefox")
+    parser.add_argument("--extract", type=int, metavar="PAGES",
+                        help="instead, compare per-cell and single-evaluate table extraction on PAGES overview pages")
+    args = parser.parse_args()
+    if args.extract:
+        asyncio.run(run_extract(args.extract))
+    else:
+        asyncio.run(run(args.workers, list(args.letters), args.latency, args.http))
@@ -0,0 +1,82 @@
+import argparse
+import random
+import time
+
+import pandas as pd
+
+from name_matcher import NameMatcher, strip_salts
+
+VOCAB_PATH = "data/drugbank vocabulary.csv"
+DRUG_LIST = "data/drug_list.csv"
+# Names whose salt-stripped forms must stay distinct from other drugs.
+SALT_FORMS = {
+    "Ponatinib Hydrochloride": "ponatinib",
+    "Cabozantinib S-malate": "cabozantinib",
+    "Gemigliptin L-tartrate Sesquihydrate": "gemigliptin",
+    "Naproxen Sodium": "naproxen",
+    "Esomeprazole Magnesium Dihydrate": "esomeprazole",
+    "Vitamin K": "vitamin k",
+    "Bismuth Potassium Citrate": "bismuth potassium citrate",
+    "Potassium Chloride": "potassium chloride",
+}
+
+
+def vocabulary_names(path=VOCAB_PATH):
+    vocab = pd.read_csv(path, dtype=str, keep_default_na=False)
+    for db_id, name, synonyms in zip(vocab["DrugBank ID"], vocab["Common name"], vocab["Synonyms"]):
+        yield name, db_id
+        for syn in synonyms.split(" | ") if synonyms else ():
+            yield syn, db_id
+
+
+def misspell(name, rng):
+    chars = list(name)
+    i = rng.randrange(1, max(2, len(chars) - 1))
+    op = rng.choice(["delete", "swap", "replace"])
+    if op == "delete":
+        del chars[i]
+    elif op == "swap" and i + 1 < len(chars):
+        chars[i], chars[i + 1] = chars[i + 1], chars[i]
+    else:
+        chars[i] = rng.choice("aeiouxyz")
+    return "".join(chars)
+
+
+def check_salt_forms():
+    for name, expected in SALT_FORMS.items():
+        assert strip_salts(name) == expected, f"strip_salts({name!r}) = {strip_salts(name)!r}, expected {expected!r}"
+
+
+def timed(matcher, queries, repeat):
+    started = time.perf_counter()
+    for _ in range(repeat):
+        results = [matcher.match(q, limit=5) for q in queries]
+    elapsed = time.perf_counter() - started
+    return results, len(queries) * repeat / elapsed
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Match data/drug_list.csv (clean and misspelt) against DrugBank")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    check_salt_forms()
+
+    started = time.perf_counter()
+    matcher = NameMatcher(vocabulary_names())
+    print(f"indexed {len(matcher.keys)} names in {time.perf_counter() - started:.2f}s")
+
+    drugs = pd.read_csv(DRUG_LIST)["Drug Name"].dropna().astype(str).tolist()
+    clean, clean_qps = timed(matcher, drugs, args.repeat)
+    expected = {q: r[0].value for q, r in zip(drugs, clean) if r and r[0].score == 1.0}
+    print(f"clean queries: {len(expected)}/{len(drugs)} exact or salt-stripped hits, {clean_qps:,.0f} queries/sec")
+
+    rng = random.Random(args.seed)
+    typo_sources = [q for q in drugs if q in expected]
+    typos = [misspell(q, rng) for q in typo_sources]
+    fuzzy, fuzzy_qps = timed(matcher, typos, args.repeat)
+    top1 = sum(1 for q, r in zip(typo_sources, fuzzy) if r and r[0].value == expected[q])
+    top5 = sum(1 for q, r in zip(typo_sources, fuzzy) if any(m.value == expected[q] for m in r))
+    print(f"misspelt queries: top-1 {top1}/{len(typos)}, top-5 {top5}/{len(typos)}, {fuzzy_qps:,.0f} queries/sec")
+    for q, r in list(zip(typos, fuzzy))[:5]:
+        print(f"  {q!r:40} -> " + ", ".join(f"{m.name} ({m.distance}, {m.score:.2f})" for m in r[:3]))
@@ -0,0 +1,196 @@
+import argparse
+import asyncio
+import contextlib
+import os
+import tempfile
+import time
+import zlib
+from aiohttp import web
+
+import scrapper_orangebook as ob
+from drug_list import load_drug_names
+from orangebook_store import OrangeBookStore
+
+# Local stand-in for the Orange Book search form, results_product.cfm and patent_info.cfm, with fixed latency.
+
+OB_PATH = "/scripts/cder/ob"
+APPLICATIONS = 3
+PRODUCTS = 4
+
+
+def appl_no(drug, k):
+    return f"{zlib.crc32(drug.encode()) % 90000 + 10000 + k:06d}"
+
+
+def search_form():
+    return (f'<html><body><form action="{OB_PATH}/search_product.cfm" method="post">'
+            '<input name="drugname"><input type="submit" id="Submit" value="Search"></form></body></html>')
+
+
+def search_results(drug):
+    header = "<tr><th>Appl. No.</th><th>Product No</th><th>Drug Name</th><th>Strength</th></tr>"
+    rows = "".join(f"<tr><td>N{appl_no(drug, k)}</td><td>00{k + 1}</td><td>{drug.upper()}</td><td>{5 * (k + 1)} MG</td></tr>"
+                   for k in range(APPLICATIONS))
+    return f"<html><body><table>{header}{rows}</table></body></html>"
+
+
+def product_page(appl, products=PRODUCTS):
+    panels = "".join(
+        f'<h3 class="ui-accordion-header">Product {n:03d}</h3><div class="ui-accordion-content">'
+        f"<strong>Active Ingredient:</strong> INGREDIENT {appl}<br><strong>Strength:</strong> {5 * n} MG<br>"
+        f"<strong>Dosage Form;Route:</strong> TABLET;ORAL<br><strong>Marketing Status:</strong>&nbsp;Prescription<br>"
+        f"<strong>TE Code:</strong> AB<br><strong>RLD:</strong> {'Yes' if n == 1 else 'No'}<br><strong>RS:</strong><br>"
+        f"<strong>Approval Date:</strong> Jan {n}, 2001<br><strong>Applicant:</strong> SMITH &amp; SONS</div>"
+        for n in range(1, products + 1))
+    table = ("<table><tr><th>Appl. No.</th><th>Applicant</th></tr>"
+             f"<tr><td>{appl}</td><td>PHARMA CO</td></tr></table>")
+    return f'<html><body><div id="accordion">{panels}</div>{table}</body></html>'
+
+
+def patent_page(appl, product):
+    patents = "".join(f"<tr><td>{appl}</td><td>{product}</td><td>{7000000 + n}</td><td>Jan {n}, 2030</td>"
+                      f"<td>Y</td><td></td><td>U-{n}</td></tr>" for n in range(1, 4))
+    exclusivity = f"<tr><td>{appl}</td><td>{product}</td><td>NCE</td><td>Jun 1, 2026</td></tr>"
+    return ("<html><body>"
+            "<table><tr><th>Appl No</th><th>Prod No</th><th>Patent No</th><th>Patent Expiration</th>"
+            f"<th>Drug Substance</th><th>Drug Product</th><th>Patent Use Code</th></tr>{patents}</table>"
+            "<table><tr><th>Appl No</th><th>Prod No</th><th>Exclusivity Code</th><th>Exclusivity Expiration</th></tr>"
+            f"{exclusivity}</table></body></html>")
+
+
+def make_app(latency):
+    stats = {"pages": 0}
+
+    def html(text):
+        return web.Response(text=text, content_type="text/html")
+
+    async def delay():
+        stats["pages"] += 1
+        await asyncio.sleep(latency)
+
+    async def index(request):
+        await delay()
+        return html(search_form())
+
+    async def search(request):
+        await delay()
+        form = await request.post()
+        return html(search_results(form["drugname"]))
+
+    async def product(request):
+        await delay()
+        return html(product_page(request.query["Appl_No"], int(request.query.get("Products", PRODUCTS))))
+
+    async def patent(request):
+        await delay()
+        return html(patent_page(request.query["Appl_No"], request.query["Product_No"]))
+
+    app = web.Application()
+    app.router.add_get(f"{OB_PATH}/index.cfm", index)
+    app.router.add_post(f"{OB_PATH}/search_product.cfm", search)
+    app.router.add_get(f"{OB_PATH}/results_product.cfm", product)
+    app.router.add_get(f"{OB_PATH}/patent_info.cfm", patent)
+    return app, stats
+
+
+@contextlib.asynccontextmanager
+async def fixture_server(latency):
+    """Serve the fixture site and point the Orange Book scraper at it (and at a scratch directory)."""
+    app, stats = make_app(latency)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    names = "OB_URL", "SEARCH_URL", "USE_CACHE", "OUTPUT_PATH", "JOURNAL_PATH", "ERROR_LOG"
+    saved = {name: getattr(ob, name) for name in names}
+    with tempfile.TemporaryDirectory() as tmp:
+        ob.OB_URL = f"http://127.0.0.1:{port}{OB_PATH}"
+        ob.SEARCH_URL = f"{ob.OB_URL}/index.cfm"
+        ob.USE_CACHE = False
+        ob.OUTPUT_PATH = os.path.join(tmp, "orangebook.sqlite")
+        ob.JOURNAL_PATH = os.path.join(tmp, "journal.jsonl")
+        ob.ERROR_LOG = os.path.join(tmp, "error_log.txt")
+        try:
+            yield stats
+        finally:
+            for name, value in saved.items():
+                setattr(ob, name, value)
+            await runner.cleanup()
+
+
+async def extract_text_info_clicking(page):
+    """The pre-parser extraction: click every accordion header open, then slice each panel's innerHTML."""
+    data_list = []
+    for header in await page.query_selector_all('.ui-accordion-header'):
+        await header.click()
+        await page.wait_for_timeout(200)
+    for panel in await page.query_selector_all('.ui-accordion-content'):
+        product_data = {}
+        for line in (await panel.inner_html()).split("<br>"):
+            if "<strong>" in line:
+                key = line.split("<strong>")[1].split("</strong>")[0].strip().replace(":", "")
+                val = line.split("</strong>")[1].replace("&nbsp;", "").replace("<br>", "").strip().split("<")[0]
+                if key and val:
+                    product_data[key] = val
+        if product_data:
+            data_list.append(product_data)
+    return data_list
+
+
+async def run_extract(n_pages, products):
+    """Time both panel extractions on the same loaded fixture product pages and check they agree."""
+    timings = {"clicking": 0.0, "parsing": 0.0}
+    async with fixture_server(0):
+        async with ob.async_playwright() as p:
+            browser = await p.firefox.launch(headless=True)
+            page = await browser.new_page()
+            for k in range(n_pages):
+                await page.goto(f"{ob.OB_URL}/results_product.cfm?Appl_Type=N&Appl_No={10000 + k:06d}"
+                                f"&Products={products}")
+                results = {}
+                for label, extract in (("clicking", extract_text_info_clicking), ("parsing", ob.extract_text_info)):
+                    started = time.perf_counter()
+                    with contextlib.redirect_stdout(open(os.devnull, "w")):
+                        results[label] = await extract(page)
+                    timings[label] += time.perf_counter() - started
+                assert results["clicking"] == results["parsing"], f"extractions differ on page {k}"
+            await browser.close()
+    for label, total in timings.items():
+        print(f"{label:>8}: {total / n_pages * 1000:.1f} ms/page")
+    print(f" speedup: {timings['clicking'] / timings['parsing']:.0f}x over {n_pages} identical pages "
+          f"of {products} panels")
+
+
+async def run(n_drugs, settings, latency, http):
+    drugs = load_drug_names(limit=n_drugs)
+    baseline, expected = None, None
+    for contexts, row_concurrency in settings:
+        async with fixture_server(latency) as stats:
+            started = time.perf_counter()
+            with contextlib.redirect_stdout(open(os.devnull, "w")):
+                await ob.fetch_all_data(drugs, http=http, contexts=contexts, row_concurrency=row_concurrency, rate=1000)
+            elapsed = time.perf_counter() - started
+            with OrangeBookStore(ob.OUTPUT_PATH) as store:
+                frames = store.frames()
+        baseline = baseline or elapsed
+        expected = frames if expected is None else expected
+        assert all(frames[t].equals(expected[t]) for t in frames), "output depends on the concurrency settings"
+        print(f"contexts={contexts} rows={row_concurrency}: {len(drugs)} drugs, {stats['pages']} pages, "
+              f"{len(frames['products'])} products, {len(frames['patents'])} patents in "
+              f"{elapsed:.2f}s ({len(drugs) / elapsed:.1f} drugs/sec, {baseline / elapsed:.1f}x)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure Orange Book scraping throughput against local fixture pages")
+    parser.add_argument("--drugs", type=int, default=20)
+    parser.add_argument("--latency", type=float, default=0.2)
+    parser.add_argument("--http", action="store_true", help="load product and patent pages over plain HTTP")
+    parser.add_argument("--extract", type=int, metavar="PAGES",
+                        help="instead, compare click-to-expand and parsed panel extraction on PAGES product pages")
+    parser.add_argument("--products", type=int, default=24, help="accordion panels per page with --extract")
+    args = parser.parse_args()
+    if args.extract:
+        asyncio.run(run_extract(args.extract, args.products))
+    else:
+        asyncio.run(run(args.drugs, [(1, 1), (2, 2), (4, 4), (8, 4)], args.latency, args.http))
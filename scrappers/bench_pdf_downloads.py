@@ -0,0 +1,133 @@
+import argparse
+import asyncio
+import contextlib
+import hashlib
+import os
+import tempfile
+import time
+import aiohttp
+from aiohttp import web
+
+import pdf_downloads
+from pdf_downloads import DownloadManager
+
+# Local static server standing in for the FDA label PDFs. Every other file is a byte-identical copy of
+# another under a new URL, and some downloads start from a half-written .part file to exercise resume.
+
+
+def make_files(root, n_files, size):
+    os.makedirs(root)
+    for i in range(n_files):
+        body = hashlib.sha256(str(i // 2).encode()).digest() * (size // 32)
+        with open(os.path.join(root, f"label{i}.pdf"), "wb") as f:
+            f.write(body)
+
+
+@contextlib.asynccontextmanager
+async def static_server(root):
+    app = web.Application()
+    app.router.add_static("/pdf", root)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    try:
+        yield f"http://127.0.0.1:{site._server.sockets[0].getsockname()[1]}/pdf"
+    finally:
+        await runner.cleanup()
+
+
+async def download_one_by_one(urls, out):
+    """The old extract_and_download_pdfs flow: a new session per file and the whole body in memory."""
+    for url in urls:
+        async with aiohttp.ClientSession() as session:
+            async with session.get(url) as response:
+                with open(os.path.join(out, url.rsplit("/", 1)[-1]), "wb") as f:
+                    f.write(await response.read())
+
+
+def tree_bytes(root):
+    """Bytes actually allocated under `root`, counting hard-linked files once."""
+    seen, total = set(), 0
+    for dirpath, _, files in os.walk(root):
+        for name in files:
+            st = os.stat(os.path.join(dirpath, name))
+            if (st.st_dev, st.st_ino) not in seen:
+                seen.add((st.st_dev, st.st_ino))
+                total += st.st_size
+    return total
+
+
+async def run(n_files, size_mb, concurrency):
+    size = int(size_mb * 1024 ** 2)
+    with tempfile.TemporaryDirectory() as tmp:
+        served = os.path.join(tmp, "served")
+        make_files(served, n_files, size)
+        async with static_server(served) as base:
+            urls = [f"{base}/label{i}.pdf" for i in range(n_files)]
+
+            old_dir = os.path.join(tmp, "old")
+            os.makedirs(old_dir)
+            started = time.perf_counter()
+            await download_one_by_one(urls, old_dir)
+            t_old = time.perf_counter() - started
+
+            new_dir = os.path.join(tmp, "new")
+            os.makedirs(new_dir)
+            for i in range(0, n_files, 4):
+                with open(os.path.join(served, f"label{i}.pdf"), "rb") as src:
+                    partial = src.read(size // 2)
+                with open(os.path.join(new_dir, f"label{i}.pdf.part"), "wb") as f:
+                    f.write(partial)
+            started = time.perf_counter()
+            async with DownloadManager(new_dir, concurrency=concurrency, rate=1000) as downloads:
+                for url in urls + urls[:n_files // 2]:
+                    await downloads.submit(url, os.path.join(new_dir, url.rsplit("/", 1)[-1]))
+            t_new = time.perf_counter() - started
+
+            for i in range(n_files):
+                with open(os.path.join(served, f"label{i}.pdf"), "rb") as a, \
+                        open(os.path.join(new_dir, f"label{i}.pdf"), "rb") as b:
+                    assert a.read() == b.read(), f"label{i}.pdf differs"
+
+            async with DownloadManager(new_dir, concurrency=concurrency, rate=1000) as warm:
+                for url in urls:
+                    await warm.submit(url, os.path.join(new_dir, url.rsplit("/", 1)[-1]))
+            on_disk = tree_bytes(new_dir) / 1024 ** 2
+
+            # One label shared by two drugs, a file already on disk without an index entry, and a 404.
+            edge_dir = os.path.join(tmp, "edge")
+            shared = [os.path.join(edge_dir, d, "label.pdf") for d in ("000001_DRUGA", "000002_DRUGB")]
+            present = os.path.join(edge_dir, "label0.pdf")
+            os.makedirs(edge_dir)
+            with open(os.path.join(served, "label0.pdf"), "rb") as src, open(present, "wb") as dst:
+                dst.write(src.read())
+            started = time.perf_counter()
+            async with DownloadManager(edge_dir, concurrency=concurrency, rate=1000) as edge:
+                for path in shared:
+                    await edge.submit(urls[1], path)
+                await edge.submit(urls[0], present)
+                await edge.submit(f"{base}/missing.pdf", os.path.join(edge_dir, "missing.pdf"))
+            t_edge = time.perf_counter() - started
+            with open(os.path.join(served, "label1.pdf"), "rb") as f:
+                expected = f.read()
+            for path in shared:
+                with open(path, "rb") as f:
+                    assert f.read() == expected, f"{path} missing or differs"
+            assert (edge.downloaded, edge.linked, edge.skipped, edge.failed) == (1, 1, 1, 1), edge.progress()
+            assert t_edge < 1, f"404 was retried ({t_edge:.1f}s)"
+
+    total = n_files * size / 1024 ** 2
+    print(f"one by one: {t_old:.2f}s ({total / t_old:.1f} MiB/s), {total:.0f} MiB on disk")
+    print(f"   manager: {t_new:.2f}s ({total / t_new:.1f} MiB/s), {on_disk:.0f} MiB on disk; {downloads.progress()}")
+    print(f"  warm run: {warm.progress()}")
+    print(f"edge cases: {edge.progress()}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare one-by-one PDF downloads with DownloadManager")
+    parser.add_argument("--files", type=int, default=40)
+    parser.add_argument("--size-mb", type=float, default=4)
+    parser.add_argument("--concurrency", type=int, default=pdf_downloads.CONCURRENCY)
+    args = parser.parse_args()
+    asyncio.run(run(args.files, args.size_mb, args.concurrency))
@@ -0,0 +1,73 @@
+import argparse
+import itertools
+import random
+import statistics
+import tempfile
+import time
+
+from similarity import SimilarityIndex, search_many
+
+# Substituted biphenyl/benzene variants: valid, distinct SMILES at DrugBank scale without the SDF.
+GROUPS = ["", "C", "CC", "O", "OC", "N", "NC", "N(C)C", "F", "Cl", "Br", "C(=O)O", "C(=O)N", "C#N", "S(=O)(=O)N",
+          "C(F)(F)F", "OC(C)=O", "c1ccccc1", "C1CCNCC1", "N1CCOCC1", "c1ccncc1", "CO", "C(C)C", "[N+](=O)[O-]"]
+TEMPLATES = ["c1cc({})c({})cc1{}", "c1c({})cc({})nc1{}", "C1CC({})C({})CC1{}"]
+
+
+def molecules(n, seed):
+    rng = random.Random(seed)
+    combos = [t.format(*g) for t in TEMPLATES for g in itertools.product(GROUPS, repeat=3)]
+    rng.shuffle(combos)
+    smiles = [s.replace("()", "") for s in combos[:n]]
+    return [f"MOL{i:06d}" for i in range(len(smiles))], smiles
+
+
+def check_against_rdkit(index, query, k):
+    from rdkit import Chem, DataStructs
+    from rdkit.Chem import rdFingerprintGenerator
+
+    gen = rdFingerprintGenerator.GetMorganGenerator(radius=index.radius, fpSize=index.bits)
+    fps = [gen.GetFingerprint(Chem.MolFromSmiles(s)) for s in index.smiles]
+    scores = DataStructs.BulkTanimotoSimilarity(gen.GetFingerprint(Chem.MolFromSmiles(query)), fps)
+    expected = sorted(scores, reverse=True)[:k]
+    got = [score for _, score in index.search(query, k)]
+    return max(abs(a - b) for a, b in zip(expected, got))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build a similarity index over synthetic molecules and time queries")
+    parser.add_argument("-n", type=int, default=17000, help="indexed molecules (DrugBank has about 17k)")
+    parser.add_argument("--queries", type=int, default=64)
+    parser.add_argument("-k", type=int, default=10)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    ids, smiles = molecules(args.n, args.seed)
+    path = tempfile.mkdtemp()
+    started = time.perf_counter()
+    SimilarityIndex.build(ids, smiles, path, workers=args.workers)
+    print(f"built {len(ids)} fingerprints in {time.perf_counter() - started:.2f}s")
+    started = time.perf_counter()
+    index = SimilarityIndex.open(path)
+    print(f"opened (memory-mapped) in {(time.perf_counter() - started) * 1000:.1f} ms")
+
+    queries = random.Random(args.seed).sample(index.smiles, args.queries)
+    latencies = []
+    single = []
+    for q in queries:
+        started = time.perf_counter()
+        single.append(index.search(q, args.k))
+        latencies.append((time.perf_counter() - started) * 1000)
+    print(f"single query: median {statistics.median(latencies):.2f} ms, max {max(latencies):.2f} ms")
+
+    started = time.perf_counter()
+    block = index.search_block(queries, args.k)
+    print(f"search_block: {args.queries} queries in {(time.perf_counter() - started) * 1000:.1f} ms")
+    started = time.perf_counter()
+    pooled = search_many(queries, path, args.k, args.workers)
+    print(f"search_many:  {args.queries} queries in {(time.perf_counter() - started) * 1000:.1f} ms "
+          "(including pool start-up)")
+
+    scores = lambda results: [[round(s, 6) for _, s in hits] for hits in results]
+    assert scores(single) == scores(block) == scores(pooled), "batched results differ from single queries"
+    print(f"max top-{args.k} deviation from RDKit BulkTanimotoSimilarity: {check_against_rdkit(index, queries[0], args.k):.2e}")
@@ -1,14 +1,43 @@
+import argparse
 import asyncio
 import aiohttp
 import aiofiles
 import pandas as pd
 import json
-import os
-import re
+import time
+
+from depiction import SIZE as DEPICT_SIZE
+from depiction import depict_many, parse_size
+from drug_list import load_drug_names
+from drug_resolver import DrugResolver
+from http_cache import CACHE_PATH, CachedSession, ResponseCache, format_stats
+from job_journal import JobJournal, carry_over, set_aside
+from name_matcher import normalize_name
+from row_writers import open_writer
+from structure_store import STORE_PATH, StructureStore
+from structure_store import format_stats as format_structure_stats
 
 BASE = "https://www.ebi.ac.uk/chembl/api/data"
 CONCURRENCY = 10
-ACTIVITY_LIMIT = 1000
+# Concurrent request limits per endpoint class, shared by all drugs in flight.
+ENDPOINT_LIMITS = {"search": CONCURRENCY, "molecule": CONCURRENCY, "drug": CONCURRENCY, "mechanism": CONCURRENCY,
+                   "activity": CONCURRENCY, "image": CONCURRENCY}
+BATCH_SIZE = 50
+BATCH_PAGE_SIZE = 1000
+ACTIVITY_PAGE_SIZE = 1000
+ACTIVITY_CONCURRENCY = 4
+ACTIVITY_PREFETCH = 8
+ACTIVITY_OUTPUT = "chembl_activities.parquet"
+ACTIVITY_COLUMNS = [
+    "drug_name", "molecule_chembl_id", "activity_id", "assay_chembl_id", "assay_type", "assay_description",
+    "target_chembl_id", "target_pref_name", "target_organism", "document_chembl_id", "standard_type",
+    "standard_relation", "standard_value", "standard_units", "pchembl_value", "data_validity_comment",
+]
+ACTIVITY_TYPES = {"activity_id": "int64", "standard_value": "double", "pchembl_value": "double"}
+JOURNAL_PATH = "data/chembl_journal.jsonl"
+STRUCTURE_STORE = STORE_PATH
+USE_CACHE = True
+USE_RESOLVER = True
 
 async def fetch(session, url, params=None):
     headers = {"Accept": "application/json"}
@@ -31,12 +60,22 @@ async def fetch_image_svg(session, chembl_id):
         r.raise_for_status()
         return await r.text()
 
-def normalize_name(s):
-    if not isinstance(s, str):
-        return ""
-    return re.sub(r"[\s\-_,.;:/]+", "", s).lower()
+async def get_chembl_id(session, drug_name, resolver=None):
+    """Map a drug name to a ChEMBL ID, via an exact (or salt-stripped) DrugBank index hit and an
+    InChIKey lookup when possible and the remote molecule/search endpoint otherwise.
 
-async def get_chembl_id(session, drug_name):
+    A fuzzy DrugBank match may be another drug with a similar name, so it never skips the search;
+    it only favours the search result with the same InChIKey.
+    """
+    known = resolver.lookup(drug_name) if resolver else None
+    if known and known["inchikey"]:
+        mol = await fetch(session, f"{BASE}/molecule/{known['inchikey']}.json")
+        if isinstance(mol, dict) and mol.get("molecule_chembl_id"):
+            return mol["molecule_chembl_id"]
+    hint = None
+    if resolver and known is None:
+        near = resolver.fuzzy_lookup(drug_name)
+        hint = near["inchikey"] if near else None
     data = await fetch(session, f"{BASE}/molecule/search", {"q": drug_name})
     if not data:
         return None
@@ -61,6 +100,8 @@ async def get_chembl_id(session, drug_name):
         for syn in syns:
             if normalize_name(syn) == target_norm:
                 score += 80
+        if hint and (m.get("molecule_structures") or {}).get("standard_inchi_key") == hint:
+            score += 90
         s = m.get("score")
         if isinstance(s, (int, float)):
             score += int(s)
@@ -71,37 +112,198 @@ async def get_chembl_id(session, drug_name):
         return best
     return molecules[0].get("molecule_chembl_id")
 
-async def process_drug(session, drug_name, sem):
-    print(drug_name)
+def to_float(v):
+    try:
+        return float(v)
+    except (TypeError, ValueError):
+        return None
+
+def flatten_activity(drug_name, a):
+    row = {c: a.get(c) for c in ACTIVITY_COLUMNS}
+    row["drug_name"] = drug_name
+    row["standard_value"] = to_float(a.get("standard_value"))
+    row["pchembl_value"] = to_float(a.get("pchembl_value"))
+    return row
+
+async def fetch_activities(session, drug_name, cid, writer, sem):
+    """Page through every /activity record for `cid` and stream them into `writer`.
+
+    The first page gives total_count; the remaining offsets are fetched by ACTIVITY_CONCURRENCY
+    workers that feed a queue of at most ACTIVITY_PREFETCH pages, so memory stays bounded
+    however many activities a molecule has. Returns the number of activities written.
+    """
+    url = f"{BASE}/activity"
+    params = {"molecule_chembl_id": cid, "limit": ACTIVITY_PAGE_SIZE, "order_by": "activity_id"}
     async with sem:
-        cid = await get_chembl_id(session, drug_name)
+        first = await fetch(session, url, {**params, "offset": 0})
+    if not isinstance(first, dict):
+        return 0
+    total = (first.get("page_meta") or {}).get("total_count") or 0
+    offsets = list(range(ACTIVITY_PAGE_SIZE, total, ACTIVITY_PAGE_SIZE))
+    offsets.reverse()
+    queue = asyncio.Queue(maxsize=ACTIVITY_PREFETCH)
+
+    async def producer():
+        while offsets:
+            offset = offsets.pop()
+            async with sem:
+                page = await fetch(session, url, {**params, "offset": offset})
+            await queue.put(page.get("activities", []) if isinstance(page, dict) else [])
+
+    async def run_producers():
+        # No sentinel once cancelled: nobody reads the queue then, and a full one would block forever.
+        try:
+            await asyncio.gather(*(producer() for _ in range(min(ACTIVITY_CONCURRENCY, len(offsets)))))
+        except Exception:
+            await queue.put(None)
+            raise
+        await queue.put(None)
+
+    producers = asyncio.create_task(run_producers())
+    batch = first.get("activities", [])
+    count = 0
+    try:
+        while batch is not None:
+            writer.write_rows([flatten_activity(drug_name, a) for a in batch])
+            count += len(batch)
+            batch = await queue.get()
+        await producers
+    finally:
+        producers.cancel()
+        await asyncio.gather(producers, return_exceptions=True)
+    return count
+
+async def fetch_all_pages(session, url, params, key, sem):
+    """Collect `key` records from every page of a ChEMBL list endpoint by following page_meta.next."""
+    records = []
+    offset = 0
+    while True:
+        async with sem:
+            data = await fetch(session, url, {**params, "limit": BATCH_PAGE_SIZE, "offset": offset})
+        if not isinstance(data, dict):
+            break
+        records.extend(data.get(key, []))
+        if not (data.get("page_meta") or {}).get("next"):
+            break
+        offset += BATCH_PAGE_SIZE
+    return records
+
+async def fetch_bulk(session, endpoint, key, cids, sem):
+    """Fetch `endpoint` records for many molecules with molecule_chembl_id__in, grouped by ChEMBL ID."""
+    chunks = [cids[i:i + BATCH_SIZE] for i in range(0, len(cids), BATCH_SIZE)]
+    pages = await asyncio.gather(*(
+        fetch_all_pages(session, f"{BASE}/{endpoint}.json", {"molecule_chembl_id__in": ",".join(c)}, key, sem)
+        for c in chunks
+    ))
+    by_id = {}
+    for records in pages:
+        for r in records:
+            by_id.setdefault(r.get("molecule_chembl_id"), []).append(r)
+    return by_id
+
+def build_record(drug_name, cid, molecule, drug, mechanisms, activities_count, svg):
+    return {
+        "drug_name": drug_name,
+        "chembl_id": cid,
+        "molecule": molecule if isinstance(molecule, dict) else {},
+        "drug": drug if isinstance(drug, dict) else {},
+        "mechanism": mechanisms,
+        "activities_count": activities_count,
+        "structure_svg": svg
+    }
+
+async def structure_svg(session, cid, sems, store=None):
+    """The molecule's SVG from `store` when it already has one, otherwise fetched from ChEMBL."""
+    if store is not None and cid in store:
+        return store.get(cid)
+    return await limited(sems["image"], fetch_image_svg(session, cid))
+
+def molecule_smiles(molecule):
+    structs = (molecule.get("molecule_structures") if isinstance(molecule, dict) else None) or {}
+    return structs.get("canonical_smiles")
+
+async def remote_structure(session, cid, molecule, sems, store=None, depict=True):
+    """The ChEMBL SVG for molecules that cannot be depicted locally; "" (filled in by
+    depict_records) when `depict` is set and the molecule record has SMILES."""
+    if depict and molecule_smiles(molecule):
+        return ""
+    return await structure_svg(session, cid, sems, store)
+
+def depict_records(records, store, size=DEPICT_SIZE):
+    """Render every record's structure from its SMILES into `structure_svg`, through the
+    InChIKey-keyed depiction cache in `store`. Returns the number of records depicted."""
+    pending = [rec for rec in records if not rec.get("structure_svg") and molecule_smiles(rec.get("molecule"))]
+    keys = [((rec["molecule"].get("molecule_structures") or {}).get("standard_inchi_key"),
+             molecule_smiles(rec["molecule"])) for rec in pending]
+    images = depict_many(keys, store, size)
+    for rec, key in zip(pending, keys):
+        rec["structure_svg"] = images.get(key, "")
+    return sum(key in images for key in keys)
+
+def endpoint_semaphores(limits=None):
+    return {k: asyncio.Semaphore(v) for k, v in (limits or ENDPOINT_LIMITS).items()}
+
+async def limited(sem, coro):
+    async with sem:
+        return await coro
+
+async def process_drug(session, drug_name, sems, activity_writer, resolver=None, store=None, depict=True):
+    """Resolve the ChEMBL ID, then issue the detail fetches together.
+
+    Each call only holds a slot of its own endpoint's semaphore, so per-drug latency after
+    ID resolution is roughly one round-trip (plus extra activity pages). With `depict` the
+    structure is drawn from the molecule's SMILES later (depict_records) and the SVG endpoint
+    is only called for molecules without one; SVGs already in `store`
+    (a structure_store.StructureStore) are not fetched again.
+    """
+    print(drug_name)
+    async with sems["search"]:
+        cid = await get_chembl_id(session, drug_name, resolver)
+    if not cid:
+        return {"drug_name": drug_name, "chembl_id": None, "error": "not_found"}
+    fetches = [
+        limited(sems["molecule"], fetch(session, f"{BASE}/molecule/{cid}.json")),
+        limited(sems["drug"], fetch(session, f"{BASE}/drug/{cid}.json")),
+        fetch_all_pages(session, f"{BASE}/mechanism", {"molecule_chembl_id": cid}, "mechanisms", sems["mechanism"]),
+        fetch_activities(session, drug_name, cid, activity_writer, sems["activity"]),
+    ]
+    if not depict:
+        fetches.append(structure_svg(session, cid, sems, store))
+    molecule, drug, mechanisms, activities_count, *svg = await asyncio.gather(*fetches)
+    svg = svg[0] if svg else await remote_structure(session, cid, molecule, sems, store)
+    return build_record(drug_name, cid, molecule, drug, mechanisms, activities_count, svg)
+
+async def process_drugs_batched(session, drug_names, sems, activity_writer, resolver=None, store=None,
+                                depict=True):
+    """Batch mode: resolve every ID first, then fetch molecule, drug and mechanism records with
+    molecule_chembl_id__in chunks of BATCH_SIZE and split them back out per drug.
+    Activities and remote SVGs stay per molecule. Records match process_drug's output.
+    """
+    async def resolve(name):
+        print(name)
+        async with sems["search"]:
+            return await get_chembl_id(session, name, resolver)
+
+    cids = await asyncio.gather(*(resolve(name) for name in drug_names))
+    unique = sorted({cid for cid in cids if cid})
+    molecules, drugs, mechanisms = await asyncio.gather(
+        fetch_bulk(session, "molecule", "molecules", unique, sems["molecule"]),
+        fetch_bulk(session, "drug", "drugs", unique, sems["drug"]),
+        fetch_bulk(session, "mechanism", "mechanisms", unique, sems["mechanism"]),
+    )
+
+    async def details(name, cid):
         if not cid:
-            return {"drug_name": drug_name, "chembl_id": None, "error": "not_found"}
-        molecule = await fetch(session, f"{BASE}/molecule/{cid}.json")
-        drug = await fetch(session, f"{BASE}/drug/{cid}.json")
-        mech = await fetch(session, f"{BASE}/mechanism", {"molecule_chembl_id": cid})
-        act = await fetch(session, f"{BASE}/activity", {"molecule_chembl_id": cid, "limit": ACTIVITY_LIMIT})
-        svg = await fetch_image_svg(session, cid)
-        mechanisms = []
-        if isinstance(mech, dict):
-            mechanisms = mech.get("mechanisms", [])
-        activities = []
-        if isinstance(act, dict):
-            activities = act.get("activities", [])
-            print(cid)
-            print(molecule)
-            print(drug)
-            print(activities)
-            print(mechanisms)
-        return {
-            "drug_name": drug_name,
-            "chembl_id": cid,
-            "molecule": molecule if isinstance(molecule, dict) else {},
-            "drug": drug if isinstance(drug, dict) else {},
-            "mechanism": mechanisms,
-            "activities": activities,
-            "structure_svg": svg
-        }
+            return {"drug_name": name, "chembl_id": None, "error": "not_found"}
+        molecule = (molecules.get(cid) or [None])[0]
+        activities_count, svg = await asyncio.gather(
+            fetch_activities(session, name, cid, activity_writer, sems["activity"]),
+            remote_structure(session, cid, molecule, sems, store, depict),
+        )
+        return build_record(name, cid, molecule, (drugs.get(cid) or [None])[0],
+                            mechanisms.get(cid, []), activities_count, svg)
+
+    return await asyncio.gather(*(details(name, cid) for name, cid in zip(drug_names, cids)))
 
 def flatten_record(rec):
     mol = rec.get("molecule") or {}
@@ -130,32 +332,93 @@ def flatten_record(rec):
         "canonical_smiles": structs.get("canonical_smiles"),
         "standard_inchi": structs.get("standard_inchi"),
         "standard_inchi_key": structs.get("standard_inchi_key"),
-        "activities_count": len(rec.get("activities") or []),
+        "activities_count": rec.get("activities_count", 0),
         "mechanisms_count": len(rec.get("mechanism") or []),
         "has_drug_record": bool(rec.get("drug"))
     }
 
-async def main():
-    df = pd.read_csv("data/drug_list.csv")
-    drugs = df["Drug Name"].dropna().astype(str).unique().tolist()
-    os.makedirs("structures", exist_ok=True)
-    sem = asyncio.Semaphore(CONCURRENCY)
+async def main(batch=False, use_cache=USE_CACHE, use_resolver=USE_RESOLVER, resume=False, drugs=None, cache=None,
+               resolver=None, depict=True, depict_size=DEPICT_SIZE):
+    """Fetch `drugs` (default: the drug list); a `cache` or `resolver` passed in is shared with the caller.
+
+    With `depict`, structures are rendered locally from SMILES at `depict_size` once every drug
+    is fetched, and ChEMBL's SVG endpoint is only used for molecules without SMILES.
+    """
+    drugs = load_drug_names() if drugs is None else drugs
+    sems = endpoint_semaphores()
     results = []
-    flattened = []
+    own_cache = cache is None and use_cache
+    if own_cache:
+        cache = ResponseCache(CACHE_PATH)
+    if resolver is None and use_resolver:
+        resolver = DrugResolver.load()
+    journal = JobJournal(JOURNAL_PATH, resume)
+    store = StructureStore(STRUCTURE_STORE)
+    started = time.perf_counter()
+
+    async def collect(rec):
+        results.append(rec)
+        cid = rec.get("chembl_id")
+        svg = rec.get("structure_svg") or ""
+        if cid and svg and cid not in store:
+            store.put(cid, svg)
+
     async with aiohttp.ClientSession() as session:
-        tasks = [process_drug(session, name, sem) for name in drugs]
-        for fut in asyncio.as_completed(tasks):
-            rec = await fut
-            results.append(rec)
-            cid = rec.get("chembl_id")
-            svg = rec.get("structure_svg") or ""
-            if cid and svg:
-                async with aiofiles.open(f"structures/{cid}.svg", "w") as f:
-                    await f.write(svg)
-            flattened.append(flatten_record(rec))
+        if cache is not None:
+            session = CachedSession(session, cache)
+        prev = set_aside(ACTIVITY_OUTPUT) if resume else None
+        activity_writer = open_writer(ACTIVITY_OUTPUT, ACTIVITY_COLUMNS, types=ACTIVITY_TYPES)
+        try:
+            if resume:
+                carried = carry_over(prev, "drug_name", journal, activity_writer)
+                for unit in journal.units():
+                    await collect(journal.get(unit))
+                print(f"resuming: {len(journal)} drugs and {carried} activities from the journal")
+            todo = [name for name in drugs if (name,) not in journal]
+            if batch:
+                for rec in await process_drugs_batched(session, todo, sems, activity_writer, resolver, store, depict):
+                    await collect(rec)
+                    journal.record((rec["drug_name"],), rec)
+            else:
+                tasks = [process_drug(session, name, sems, activity_writer, resolver, store, depict) for name in todo]
+                for fut in asyncio.as_completed(tasks):
+                    rec = await fut
+                    await collect(rec)
+                    journal.record((rec["drug_name"],), rec)
+            if depict:
+                depicted = await asyncio.to_thread(depict_records, results, store, depict_size)
+                print(f"depicted {depicted} structures locally at {depict_size[0]}x{depict_size[1]}")
+        finally:
+            activity_writer.close()
+            journal.close()
+            print(format_structure_stats(store))
+            store.close()
+    flattened = [flatten_record(rec) for rec in results]
+    elapsed = time.perf_counter() - started
+    n_act = activity_writer.rows_written
+    print(f"streamed {n_act} activities in {elapsed:.1f}s ({n_act / elapsed if elapsed else 0:.0f} activities/sec)")
     async with aiofiles.open("chembl_results.json", "w") as f:
         await f.write(json.dumps(results, indent=2))
     pd.DataFrame(flattened).to_csv("chembl.csv", index=False)
+    if resolver is not None:
+        print(f"resolver: {resolver.hits} offline matches, {resolver.misses} sent to molecule/search")
+    if own_cache:
+        print(format_stats(cache))
+        cache.close()
 
 if __name__ == "__main__":
-    asyncio.run(main())
+    parser = argparse.ArgumentParser(description="Fetch ChEMBL records for every drug in data/drug_list.csv")
+    parser.add_argument("--batch", action="store_true",
+                        help="fetch molecule, drug and mechanism records in bulk with molecule_chembl_id__in")
+    parser.add_argument("--no-cache", action="store_true", help="bypass the on-disk HTTP response cache")
+    parser.add_argument("--no-resolver", action="store_true",
+                        help="resolve every name with molecule/search instead of the DrugBank index")
+    parser.add_argument("--resume", action="store_true",
+                        help="continue an interrupted run, reusing the drugs recorded in the job journal")
+    parser.add_argument("--depict-size", type=parse_size, default=DEPICT_SIZE, metavar="WxH",
+                        help="size of the structures drawn locally from SMILES")
+    parser.add_argument("--remote-svg", action="store_true",
+                        help="fetch every structure SVG from ChEMBL instead of drawing it locally")
+    args = parser.parse_args()
+    asyncio.run(main(args.batch, not args.no_cache, not args.no_resolver, args.resume,
+                     depict=not args.remote_svg, depict_size=args.depict_size))
@@ -1,65 +1,240 @@
-import pandas as pd
-import requests
+import argparse
+import asyncio
+import datetime
+import json
+import os
 import time
-import csv
-df = pd.read_csv("data/drug_list.csv")
+import aiohttp
+import pandas as pd
 
-def fetch_studies(drug_name):
-    base_url = "https://clinicaltrials.gov/api/v2/studies"
-    studies = []
-    page_token = None
+from drug_list import load_drug_names
+from job_journal import JobJournal, carry_over, set_aside
+from rate_limit import TokenBucket
+from row_writers import ROW_GROUP_SIZE, open_writer
 
-    while True:
-        params = {
-            "query.term": drug_name,
-            "pageSize": 100,
-            "format": "json"
-        }
-        if page_token:
-            params["pageToken"] = page_token
-
-        response = requests.get(base_url, params=params)
-        if response.status_code != 200:
-            break
+BASE_URL = "https://clinicaltrials.gov/api/v2/studies"
+PAGE_SIZE = 100
+CONCURRENCY = 8
+REQUESTS_PER_SEC = 10
+MAX_RETRIES = 4
+OUTPUT_PATH = "data/clinical_trials_data.csv"
+MANIFEST_PATH = "data/clinical_trials_manifest.json"
+JOURNAL_PATH = "data/clinical_trials_journal.jsonl"
+COLUMNS = ["DrugName", "NCTId", "Title", "Status", "StartDate", "Conditions", "InterventionNames", "InterventionTypes",
+           "LastUpdatePostDate"]
+KEY = ["DrugName", "NCTId"]
+
+
+class FetchError(Exception):
+    pass
+
+
+async def fetch_page(session, limiter, drug_name, page_token=None, base_url=BASE_URL, since=None):
+    params = {
+        "query.term": drug_name,
+        "pageSize": PAGE_SIZE,
+        "format": "json"
+    }
+    if page_token:
+        params["pageToken"] = page_token
+    if since:
+        params["filter.advanced"] = f"AREA[LastUpdatePostDate]RANGE[{since},MAX]"
 
-        data = response.json()
-        studies.extend(data.get("studies", []))
-        print(studies)
+    for attempt in range(MAX_RETRIES):
+        await limiter.acquire()
+        try:
+            async with session.get(base_url, params=params) as response:
+                if response.status in (429, 502, 503, 504):
+                    await asyncio.sleep(2 ** attempt)
+                    continue
+                if response.status != 200:
+                    return None
+                return await response.json()
+        except asyncio.TimeoutError:
+            await asyncio.sleep(2 ** attempt)
+    return None
+
+
+async def fetch_studies(session, limiter, drug_name, base_url=BASE_URL, since=None):
+    page_token = None
+    while True:
+        data = await fetch_page(session, limiter, drug_name, page_token, base_url, since)
+        if data is None:
+            raise FetchError(f"request failed for {drug_name} (pageToken={page_token})")
+        yield data.get("studies", [])
         page_token = data.get("nextPageToken")
         if not page_token:
             break
 
-        time.sleep(0.5)
-
-    return studies
 
-rows = []
-
-for drug in df["Drug Name"]:
-    print(f"getting data for {drug}\n")
-    studies = fetch_studies(drug)
-    for study in studies:
-        info = study.get("protocolSection", {})
-        print(info)
-        identification = info.get("identificationModule", {})
+def flatten_study(drug, study, verbose=False):
+    info = study.get("protocolSection", {})
+    identification = info.get("identificationModule", {})
+    status = info.get("statusModule", {})
+    arms = info.get("armsInterventionsModule", {}).get("interventions", [])
+    conditions = info.get("conditionsModule", {}).get("conditions", [])
+    if verbose:
         print(identification)
-        status = info.get("statusModule", {})
         print(status)
-        arms = info.get("armsInterventionsModule", {}).get("interventions", [])
         print(arms)
-        conditions = info.get("conditionsModule", {}).get("conditions", [])
         print(conditions)
-        row = {
-            "DrugName": drug,
-            "NCTId": identification.get("nctId"),
-            "Title": identification.get("officialTitle"),
-            "Status": status.get("overallStatus"),
-            "StartDate": status.get("startDateStruct", {}).get("date"),
-            "Conditions": "; ".join(conditions),
-            "InterventionNames": "; ".join([i.get("interventionName") for i in arms if i.get("interventionName")]),
-            "InterventionTypes": "; ".join([i.get("interventionType") for i in arms if i.get("interventionType")])
-        }
-        rows.append(row)
-
-df_out = pd.DataFrame(rows)
-df_out.to_csv("data/clinical_trials_data.csv", index=False)
+    return {
+        "DrugName": drug,
+        "NCTId": identification.get("nctId"),
+        "Title": identification.get("officialTitle"),
+        "Status": status.get("overallStatus"),
+        "StartDate": status.get("startDateStruct", {}).get("date"),
+        "Conditions": "; ".join(conditions),
+        "InterventionNames": "; ".join([i.get("interventionName") for i in arms if i.get("interventionName")]),
+        "InterventionTypes": "; ".join([i.get("interventionType") for i in arms if i.get("interventionType")]),
+        "LastUpdatePostDate": status.get("lastUpdatePostDateStruct", {}).get("date")
+    }
+
+
+async def fetch_all(drugs, writer, base_url=BASE_URL, concurrency=CONCURRENCY, rate=REQUESTS_PER_SEC, verbose=False,
+                    since=None, journal=None, limiter=None):
+    """Paginate every drug concurrently; each worker owns one drug's page-token chain at a time.
+
+    Every page is flattened and handed to `writer.write_rows` as soon as it arrives, so nothing
+    beyond the in-flight pages is held in memory. `since` maps drug names to a YYYY-MM-DD
+    high-water mark; those drugs only fetch studies updated on or after it. Pages always come from
+    the API, never the HTTP response cache, since a cached page would predate the sync date stamped
+    for its drug. Drugs already finished in `journal`
+    (a job_journal.JobJournal) are skipped, and each drug is journaled once its last page is written.
+    A shared `limiter` replaces the `rate` budget. Returns the number of rows written and
+    {drug: sync date} for the drugs whose pagination finished cleanly, where the sync date is the
+    UTC day that drug's fetch started (kept in the journal, so resumed drugs keep their own date).
+    """
+    queue = asyncio.Queue()
+    completed = {}
+    for drug in drugs:
+        if journal is not None and (drug,) in journal:
+            completed[drug] = (journal.get((drug,)) or {}).get("last_sync")
+        else:
+            queue.put_nowait(drug)
+
+    since = since or {}
+    limiter = limiter or TokenBucket(rate)
+    total = 0
+    started = time.perf_counter()
+
+    async def worker(session):
+        nonlocal total
+        while True:
+            try:
+                drug = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            print(f"getting data for {drug}\n")
+            # RANGE[...] is inclusive, so the fetch start date as the mark never misses a same-day update.
+            sync_date = datetime.datetime.now(datetime.timezone.utc).date().isoformat()
+            try:
+                async for studies in fetch_studies(session, limiter, drug, base_url, since.get(drug)):
+                    writer.write_rows([flatten_study(drug, study, verbose) for study in studies])
+                    total += len(studies)
+            except (FetchError, aiohttp.ClientError, asyncio.TimeoutError) as e:
+                print(f"failed to fetch {drug}: {e}")
+                continue
+            completed[drug] = sync_date
+            if journal is not None:
+                journal.record((drug,), {"last_sync": sync_date})
+
+    connector = aiohttp.TCPConnector(limit_per_host=concurrency)
+    async with aiohttp.ClientSession(connector=connector) as session:
+        await asyncio.gather(*(worker(session) for _ in range(concurrency)))
+
+    elapsed = time.perf_counter() - started
+    rate_achieved = total / elapsed if elapsed else 0.0
+    print(f"fetched {total} studies for {len(drugs)} drugs in {elapsed:.1f}s ({rate_achieved:.1f} studies/sec)")
+    return total, completed
+
+
+def load_manifest(path=MANIFEST_PATH):
+    if not os.path.exists(path):
+        return {}
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_manifest(manifest, path=MANIFEST_PATH):
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(tmp, path)
+
+
+def read_dataset(path):
+    if path.endswith(".parquet"):
+        return pd.read_parquet(path)
+    return pd.read_csv(path, dtype=str, keep_default_na=False)
+
+
+def merge_delta(output, delta_path):
+    """Upsert the rows in `delta_path` into `output` by (DrugName, NCTId) and return the merged row count."""
+    delta = read_dataset(delta_path).drop_duplicates(KEY, keep="last")
+    if os.path.exists(output):
+        base = read_dataset(output)
+        replaced = pd.MultiIndex.from_frame(base[KEY]).isin(pd.MultiIndex.from_frame(delta[KEY]))
+        merged = pd.concat([base[~replaced], delta], ignore_index=True)
+    else:
+        merged = delta
+    tmp = output + ".tmp"
+    if output.endswith(".parquet"):
+        merged.to_parquet(tmp, index=False)
+    else:
+        merged.to_csv(tmp, index=False)
+    os.replace(tmp, output)
+    return len(merged)
+
+
+async def main(output=OUTPUT_PATH, row_group_size=ROW_GROUP_SIZE, verbose=False, incremental=False,
+               manifest_path=MANIFEST_PATH, resume=False, journal_path=JOURNAL_PATH, drugs=None, limiter=None):
+    """Fetch `drugs` (default: the drug list) into `output`."""
+    drugs = load_drug_names() if drugs is None else drugs
+    manifest = load_manifest(manifest_path)
+    journal = JobJournal(journal_path, resume)
+
+    if incremental and os.path.exists(output):
+        since = {d: manifest[d]["last_sync"] for d in drugs if d in manifest}
+        root, ext = os.path.splitext(output)
+        delta_path = f"{root}.delta{ext}"
+        prev = set_aside(delta_path) if resume else None
+        with open_writer(delta_path, COLUMNS, row_group_size=row_group_size) as writer:
+            if resume:
+                print(f"resuming: {carry_over(prev, 'DrugName', journal, writer)} rows from {len(journal)} finished drugs")
+            total, completed = await fetch_all(drugs, writer, verbose=verbose, since=since, journal=journal,
+                                               limiter=limiter)
+        rows = merge_delta(output, delta_path)
+        os.remove(delta_path)
+        print(f"upserted {total} updated studies; dataset now has {rows} rows")
+    else:
+        prev = set_aside(output) if resume else None
+        with open_writer(output, COLUMNS, row_group_size=row_group_size) as writer:
+            if resume:
+                print(f"resuming: {carry_over(prev, 'DrugName', journal, writer)} rows from {len(journal)} finished drugs")
+            total, completed = await fetch_all(drugs, writer, verbose=verbose, journal=journal, limiter=limiter)
+    journal.close()
+
+    for drug, sync_date in completed.items():
+        if sync_date:
+            manifest[drug] = {"last_sync": sync_date}
+    save_manifest(manifest, manifest_path)
+    unstamped = [d for d in drugs if not completed.get(d)]
+    if unstamped:
+        print(f"{len(unstamped)} drugs did not finish and keep their previous sync date: {', '.join(unstamped)}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fetch ClinicalTrials.gov studies for every drug in data/drug_list.csv")
+    parser.add_argument("--output", default=OUTPUT_PATH, help="output path; use a .parquet suffix for Parquet")
+    parser.add_argument("--row-group-size", type=int, default=ROW_GROUP_SIZE, help="rows per Parquet row group")
+    parser.add_argument("-v", "--verbose", action="store_true", help="print the raw modules of every study")
+    parser.add_argument("--incremental", action="store_true",
+                        help="only fetch studies updated since each drug's last sync and upsert them by NCTId")
+    parser.add_argument("--manifest", default=MANIFEST_PATH, help="per-drug sync high-water marks")
+    parser.add_argument("--resume", action="store_true",
+                        help="continue an interrupted run, skipping the drugs recorded in the job journal")
+    parser.add_argument("--journal", default=JOURNAL_PATH, help="per-drug completion journal")
+    args = parser.parse_args()
+    asyncio.run(main(args.output, args.row_group_size, args.verbose, args.incremental, args.manifest,
+                     args.resume, args.journal))
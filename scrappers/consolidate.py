@@ -0,0 +1,372 @@
+import argparse
+import hashlib
+import json
+import os
+import sqlite3
+import time
+from collections import namedtuple
+from datetime import datetime
+
+from drug_resolver import VOCAB_PATH, DrugResolver
+from name_matcher import normalize_name
+from orangebook_store import STORE_PATH as ORANGEBOOK_PATH
+from sdf_ingest import file_digest
+from table_cache import load_table, source_state
+
+DRUGS_PATH = "data/drugs.sqlite"
+CHEMBL_PATH = "chembl.csv"
+EMA_PATH = "data/medicines_output_medicines_en.xlsx"
+FDA_TABLES_PATH = "data/fda_downloads_100/fda_all_tables.csv"
+# The EMA export has a title block above its header row.
+EMA_HEADER_ROW = 8
+# Per field, the first source (in this order) that has a value supplies it.
+SOURCE_PRIORITY = ["drugbank", "chembl", "ema", "orangebook", "fda"]
+FIELDS = [
+    "drugbank_id", "name", "inchikey", "unii", "cas",
+    "chembl_id", "max_phase", "first_approval", "molecule_type", "smiles",
+    "ema_product_number", "ema_medicine_name", "ema_status", "atc_code", "ema_authorisation_date",
+    "orangebook_appl_no", "orangebook_approval_date", "applicant",
+    "fda_appl_no",
+]
+KEY_COLUMNS = ["drugbank_id", "inchikey", "unii", "cas"]
+SEPARATOR = " | "
+
+# A source yields (source_key, match keys, fields) records from `path`; see load_* below.
+Source = namedtuple("Source", ["name", "path", "load"])
+
+SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS sources (name TEXT PRIMARY KEY, path TEXT, mtime_ns INTEGER, size INTEGER, sha256 TEXT);
+CREATE TABLE IF NOT EXISTS records (
+    source TEXT, source_key TEXT, digest TEXT, drug_key TEXT,
+    PRIMARY KEY (source, source_key)
+);
+CREATE TABLE IF NOT EXISTS facts (source TEXT, source_key TEXT, drug_key TEXT, field TEXT, value TEXT);
+CREATE TABLE IF NOT EXISTS drug_fields (
+    drug_key TEXT, field TEXT, value TEXT, source TEXT, source_keys TEXT,
+    PRIMARY KEY (drug_key, field)
+);
+CREATE TABLE IF NOT EXISTS drugs (
+    drug_key TEXT PRIMARY KEY, {", ".join(f"{f} TEXT" for f in FIELDS)}, provenance TEXT
+);
+CREATE INDEX IF NOT EXISTS records_drug ON records (drug_key);
+CREATE INDEX IF NOT EXISTS facts_drug ON facts (drug_key);
+CREATE INDEX IF NOT EXISTS facts_record ON facts (source, source_key);
+{"".join(f"CREATE INDEX IF NOT EXISTS drugs_{c} ON drugs ({c});" for c in KEY_COLUMNS + ["chembl_id"])}
+"""
+
+
+def text(value):
+    if value is None or value != value:
+        return ""
+    return str(value).strip()
+
+
+def ema_date(value):
+    """EMA's dd/mm/yyyy -> ISO; anything else is kept as is."""
+    value = text(value)
+    try:
+        return datetime.strptime(value, "%d/%m/%Y").date().isoformat()
+    except ValueError:
+        return value
+
+
+def load_drugbank(path):
+    vocab = load_table(path, columns=["DrugBank ID", "Common name", "CAS", "UNII", "Standard InChI Key"],
+                       dtype=str, keep_default_na=False)
+    for dbid, name, cas, unii, inchikey in vocab.itertuples(index=False):
+        keys = {"drugbank_id": dbid}
+        yield dbid, keys, {"drugbank_id": dbid, "name": name, "cas": cas, "unii": unii, "inchikey": inchikey}
+
+
+def load_chembl(path):
+    df = load_table(path, columns=["drug_name", "chembl_id", "pref_name", "max_phase", "first_approval",
+                                   "molecule_type", "canonical_smiles", "standard_inchi_key"],
+                    dtype=str, keep_default_na=False)
+    for row in df.itertuples(index=False):
+        if not row.chembl_id:
+            continue
+        keys = {"inchikey": row.standard_inchi_key, "names": [row.drug_name, row.pref_name]}
+        yield row.drug_name, keys, {
+            "name": row.pref_name, "inchikey": row.standard_inchi_key, "chembl_id": row.chembl_id,
+            "max_phase": row.max_phase, "first_approval": row.first_approval, "molecule_type": row.molecule_type,
+            "smiles": row.canonical_smiles,
+        }
+
+
+def load_ema(path):
+    inn, substance = "International non-proprietary name (INN) / common name", "Active substance"
+    df = load_table(path, header=EMA_HEADER_ROW)
+    for _, row in df.iterrows():
+        number = text(row["EMA product number"])
+        if not number:
+            continue
+        keys = {"names": [text(row[inn]), text(row[substance])]}
+        yield number, keys, {
+            "name": text(row[inn]), "ema_product_number": number, "ema_medicine_name": text(row["Name of medicine"]),
+            "ema_status": text(row["Medicine status"]), "atc_code": text(row["ATC code (human)"]),
+            "ema_authorisation_date": ema_date(row["Marketing authorisation date"]),
+        }
+
+
+def load_orangebook(path):
+    db = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+    try:
+        rows = db.execute("SELECT drug, appl_type, appl_no, product_no, active_ingredient, approval_date, applicant "
+                          "FROM search_hits ORDER BY drug, appl_type, appl_no, product_no").fetchall()
+    finally:
+        db.close()
+    for drug, appl_type, appl_no, product_no, ingredient, approval_date, applicant in rows:
+        keys = {"names": [drug, ingredient]}
+        yield "|".join(text(v) for v in (drug, appl_type, appl_no, product_no)), keys, {
+            "name": text(ingredient), "orangebook_appl_no": text(appl_type) + text(appl_no),
+            "orangebook_approval_date": text(approval_date), "applicant": text(applicant),
+        }
+
+
+def load_fda(path):
+    df = load_table(path, columns=["DrugName", "ApplNo"], dtype=str, keep_default_na=False)
+    for drug, appl_no in df.drop_duplicates().itertuples(index=False):
+        yield f"{drug}|{appl_no}", {"names": [drug]}, {"name": drug, "fda_appl_no": appl_no}
+
+
+SOURCES = [
+    Source("drugbank", VOCAB_PATH, load_drugbank),
+    Source("chembl", CHEMBL_PATH, load_chembl),
+    Source("ema", EMA_PATH, load_ema),
+    Source("orangebook", ORANGEBOOK_PATH, load_orangebook),
+    Source("fda", FDA_TABLES_PATH, load_fda),
+]
+
+
+class IdentityIndex:
+    """Hash indexes from DrugBank ID, InChIKey, UNII, CAS and normalized name/synonym to one drug key.
+
+    Keys resolve in that order; a record matching no DrugBank entry is keyed by its InChIKey, or
+    else by its first normalized name, so the same unknown compound from two sources still meets.
+    """
+
+    def __init__(self, resolver):
+        self.resolver = resolver
+        self.by_key = {k: {} for k in KEY_COLUMNS}
+        for record in resolver.records:
+            dbid, _, cas, unii, inchikey = record
+            for column, value in zip(KEY_COLUMNS, (dbid, inchikey, unii, cas)):
+                if value:
+                    self.by_key[column].setdefault(value.upper(), dbid)
+
+    def drug_key(self, keys):
+        for column in KEY_COLUMNS:
+            value = text(keys.get(column)).upper()
+            if value and value in self.by_key[column]:
+                return self.by_key[column][value]
+        names = [n for n in keys.get("names", ()) if text(n)]
+        for name in names:
+            found = self.resolver.lookup(name)
+            if found is not None:
+                return found["drugbank_id"]
+        if text(keys.get("inchikey")):
+            return "inchikey:" + text(keys["inchikey"]).upper()
+        return "name:" + normalize_name(names[0]) if names else None
+
+
+def record_digest(drug_key, fields):
+    payload = json.dumps([drug_key, sorted((k, text(v)) for k, v in fields.items())])
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class DrugTable:
+    """The unified drug table and the per-source records it is joined from, in SQLite.
+
+    `facts` keeps every (source record, field, value); `drug_fields` the value chosen for each drug
+    and field with the source and source keys it came from; `drugs` one wide row per drug with a
+    JSON `provenance` column naming the source of each field. `records` holds a digest per source
+    record, so a re-run only rewrites the records that changed and rebuilds the drugs they touch.
+    """
+
+    def __init__(self, path=DRUGS_PATH, fresh=False):
+        if fresh and os.path.exists(path):
+            os.remove(path)
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.db = sqlite3.connect(path)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.executescript(SCHEMA)
+
+    def source_unchanged(self, source):
+        """Whether `source` is byte-for-byte what the last run joined (mtime and size, else SHA-256)."""
+        row = self.db.execute("SELECT path, mtime_ns, size, sha256 FROM sources WHERE name = ?",
+                              (source.name,)).fetchone()
+        if row is None or row[0] != source.path:
+            return False
+        state = source_state(source.path)
+        if (row[1], row[2]) == (state["mtime_ns"], state["size"]):
+            return True
+        return row[2] == state["size"] and row[3] == file_digest(source.path)
+
+    def mark_source(self, source):
+        state = source_state(source.path)
+        self.db.execute("INSERT OR REPLACE INTO sources VALUES (?, ?, ?, ?, ?)",
+                        (source.name, source.path, state["mtime_ns"], state["size"], file_digest(source.path)))
+
+    def joined_sources(self):
+        """Names of the sources the table currently holds records from."""
+        return [name for name, in self.db.execute("SELECT name FROM sources ORDER BY name")]
+
+    def drop_source(self, name):
+        """Delete every record of the source `name`; returns the drug keys touched."""
+        touched = {k for k, in self.db.execute("SELECT DISTINCT drug_key FROM records WHERE source = ?", (name,))}
+        self.db.execute("DELETE FROM facts WHERE source = ?", (name,))
+        self.db.execute("DELETE FROM records WHERE source = ?", (name,))
+        self.db.execute("DELETE FROM sources WHERE name = ?", (name,))
+        return touched
+
+    def sync_source(self, source, records):
+        """Replace the changed, new and vanished records of one source; returns the drug keys touched."""
+        old = {key: (digest, drug_key) for key, digest, drug_key in
+               self.db.execute("SELECT source_key, digest, drug_key FROM records WHERE source = ?", (source.name,))}
+        touched = set()
+        for key, (digest, drug_key, fields) in records.items():
+            previous = old.pop(key, None)
+            if previous is not None and previous[0] == digest:
+                continue
+            if previous is not None:
+                touched.add(previous[1])
+            touched.add(drug_key)
+            self.db.execute("DELETE FROM facts WHERE source = ? AND source_key = ?", (source.name, key))
+            self.db.executemany("INSERT INTO facts VALUES (?, ?, ?, ?, ?)",
+                                [(source.name, key, drug_key, f, text(v)) for f, v in fields.items() if text(v)])
+            self.db.execute("INSERT OR REPLACE INTO records VALUES (?, ?, ?, ?)", (source.name, key, digest, drug_key))
+        for key, (_, drug_key) in old.items():
+            touched.add(drug_key)
+            self.db.execute("DELETE FROM facts WHERE source = ? AND source_key = ?", (source.name, key))
+            self.db.execute("DELETE FROM records WHERE source = ? AND source_key = ?", (source.name, key))
+        return touched
+
+    def rebuild(self, drug_keys):
+        """Recompute the drug_fields and drugs rows of `drug_keys` from their facts."""
+        self.db.execute("CREATE TEMP TABLE IF NOT EXISTS touched (drug_key TEXT PRIMARY KEY)")
+        self.db.execute("DELETE FROM touched")
+        self.db.executemany("INSERT OR IGNORE INTO touched VALUES (?)", ((k,) for k in drug_keys))
+        self.db.execute("DELETE FROM drug_fields WHERE drug_key IN (SELECT drug_key FROM touched)")
+        self.db.execute("DELETE FROM drugs WHERE drug_key IN (SELECT drug_key FROM touched)")
+        grouped = {}
+        for drug_key, field, source, source_key, value in self.db.execute(
+                "SELECT drug_key, field, source, source_key, value FROM facts JOIN touched USING (drug_key)"):
+            grouped.setdefault(drug_key, {}).setdefault(field, {}).setdefault(source, []).append((source_key, value))
+        priority = {name: i for i, name in enumerate(SOURCE_PRIORITY)}
+        field_rows, drug_rows = [], []
+        for drug_key, fields in grouped.items():
+            row, provenance = {}, {}
+            for field, by_source in fields.items():
+                source = min(by_source, key=lambda s: priority.get(s, len(priority)))
+                entries = by_source[source]
+                value = SEPARATOR.join(sorted({v for _, v in entries}))
+                keys = SEPARATOR.join(sorted({k for k, _ in entries}))
+                field_rows.append((drug_key, field, value, source, keys))
+                row[field], provenance[field] = value, source
+            drug_rows.append((drug_key, *(row.get(f) for f in FIELDS), json.dumps(provenance, sort_keys=True)))
+        self.db.executemany("INSERT INTO drug_fields VALUES (?, ?, ?, ?, ?)", field_rows)
+        self.db.executemany(f"INSERT INTO drugs VALUES ({', '.join('?' * (len(FIELDS) + 2))})", drug_rows)
+        return len(drug_rows)
+
+    def lookup(self, column, value):
+        """Unified rows whose `column` (one of KEY_COLUMNS or chembl_id) equals `value`."""
+        if column not in KEY_COLUMNS + ["chembl_id"]:
+            raise ValueError(f"not an indexed column: {column}")
+        cur = self.db.execute(f"SELECT * FROM drugs WHERE {column} = ?", (value,))
+        names = [d[0] for d in cur.description]
+        return [dict(zip(names, row)) for row in cur]
+
+    def provenance(self, drug_key):
+        return self.db.execute("SELECT field, value, source, source_keys FROM drug_fields WHERE drug_key = ? "
+                               "ORDER BY field", (drug_key,)).fetchall()
+
+    def counts(self):
+        return {table: self.db.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+                for table in ("records", "facts", "drugs")}
+
+    def commit(self):
+        self.db.commit()
+
+    def close(self):
+        self.db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def consolidate(path=DRUGS_PATH, sources=SOURCES, resolver=None, refresh=False):
+    """Join every source into the unified table at `path`, re-joining only what changed.
+
+    Sources whose file is unchanged since the last run are not read. A changed DrugBank
+    vocabulary can move any record to another drug, so it re-reads every source (records whose
+    resolution and fields are the same still cost nothing to write). Sources joined before whose
+    file is now gone (or that are no longer among `sources`) have their records dropped.
+    Returns per-source stats.
+    """
+    resolver = resolver or DrugResolver.load()
+    index = IdentityIndex(resolver)
+    stats = {}
+    with DrugTable(path) as table:
+        present = [s for s in sources if os.path.exists(s.path)]
+        changed = [s for s in present if refresh or not table.source_unchanged(s)]
+        if any(s.name == "drugbank" for s in changed):
+            changed = present
+        touched = set()
+        removed = [name for name in table.joined_sources() if name not in {s.name for s in present}]
+        for name in removed:
+            touched |= table.drop_source(name)
+        for source in changed:
+            started = time.perf_counter()
+            records = {}
+            for key, keys, fields in source.load(source.path):
+                drug_key = index.drug_key(keys)
+                if drug_key is None:
+                    continue
+                records[key] = (record_digest(drug_key, fields), drug_key, fields)
+            hit = table.sync_source(source, records)
+            table.mark_source(source)
+            touched |= hit
+            stats[source.name] = {"records": len(records), "drugs_touched": len(hit),
+                                  "seconds": time.perf_counter() - started}
+        rebuilt = table.rebuild(touched - {None})
+        table.commit()
+        stats["rebuilt"] = rebuilt
+        stats["skipped"] = [s.name for s in present if s not in changed]
+        stats["removed"] = removed
+        stats.update(table.counts())
+    return stats
+
+
+def format_stats(stats):
+    lines = [f"{name:<11} {s['records']:>7} records, {s['drugs_touched']:>6} drugs touched in {s['seconds']:.2f}s"
+             for name, s in stats.items() if isinstance(s, dict)]
+    lines.append(f"unchanged: {', '.join(stats['skipped']) or '-'}; removed: {', '.join(stats['removed']) or '-'}; "
+                 f"rebuilt {stats['rebuilt']} drugs; table holds {stats['drugs']} drugs from {stats['records']} records")
+    return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Join ChEMBL, DrugBank, EMA, Orange Book and Drugs@FDA outputs into "
+                                                 "one drug table")
+    parser.add_argument("--db", default=DRUGS_PATH)
+    parser.add_argument("--refresh", action="store_true", help="re-read every source, even if unchanged")
+    parser.add_argument("--lookup", nargs=2, metavar=("COLUMN", "VALUE"),
+                        help=f"print the drugs whose COLUMN ({', '.join(KEY_COLUMNS)}, chembl_id) is VALUE")
+    for source in SOURCES:
+        parser.add_argument(f"--{source.name}", default=source.path, metavar="PATH", help=f"{source.name} input")
+    args = parser.parse_args()
+    sources = [s._replace(path=getattr(args, s.name)) for s in SOURCES]
+    if args.lookup:
+        with DrugTable(args.db) as table:
+            for row in table.lookup(*args.lookup):
+                print(row["drug_key"])
+                for field, value, source, keys in table.provenance(row["drug_key"]):
+                    print(f"  {field:<26} {value[:60]:<60} {source} ({keys[:40]})")
+    else:
+        started = time.perf_counter()
+        print(format_stats(consolidate(args.db, sources, refresh=args.refresh)))
+        print(f"in {time.perf_counter() - started:.2f}s")
@@ -0,0 +1,103 @@
+import argparse
+import hashlib
+import time
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+import pandas as pd
+
+from structure_store import STORE_PATH, StructureStore
+
+SIZE = (300, 300)
+FORMATS = ("svg", "png")
+CHUNK_SIZE = 64
+
+
+def parse_size(text):
+    """"300x200" -> (300, 200)."""
+    width, _, height = text.lower().partition("x")
+    return int(width), int(height or width)
+
+
+def cache_key(inchikey, smiles, size, fmt):
+    """Store key of one depiction: the InChIKey (or a SMILES hash without one), size and format."""
+    ident = inchikey or "smiles-" + hashlib.sha256(smiles.encode("utf-8")).hexdigest()[:27]
+    return f"{ident}@{size[0]}x{size[1]}.{fmt}"
+
+
+def render(smiles, size=SIZE, fmt="svg"):
+    """2D depiction of `smiles` as SVG text or PNG bytes, or None if RDKit cannot parse it."""
+    from rdkit import Chem
+    from rdkit.Chem import rdDepictor
+    from rdkit.Chem.Draw import rdMolDraw2D
+
+    mol = Chem.MolFromSmiles(smiles)
+    if mol is None:
+        return None
+    rdDepictor.Compute2DCoords(mol)
+    drawer = rdMolDraw2D.MolDraw2DSVG(*size) if fmt == "svg" else rdMolDraw2D.MolDraw2DCairo(*size)
+    rdMolDraw2D.PrepareAndDrawMolecule(drawer, mol)
+    drawer.FinishDrawing()
+    return drawer.GetDrawingText()
+
+
+def render_chunk(items, size, fmt):
+    from rdkit import RDLogger
+
+    RDLogger.DisableLog("rdApp.*")
+    return [(key, render(smiles, size, fmt)) for key, smiles in items]
+
+
+def depict_many(molecules, store, size=SIZE, fmt="svg", workers=None, refresh=False):
+    """Depictions for (inchikey, smiles) pairs as {(inchikey, smiles): image}.
+
+    Depictions already in `store` (a StructureStore) are read from it. The rest are rendered in a
+    process pool, CHUNK_SIZE molecules per task, and stored under cache_key. Molecules RDKit cannot
+    parse are left out of the result.
+    """
+    images, todo = {}, {}
+    for inchikey, smiles in molecules:
+        if not smiles:
+            continue
+        key = cache_key(inchikey, smiles, size, fmt)
+        if not refresh and key in store:
+            images[(inchikey, smiles)] = store.get(key) if fmt == "svg" else store.get_bytes(key)
+        else:
+            todo.setdefault(key, []).append((inchikey, smiles))
+    if not todo:
+        return images
+
+    keys = list(todo)
+    chunks = [[(key, todo[key][0][1]) for key in keys[i:i + CHUNK_SIZE]] for i in range(0, len(keys), CHUNK_SIZE)]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for results in pool.map(partial(render_chunk, size=size, fmt=fmt), chunks):
+            for key, image in results:
+                if image is None:
+                    continue
+                store.put(key, image)
+                for molecule in todo[key]:
+                    images[molecule] = image
+    return images
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Render 2D depictions for every SMILES in a table into the "
+                                                 "structure store")
+    parser.add_argument("path", nargs="?", default="chembl.csv", help="CSV or Parquet with SMILES and InChIKeys")
+    parser.add_argument("--smiles", default="canonical_smiles", help="SMILES column")
+    parser.add_argument("--inchikey", default="standard_inchi_key", help="InChIKey column")
+    parser.add_argument("--size", type=parse_size, default=SIZE, help="WIDTHxHEIGHT in pixels")
+    parser.add_argument("--format", choices=FORMATS, default="svg")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--db", default=STORE_PATH)
+    parser.add_argument("--refresh", action="store_true", help="render again even if a depiction is cached")
+    args = parser.parse_args()
+
+    df = pd.read_parquet(args.path) if args.path.endswith(".parquet") else pd.read_csv(args.path)
+    pairs = list(zip(df[args.inchikey].where(df[args.inchikey].notna(), None),
+                     df[args.smiles].where(df[args.smiles].notna(), None)))
+    started = time.perf_counter()
+    with StructureStore(args.db) as store:
+        images = depict_many(pairs, store, args.size, args.format, args.workers, args.refresh)
+        print(f"{len(images)} of {len(pairs)} molecules depicted in {time.perf_counter() - started:.2f}s "
+              f"({store.added} new images stored)")
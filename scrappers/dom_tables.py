@@ -0,0 +1,46 @@
+from http_page import HttpPage, inner_text, select
+
+# Every <table> on a page as [table][row][cell], read in one page.evaluate round-trip instead of a
+# query/inner_text call per cell. Cells come from the first selector in `cellSelectors` that matches
+# anything in the row. Each cell is {text, link, href}: its innerText, plus the innerText and href
+# attribute of the first <a> inside it (both null when there is none).
+TABLES_JS = """(cellSelectors) => Array.from(document.querySelectorAll("table"), table =>
+    Array.from(table.querySelectorAll("tr"), row => {
+        let cells = [];
+        for (const selector of cellSelectors) {
+            cells = row.querySelectorAll(selector);
+            if (cells.length) break;
+        }
+        return Array.from(cells, cell => {
+            const a = cell.querySelector("a");
+            return {text: cell.innerText, link: a ? a.innerText : null, href: a ? a.getAttribute("href") : null};
+        });
+    }))"""
+
+
+def parse_tables(root, cell_selectors=("th, td",)):
+    """TABLES_JS over a parsed lxml document, with http_page.inner_text standing in for innerText."""
+    tables = []
+    for table in select(root, "table"):
+        rows = []
+        for row in select(table, "tr"):
+            cells = []
+            for css in cell_selectors:
+                cells = select(row, css)
+                if cells:
+                    break
+            parsed = []
+            for cell in cells:
+                a = select(cell, "a")
+                parsed.append({"text": inner_text(cell), "link": inner_text(a[0]) if a else None,
+                               "href": a[0].get("href") if a else None})
+            rows.append(parsed)
+        tables.append(rows)
+    return tables
+
+
+async def read_tables(page, cell_selectors=("th, td",)):
+    """Return every table on `page` as a list of rows of {text, link, href} cell dicts."""
+    if isinstance(page, HttpPage):
+        return parse_tables(page.el, cell_selectors)
+    return await page.evaluate(TABLES_JS, list(cell_selectors))
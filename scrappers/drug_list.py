@@ -0,0 +1,17 @@
+from table_cache import load_table
+
+DRUG_LIST_PATH = "data/drug_list.csv"
+
+
+def load_drug_names(path=DRUG_LIST_PATH, limit=None, names=None):
+    """The distinct drug names of a drug list, in file order.
+
+    `names` picks a subset (kept in list order, unknown names appended) and `limit` keeps the
+    first N, so a trial run or a single drug needs no separate copy of the list. The column is
+    read from the list's Arrow sidecar (table_cache.load_table).
+    """
+    drugs = load_table(path, columns=["Drug Name"])["Drug Name"].dropna().astype(str).unique().tolist()
+    if names:
+        wanted = list(dict.fromkeys(names))
+        drugs = [d for d in drugs if d in wanted] + [n for n in wanted if n not in drugs]
+    return drugs[:limit] if limit else drugs
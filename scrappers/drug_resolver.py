@@ -0,0 +1,116 @@
+import os
+import pickle
+import sys
+import time
+
+from drug_list import load_drug_names
+from name_matcher import NameMatcher, normalize_name, strip_salts
+from sdf_ingest import file_digest
+from table_cache import load_table
+
+VOCAB_PATH = "data/drugbank vocabulary.csv"
+INDEX_PATH = "data/drugbank_index.pkl"
+INDEX_VERSION = 1
+FIELDS = ["drugbank_id", "name", "cas", "unii", "inchikey"]
+VOCAB_COLUMNS = ["DrugBank ID", "Common name", "CAS", "UNII", "Standard InChI Key", "Synonyms"]
+FUZZY_MIN_SCORE = 0.85
+
+
+class DrugResolver:
+    """Exact name/synonym -> DrugBank record lookups from an in-memory hash index.
+
+    The index is built once from the DrugBank vocabulary CSV and pickled next to it; `load`
+    rebuilds it only when the CSV's content hash changes.
+    """
+
+    def __init__(self, records, index):
+        self.records = records
+        self.index = index
+        self.matcher = None
+        self.hits = 0
+        self.fuzzy_hits = 0
+        self.misses = 0
+
+    @classmethod
+    def build(cls, vocab_path=VOCAB_PATH):
+        vocab = load_table(vocab_path, columns=VOCAB_COLUMNS, dtype=str, keep_default_na=False)
+        records = list(zip(vocab["DrugBank ID"], vocab["Common name"], vocab["CAS"], vocab["UNII"],
+                           vocab["Standard InChI Key"]))
+        index = {}
+        # Common names win over synonyms when both normalise to the same key.
+        for i, name in enumerate(vocab["Common name"]):
+            index.setdefault(normalize_name(name), i)
+        for i, synonyms in enumerate(vocab["Synonyms"]):
+            for syn in synonyms.split(" | ") if synonyms else ():
+                index.setdefault(normalize_name(syn), i)
+        for i, (_, _, cas, unii, _) in enumerate(records):
+            for ident in (cas, unii):
+                if ident:
+                    index.setdefault(normalize_name(ident), i)
+        index.pop("", None)
+        return cls(records, index)
+
+    @classmethod
+    def load(cls, vocab_path=VOCAB_PATH, index_path=INDEX_PATH):
+        digest = file_digest(vocab_path)
+        if os.path.exists(index_path):
+            with open(index_path, "rb") as f:
+                payload = pickle.load(f)
+            if payload.get("version") == INDEX_VERSION and payload.get("source") == digest:
+                return cls(payload["records"], payload["index"])
+        resolver = cls.build(vocab_path)
+        tmp = index_path + ".tmp"
+        with open(tmp, "wb") as f:
+            pickle.dump({"version": INDEX_VERSION, "source": digest, "records": resolver.records,
+                         "index": resolver.index}, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, index_path)
+        return resolver
+
+    def find(self, name):
+        """lookup() without counting towards the hit and miss stats."""
+        i = self.index.get(normalize_name(name))
+        if i is None:
+            i = self.index.get(normalize_name(strip_salts(name)))
+        return None if i is None else dict(zip(FIELDS, self.records[i]))
+
+    def lookup(self, name):
+        """Return a dict of FIELDS for `name` (exact, then salt-stripped), or None."""
+        rec = self.find(name)
+        if rec is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return rec
+
+    def fuzzy_lookup(self, name, min_score=FUZZY_MIN_SCORE):
+        """Best spelling-tolerant match for `name` as a dict of FIELDS plus "score", or None."""
+        if self.matcher is None:
+            self.matcher = NameMatcher(self.index.items())
+        found = self.matcher.best(name, min_score)
+        if found is None:
+            return None
+        return {**dict(zip(FIELDS, self.records[found.value])), "score": found.score}
+
+    def resolve(self, name):
+        """Exact lookup, falling back to fuzzy matching over every indexed name and synonym."""
+        rec = self.lookup(name)
+        if rec is None:
+            rec = self.fuzzy_lookup(name)
+            if rec is not None:
+                self.misses -= 1
+                self.fuzzy_hits += 1
+        return rec
+
+
+if __name__ == "__main__":
+    started = time.perf_counter()
+    resolver = DrugResolver.load()
+    print(f"loaded {len(resolver.index)} names for {len(resolver.records)} drugs in "
+          f"{(time.perf_counter() - started) * 1000:.1f} ms")
+    names = sys.argv[1:] or load_drug_names()
+    started = time.perf_counter()
+    resolved = [resolver.lookup(n) for n in names]
+    per_lookup = (time.perf_counter() - started) / len(names) * 1e6
+    for name, rec in zip(names, resolved):
+        print(f"{name:45} {rec['drugbank_id'] + ' ' + rec['name'] if rec else '-'}")
+    print(f"{resolver.hits}/{len(names)} resolved offline, {per_lookup:.1f} us/lookup")
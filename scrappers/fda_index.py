@@ -0,0 +1,82 @@
+import json
+import os
+import re
+import time
+
+from name_matcher import CANDIDATES, NameMatcher
+
+INDEX_PATH = "data/fda_letter_index.json"
+INDEX_TTL = 7 * 24 * 3600
+
+
+class LetterIndex:
+    """Local copy of the Drugs@FDA browse-by-letter pages: each letter's drug links in page order.
+
+    An entry is {"name", "appl_no", "href"}. Letters are stored with the time they were read and
+    count as stale after `ttl` seconds, so a warm run takes the overview links from here instead of
+    loading the letter pages. `matches` picks the entries whose names match a drug list: exactly on
+    exact_key by default, or, given a `min_score`, through a NameMatcher over the letter's names
+    (hash lookup on the normalized name, salt stripping and n-gram candidates for near misses).
+    """
+
+    def __init__(self, path=INDEX_PATH, ttl=INDEX_TTL):
+        self.path = path
+        self.ttl = ttl
+        self.letters = {}
+        self.matchers = {}
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                self.letters = json.load(f)["letters"]
+
+    def fresh(self, letter):
+        built = self.letters.get(letter)
+        return built is not None and time.time() - built["built_at"] < self.ttl
+
+    def entries(self, letter):
+        return self.letters[letter]["entries"]
+
+    def update(self, letter, entries):
+        """Replace a letter's links after reading its page, and save the index at once."""
+        self.letters[letter] = {"built_at": time.time(), "entries": entries}
+        self.matchers.pop(letter, None)
+        self.save()
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp = self.path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"letters": self.letters}, f)
+        os.replace(tmp, self.path)
+
+    def matcher(self, letter):
+        if letter not in self.matchers:
+            positions = {}
+            for i, entry in enumerate(self.entries(letter)):
+                positions.setdefault(entry["name"], []).append(i)
+            self.matchers[letter] = NameMatcher.from_names(positions), positions
+        return self.matchers[letter]
+
+    def matches(self, letter, targets, min_score=None):
+        """Positions, in page order, of the letter's entries whose name matches one of `targets`,
+        exactly unless a fuzzy `min_score` is given."""
+        if min_score is None:
+            wanted = {exact_key(t) for t in targets}
+            return [i for i, entry in enumerate(self.entries(letter)) if exact_key(entry["name"]) in wanted]
+        matcher, positions = self.matcher(letter)
+        found = set()
+        for target in targets:
+            for match in matcher.match(target, limit=CANDIDATES, min_score=min_score):
+                found.update(positions[match.value])
+        return sorted(found)
+
+
+def exact_key(name):
+    """Upper-cased name without parenthesised text or punctuation, the drug list's exact-match key."""
+    name = re.sub(r"\(.*?\)", "", str(name))
+    return re.sub(r"[^\w\s]", "", name).strip().upper()
+
+
+def target_letters(targets, letters):
+    """The browse letters a drug list can match: the first letters of its names, within `letters`."""
+    wanted = {name.strip()[:1].upper() for name in targets}
+    return [letter for letter in letters if letter in wanted]
@@ -0,0 +1,242 @@
+import hashlib
+import json
+import sqlite3
+import time
+from contextlib import asynccontextmanager
+
+import aiohttp
+from multidict import CIMultiDict, CIMultiDictProxy
+from yarl import URL
+
+CACHE_PATH = "data/http_cache.sqlite"
+DEFAULT_TTL = 7 * 24 * 3600
+MAX_BYTES = 2 * 1024 ** 3
+CACHEABLE_STATUS = (200, 404)
+# aiohttp and Playwright hand us decoded bodies, so these no longer describe what we store.
+DROP_HEADERS = {"content-encoding", "content-length", "transfer-encoding", "connection"}
+
+
+class ResponseCache:
+    """SQLite-backed HTTP response cache keyed by a hash of (method, url, params).
+
+    Entries younger than `ttl` are served directly. Older entries are revalidated with
+    If-None-Match / If-Modified-Since when the server gave an ETag or Last-Modified, and
+    the least recently used entries are evicted once the stored bodies exceed `max_bytes`.
+    """
+
+    def __init__(self, path=CACHE_PATH, ttl=DEFAULT_TTL, max_bytes=MAX_BYTES):
+        self.path = path
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.execute("""
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                method TEXT,
+                url TEXT,
+                status INTEGER,
+                headers TEXT,
+                body BLOB,
+                etag TEXT,
+                last_modified TEXT,
+                stored_at REAL,
+                accessed_at REAL,
+                size INTEGER
+            )
+        """)
+        self.db.execute("CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed_at)")
+        self.db.commit()
+        self.total_bytes = self.db.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        self.hits = 0
+        self.misses = 0
+        self.revalidated = 0
+        self.evicted = 0
+
+    @staticmethod
+    def make_key(method, url, params=None):
+        items = sorted((str(k), str(v)) for k, v in (params or {}).items())
+        raw = json.dumps([method.upper(), url, items], separators=(",", ":"))
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def lookup(self, key):
+        """Return (entry, fresh) where entry is a dict or None."""
+        row = self.db.execute(
+            "SELECT status, headers, body, etag, last_modified, stored_at FROM responses WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None:
+            return None, False
+        status, headers, body, etag, last_modified, stored_at = row
+        self.db.execute("UPDATE responses SET accessed_at = ? WHERE key = ?", (time.time(), key))
+        entry = {
+            "status": status,
+            "headers": json.loads(headers),
+            "body": body,
+            "etag": etag,
+            "last_modified": last_modified,
+        }
+        return entry, (time.time() - stored_at) < self.ttl
+
+    def conditional_headers(self, entry):
+        headers = {}
+        if entry and entry["etag"]:
+            headers["If-None-Match"] = entry["etag"]
+        if entry and entry["last_modified"]:
+            headers["If-Modified-Since"] = entry["last_modified"]
+        return headers
+
+    def store(self, key, method, url, status, headers, body):
+        headers = {k: v for k, v in headers.items() if k.lower() not in DROP_HEADERS}
+        lowered = {k.lower(): v for k, v in headers.items()}
+        now = time.time()
+        old = self.db.execute("SELECT size FROM responses WHERE key = ?", (key,)).fetchone()
+        self.db.execute(
+            "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (key, method.upper(), url, status, json.dumps(headers), body, lowered.get("etag"),
+             lowered.get("last-modified"), now, now, len(body)),
+        )
+        self.db.commit()
+        self.total_bytes += len(body) - (old[0] if old else 0)
+        if self.total_bytes > self.max_bytes:
+            self.evict()
+
+    def touch(self, key):
+        self.db.execute("UPDATE responses SET stored_at = ? WHERE key = ?", (time.time(), key))
+        self.db.commit()
+
+    def evict(self, target=None):
+        target = self.max_bytes * 0.9 if target is None else target
+        rows = self.db.execute("SELECT key, size FROM responses ORDER BY accessed_at").fetchall()
+        doomed = []
+        for key, size in rows:
+            if self.total_bytes <= target:
+                break
+            doomed.append((key,))
+            self.total_bytes -= size
+        self.db.executemany("DELETE FROM responses WHERE key = ?", doomed)
+        self.db.commit()
+        self.evicted += len(doomed)
+
+    def stats(self):
+        requests = self.hits + self.misses + self.revalidated
+        served = self.hits + self.revalidated
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "revalidated": self.revalidated,
+            "evicted": self.evicted,
+            "hit_rate": served / requests if requests else 0.0,
+            "bytes": self.total_bytes,
+        }
+
+    def close(self):
+        self.db.commit()
+        self.db.close()
+
+
+def request_info(url, params=None, headers=None):
+    """The aiohttp.RequestInfo of a GET for `url` with `params` and `headers`."""
+    url = URL(url).update_query(params) if params else URL(url)
+    return aiohttp.RequestInfo(url, "GET", CIMultiDictProxy(CIMultiDict(headers or {})), url)
+
+
+class CachedResponse:
+    def __init__(self, url, status, headers, body, request_info):
+        self.url = url
+        self.status = status
+        self.headers = CIMultiDict(headers)
+        self.body = body
+        self.request_info = request_info
+
+    def raise_for_status(self):
+        if self.status >= 400:
+            raise aiohttp.ClientResponseError(self.request_info, (), status=self.status,
+                                              message=f"HTTP {self.status} for {self.url}", headers=self.headers)
+
+    async def read(self):
+        return self.body
+
+    async def text(self, encoding="utf-8"):
+        return self.body.decode(encoding, errors="replace")
+
+    async def json(self, **kwargs):
+        return json.loads(self.body)
+
+
+class CachedSession:
+    """Wraps an aiohttp.ClientSession so `async with session.get(...) as r` goes through a ResponseCache.
+
+    Only GET is cached; every other attribute is delegated to the wrapped session.
+    """
+
+    def __init__(self, session, cache):
+        self.session = session
+        self.cache = cache
+
+    def __getattr__(self, name):
+        return getattr(self.session, name)
+
+    @asynccontextmanager
+    async def get(self, url, params=None, headers=None, **kwargs):
+        cache = self.cache
+        key = cache.make_key("GET", url, params)
+        entry, fresh = cache.lookup(key)
+        if entry and fresh:
+            cache.hits += 1
+            yield CachedResponse(url, entry["status"], entry["headers"], entry["body"],
+                                 request_info(url, params, headers))
+            return
+
+        request_headers = dict(headers or {})
+        request_headers.update(cache.conditional_headers(entry))
+        async with self.session.get(url, params=params, headers=request_headers, **kwargs) as r:
+            if r.status == 304 and entry:
+                cache.revalidated += 1
+                cache.touch(key)
+                yield CachedResponse(url, entry["status"], entry["headers"], entry["body"], r.request_info)
+                return
+            cache.misses += 1
+            body = await r.read()
+            if r.status in CACHEABLE_STATUS:
+                cache.store(key, "GET", url, r.status, dict(r.headers), body)
+            yield CachedResponse(url, r.status, dict(r.headers), body, r.request_info)
+
+
+async def install_playwright_cache(context, cache, resource_types=("document",)):
+    """Serve GET document loads of a Playwright browser context from `cache`. PDF downloads are passed through."""
+
+    async def handle(route):
+        request = route.request
+        if (request.method != "GET" or request.resource_type not in resource_types
+                or request.url.split("#")[0].lower().endswith(".pdf")):
+            await route.continue_()
+            return
+        key = cache.make_key("GET", request.url)
+        entry, fresh = cache.lookup(key)
+        if entry and fresh:
+            cache.hits += 1
+            await route.fulfill(status=entry["status"], headers=entry["headers"], body=entry["body"])
+            return
+        headers = dict(request.headers)
+        headers.update(cache.conditional_headers(entry))
+        response = await route.fetch(headers=headers)
+        if response.status == 304 and entry:
+            cache.revalidated += 1
+            cache.touch(key)
+            await route.fulfill(status=entry["status"], headers=entry["headers"], body=entry["body"])
+            return
+        cache.misses += 1
+        body = await response.body()
+        headers = {k: v for k, v in response.headers.items() if k.lower() not in DROP_HEADERS}
+        if response.status in CACHEABLE_STATUS:
+            cache.store(key, "GET", request.url, response.status, headers, body)
+        await route.fulfill(status=response.status, headers=headers, body=body)
+
+    await context.route("**/*", handle)
+
+
+def format_stats(cache):
+    s = cache.stats()
+    return (f"cache: {s['hits']} hits, {s['revalidated']} revalidated, {s['misses']} misses "
+            f"({s['hit_rate']:.0%} served locally), {s['evicted']} evicted, {s['bytes'] / 2**20:.1f} MiB on disk")
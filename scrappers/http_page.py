@@ -0,0 +1,157 @@
+import re
+from functools import lru_cache
+
+import aiohttp
+import lxml.html
+from lxml.cssselect import CSSSelector
+
+# Browserless stand-in for the parts of Playwright's Page API the scrapers use on server-rendered pages:
+# one GET through a shared (pooled, optionally cached) aiohttp session, then lxml for queries and text.
+
+POOL_LIMIT = 16
+SKIP_TAGS = {"head", "script", "style", "noscript", "template", "title"}
+# Block elements open and close a line in innerText; paragraphs and headings leave a blank line.
+LINE_BREAKS = {
+    **dict.fromkeys(["address", "article", "aside", "blockquote", "caption", "dd", "div", "dl", "dt", "fieldset",
+                     "figcaption", "figure", "footer", "form", "header", "hr", "li", "main", "nav", "ol", "section",
+                     "table", "tbody", "thead", "tfoot", "tr", "ul"], 1),
+    **dict.fromkeys(["p", "h1", "h2", "h3", "h4", "h5", "h6"], 2),
+}
+
+
+@lru_cache(maxsize=None)
+def selector(css):
+    return CSSSelector(css)
+
+
+def select(el, css):
+    """querySelectorAll semantics: matching descendants of `el`, in document order, excluding `el`."""
+    return [e for e in selector(css)(el) if e is not el]
+
+
+def collect_text(node, out):
+    tag = node.tag if isinstance(node.tag, str) else None
+    if tag == "br":
+        out.append(("\n",))
+    elif tag is not None and tag not in SKIP_TAGS:
+        breaks = LINE_BREAKS.get(tag, 0)
+        out.append(breaks)
+        if node.text:
+            out.append(node.text)
+        for child in node:
+            collect_text(child, out)
+        out.append(breaks)
+        if tag in ("td", "th") and node.getnext() is not None and node.getnext().tag in ("td", "th"):
+            out.append(("\t",))
+    if node.tail:
+        out.append(node.tail)
+
+
+def inner_text(el):
+    """Approximate a rendered element's innerText from static HTML.
+
+    Runs of whitespace collapse to one space, <br> becomes a newline, block elements start and end
+    lines, table cells are tab-separated, and lines are trimmed. Non-breaking spaces are kept.
+    """
+    out = []
+    if el.text:
+        out.append(el.text)
+    for child in el:
+        collect_text(child, out)
+
+    parts, pending = [], 0
+    for item in out:
+        if isinstance(item, int):
+            pending = max(pending, item)
+            continue
+        text = item[0] if isinstance(item, tuple) else re.sub(r"[ \t\n\r\f]+", " ", item)
+        if text == " " and pending:
+            continue
+        if pending and parts:
+            parts.append("\n" * pending)
+        pending = 0
+        parts.append(text)
+    text = re.sub(r" +", " ", "".join(parts))
+    return re.sub(r" *([\n\t]) *", r"\1", text).strip(" \n")
+
+
+def inner_html(el):
+    html = (el.text or "") + "".join(lxml.html.tostring(child, encoding=str) for child in el)
+    return html.replace("\xa0", "&nbsp;")
+
+
+class HttpElement:
+    def __init__(self, el):
+        self.el = el
+
+    async def query_selector_all(self, css):
+        return [HttpElement(e) for e in select(self.el, css)]
+
+    async def query_selector(self, css):
+        found = select(self.el, css)
+        return HttpElement(found[0]) if found else None
+
+    async def inner_text(self):
+        return inner_text(self.el)
+
+    async def inner_html(self):
+        return inner_html(self.el)
+
+    async def get_attribute(self, name):
+        return self.el.get(name)
+
+
+class HttpLocator:
+    def __init__(self, page, css):
+        self.page = page
+        self.css = css
+
+    async def all(self):
+        return await self.page.query_selector_all(self.css)
+
+
+class HttpPage(HttpElement):
+    """A page loaded with a plain GET instead of a browser, for pages that need no JavaScript.
+
+    Waits succeed or fail immediately, because the whole document is there once `goto` returns.
+    `goto` raises aiohttp.ClientResponseError for a non-2xx status, as a failed navigation would.
+    """
+
+    def __init__(self, session):
+        super().__init__(None)
+        self.session = session
+        self.url = None
+        self.html = ""
+
+    async def goto(self, url, **kwargs):
+        async with self.session.get(url) as r:
+            r.raise_for_status()
+            self.html = await r.text()
+            status = r.status
+        self.url = url
+        self.el = lxml.html.document_fromstring(self.html or "<html></html>")
+        return status
+
+    async def content(self):
+        return self.html
+
+    async def wait_for_selector(self, css, timeout=None, **kwargs):
+        found = await self.query_selector(css)
+        if found is None:
+            raise TimeoutError(f"{css} not found on {self.url}")
+        return found
+
+    async def wait_for_load_state(self, state=None, **kwargs):
+        pass
+
+    def locator(self, css):
+        return HttpLocator(self, css)
+
+    async def close(self):
+        pass
+
+
+def open_session(limit=POOL_LIMIT):
+    """One pooled aiohttp session to share between every HttpPage of a run."""
+    connector = aiohttp.TCPConnector(limit=limit, limit_per_host=limit)
+    return aiohttp.ClientSession(connector=connector, timeout=aiohttp.ClientTimeout(total=60))
@@ -0,0 +1,110 @@
+import json
+import os
+
+import pandas as pd
+
+
+class JobJournal:
+    """Append-only JSON-lines log of finished work units, so an interrupted run can pick up where it stopped.
+
+    A unit is a tuple of JSON values such as (drug,) or (letter, index). `record` appends it with
+    an optional payload (the unit's results) and flushes the line to disk at once. Opened with
+    `resume`, the existing log is replayed and `unit in journal` / `journal.get(unit)` answer from
+    it; otherwise the log starts empty. A torn last line from a crash is ignored.
+    """
+
+    def __init__(self, path, resume=False):
+        self.path = path
+        self.entries = {}
+        if resume and os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue
+                    self.entries[self.key(entry["unit"])] = entry.get("data")
+            self.rewrite()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.file = open(path, "a" if resume else "w", encoding="utf-8")
+        self.resumed = len(self.entries)
+
+    @staticmethod
+    def key(unit):
+        return json.dumps(list(unit))
+
+    def __contains__(self, unit):
+        return self.key(unit) in self.entries
+
+    def __len__(self):
+        return len(self.entries)
+
+    def get(self, unit, default=None):
+        return self.entries.get(self.key(unit), default)
+
+    def units(self):
+        return [tuple(json.loads(k)) for k in self.entries]
+
+    def record(self, unit, data=None):
+        self.entries[self.key(unit)] = data
+        self.file.write(json.dumps({"unit": list(unit), "data": data}) + "\n")
+        self.file.flush()
+        os.fsync(self.file.fileno())
+
+    def forget(self, units):
+        """Drop `units` so they are redone, e.g. when their rows could not be recovered."""
+        for unit in units:
+            self.entries.pop(self.key(unit), None)
+        self.file.close()
+        self.rewrite()
+        self.file = open(self.path, "a", encoding="utf-8")
+
+    def rewrite(self):
+        """Compact the log to one line per unit, dropping torn or superseded lines."""
+        tmp = self.path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            for key, data in self.entries.items():
+                f.write(json.dumps({"unit": json.loads(key), "data": data}) + "\n")
+        os.replace(tmp, self.path)
+
+    def close(self):
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def set_aside(path):
+    """Move a previous output out of the way before it is rewritten; returns its new path or None."""
+    if not os.path.exists(path):
+        return None
+    prev = path + ".prev"
+    os.replace(path, prev)
+    return prev
+
+
+def carry_over(prev, column, journal, writer):
+    """Copy the rows of `prev` whose `column` value is a finished (value,) unit of `journal` into `writer`.
+
+    Streamed outputs are rewritten on resume, so the finished units' rows come from the previous
+    file. A Parquet file cut off before its footer cannot be read; its units are forgotten and
+    fetched again. Returns the number of rows carried over and removes `prev`.
+    """
+    if prev is None:
+        journal.forget(journal.units())
+        return 0
+    try:
+        df = pd.read_parquet(prev) if prev.endswith(".parquet.prev") else pd.read_csv(prev, dtype=str,
+                                                                                       keep_default_na=False)
+    except Exception as e:
+        print(f"could not read {prev} ({e}); redoing {len(journal)} journaled units")
+        journal.forget(journal.units())
+        return 0
+    done = {unit[0] for unit in journal.units()}
+    df = df[df[column].isin(done)]
+    writer.write_rows(df.astype(object).where(df.notna(), None).to_dict("records"))
+    os.remove(prev)
+    return len(df)
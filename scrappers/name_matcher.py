@@ -0,0 +1,192 @@
+import re
+from collections import namedtuple
+
+import numpy as np
+
+# Counter-ions, hydrates and solvates that trail a parent drug name in product listings.
+ANION_WORDS = {
+    "acetate", "besylate", "bromide", "chloride", "citrate", "diaspartate", "dihydrochloride", "dimesylate",
+    "edisylate", "fumarate", "hemifumarate", "hydrobromide", "hydrochloride", "hyclate", "iodide", "lactate",
+    "malate", "maleate", "mesylate", "napadisilate", "nitrate", "oxalate", "phosphate", "succinate", "sulfate",
+    "tartrate", "tosylate", "hcl",
+}
+CATION_WORDS = {"calcium", "disodium", "magnesium", "potassium", "sodium"}
+HYDRATE_WORDS = {"anhydrous", "dihydrate", "hydrate", "monohydrate", "propanediol", "sesquihydrate", "trihydrate"}
+SALT_WORDS = ANION_WORDS | CATION_WORDS | HYDRATE_WORDS
+# Stereo descriptors written in front of a counter-ion, as in 'Cabozantinib S-malate' or 'Gemigliptin L-tartrate'.
+STEREO_PREFIXES = {"d", "dl", "l", "r", "s"}
+NGRAM = 3
+CANDIDATES = 16
+
+Match = namedtuple("Match", ["name", "value", "distance", "score"])
+
+
+def normalize_name(s):
+    if not isinstance(s, str):
+        return ""
+    return re.sub(r"[\s\-_,.;:/]+", "", s).lower()
+
+
+def salt_word(token, tolerance=0):
+    """The SALT_WORDS entry `token` is, or (for tokens over five letters) is within `tolerance` edits of."""
+    if token in SALT_WORDS:
+        return token
+    if tolerance and len(token) > 5:
+        for w in sorted(SALT_WORDS):
+            if abs(len(token) - len(w)) <= tolerance and levenshtein(token, w) <= tolerance:
+                return w
+    return None
+
+
+def strip_salts(s, tolerance=0):
+    """'Ponatinib Hydrochloride' -> 'ponatinib', 'Cabozantinib S-malate' -> 'cabozantinib'.
+
+    Trailing counter-ions and hydrates are dropped while a stem remains, along with an R/S or D/L
+    prefix on a dropped counter-ion. An anion right after a cation is kept with it, since the pair
+    names the drug itself ('Potassium Chloride', 'Bismuth Potassium Citrate'). With `tolerance`,
+    words within that edit distance of a salt word count as that word.
+    """
+    if not isinstance(s, str):
+        return ""
+    tokens = re.split(r"[\s\-_,.;:/]+", re.sub(r"\(.*?\)", " ", s).strip().lower())
+    tokens = [t for t in tokens if t]
+    while len(tokens) > 1:
+        word = salt_word(tokens[-1], tolerance)
+        if word is None or (word in ANION_WORDS and salt_word(tokens[-2], tolerance) in CATION_WORDS):
+            break
+        tokens.pop()
+        if word not in HYDRATE_WORDS and len(tokens) > 1 and tokens[-1] in STEREO_PREFIXES:
+            tokens.pop()
+    return " ".join(tokens)
+
+
+def pattern_masks(a):
+    peq = {}
+    for i, c in enumerate(a):
+        peq[c] = peq.get(c, 0) | (1 << i)
+    return peq
+
+
+def levenshtein(a, b, peq=None):
+    """Edit distance using Myers/Hyyrö bit-parallel rows, O(len(b)) big-int operations.
+
+    Pass `peq=pattern_masks(a)` when comparing one `a` against many strings.
+    """
+    if not a:
+        return len(b)
+    if not b:
+        return len(a)
+    if peq is None:
+        peq = pattern_masks(a)
+    mask = (1 << len(a)) - 1
+    last = 1 << (len(a) - 1)
+    pv, mv, score = mask, 0, len(a)
+    for c in b:
+        eq = peq.get(c, 0)
+        xv = eq | mv
+        xh = (((eq & pv) + pv) ^ pv) | eq
+        ph = mv | (~(xh | pv) & mask)
+        mh = pv & xh
+        if ph & last:
+            score += 1
+        elif mh & last:
+            score -= 1
+        ph = ((ph << 1) | 1) & mask
+        mh = (mh << 1) & mask
+        pv = mh | (~(xv | ph) & mask)
+        mv = ph & xv
+    return score
+
+
+def ngrams(key, n=NGRAM):
+    padded = f"^{key}$"
+    return {padded[i:i + n] for i in range(max(1, len(padded) - n + 1))}
+
+
+class NameMatcher:
+    """Ranked fuzzy lookup over a fixed set of names.
+
+    Names are reduced to normalize_name keys. An n-gram inverted index picks the CANDIDATES keys
+    sharing the most n-grams with the query, and those are ranked by Levenshtein distance.
+    Queries are tried as given and salt-stripped; exact key hits score 1.0.
+    """
+
+    def __init__(self, names):
+        self.keys = []
+        self.names = []
+        self.values = []
+        self.exact = {}
+        postings = {}
+        for name, value in names:
+            key = normalize_name(name)
+            if not key or key in self.exact:
+                continue
+            idx = len(self.keys)
+            self.exact[key] = idx
+            self.keys.append(key)
+            self.names.append(name)
+            self.values.append(value)
+            for gram in ngrams(key):
+                postings.setdefault(gram, []).append(idx)
+        self.postings = {g: np.array(ids, dtype=np.int32) for g, ids in postings.items()}
+
+    @classmethod
+    def from_names(cls, names, salt_forms=True):
+        """Index plain names (value = the name itself), plus their salt-stripped forms if `salt_forms`."""
+        names = list(names)
+        pairs = [(name, name) for name in names]
+        if salt_forms:
+            pairs += [(strip_salts(name), name) for name in names]
+        return cls(pairs)
+
+    def query_keys(self, name):
+        keys = [normalize_name(name), normalize_name(strip_salts(name)), normalize_name(strip_salts(name, 2))]
+        return [k for i, k in enumerate(keys) if k and k not in keys[:i]]
+
+    def candidates(self, key):
+        lists = [self.postings[g] for g in ngrams(key) if g in self.postings]
+        if not lists:
+            return np.empty(0, dtype=np.int32)
+        counts = np.bincount(np.concatenate(lists))
+        # Keys sharing under half the best overlap are too far away to rank; cap the rest by overlap.
+        ids = np.flatnonzero(counts >= max(1, counts.max() // 2))
+        if len(ids) > CANDIDATES:
+            ids = ids[np.argsort(counts[ids], kind="stable")[-CANDIDATES:]]
+        return ids
+
+    def match(self, name, limit=5, min_score=0.0):
+        """Return up to `limit` Match(name, value, distance, score) tuples, best first.
+
+        Each value appears once, with the best-scoring of the names indexed for it.
+        """
+        keys = self.query_keys(name)
+        # value -> (distance, score, index of the name it was scored on)
+        best = {}
+        for k in keys:
+            if k in self.exact:
+                best.setdefault(self.values[self.exact[k]], (0, 1.0, self.exact[k]))
+        if len(best) >= limit:
+            keys = []
+        for key in keys:
+            if key in self.exact:
+                continue
+            peq = pattern_masks(key)
+            cands = sorted(self.candidates(key).tolist(), key=lambda i: abs(len(self.keys[i]) - len(key)))
+            for idx in cands:
+                other = self.keys[idx]
+                longest = max(len(key), len(other))
+                # The length difference bounds the distance from below, so skip keys that cannot place.
+                floor = sorted(s for _, s, _ in best.values())[-limit] if len(best) >= limit else min_score
+                if 1.0 - abs(len(key) - len(other)) / longest < floor:
+                    continue
+                dist = levenshtein(key, other, peq)
+                score = 1.0 - dist / longest
+                value = self.values[idx]
+                if value not in best or score > best[value][1]:
+                    best[value] = (dist, score, idx)
+        ranked = sorted(best.values(), key=lambda b: (-b[1], b[0]))
+        return [Match(self.names[i], self.values[i], d, s) for d, s, i in ranked[:limit] if s >= min_score]
+
+    def best(self, name, min_score=0.85):
+        found = self.match(name, limit=1, min_score=min_score)
+        return found[0] if found else None
@@ -0,0 +1,246 @@
+import argparse
+import re
+import sqlite3
+from datetime import datetime
+
+import pandas as pd
+
+STORE_PATH = "data/orangebook.sqlite"
+
+# Orange Book pages label the same field differently from page to page ("Appl. No." / "Appl No" /
+# "Application Number"), so headers and panel keys are matched by their lowercase letters and digits.
+FIELDS = {
+    "applno": "appl_no", "applicationnumber": "appl_no",
+    "productno": "product_no", "prodno": "product_no", "productnumber": "product_no",
+    "proprietaryname": "proprietary_name",
+    "activeingredient": "active_ingredient",
+    "strength": "strength",
+    "dosageformroute": "dosage_form_route", "dosageform": "dosage_form", "route": "route",
+    "marketingstatus": "marketing_status", "mktstatus": "marketing_status",
+    "tecode": "te_code", "rld": "rld", "referencelisteddrug": "rld", "rs": "rs", "referencestandard": "rs",
+    "approvaldate": "approval_date",
+    "applicant": "applicant", "applicantholder": "applicant", "applicantholderfullname": "applicant",
+    "patentno": "patent_no", "patentexpiration": "patent_expiration",
+    "drugsubstance": "drug_substance", "drugproduct": "drug_product",
+    "patentusecode": "patent_use_code", "delistrequested": "delist_requested", "submissiondate": "submission_date",
+    "exclusivitycode": "exclusivity_code", "exclusivityexpiration": "exclusivity_expiration",
+}
+PRODUCT_COLUMNS = ["proprietary_name", "active_ingredient", "strength", "dosage_form", "route", "marketing_status",
+                   "te_code", "rld", "rs", "approval_date", "applicant"]
+PATENT_COLUMNS = ["patent_no", "patent_expiration", "drug_substance", "drug_product", "patent_use_code",
+                  "delist_requested", "submission_date"]
+EXCLUSIVITY_COLUMNS = ["exclusivity_code", "exclusivity_expiration"]
+DATE_COLUMNS = {"approval_date", "patent_expiration", "submission_date", "exclusivity_expiration"}
+FLAG_COLUMNS = {"rld", "rs", "drug_substance", "drug_product", "delist_requested"}
+DATE_FORMATS = ((re.compile(r"[A-Z][a-z]{2} \d{1,2}, \d{4}"), "%b %d, %Y"),
+                (re.compile(r"\d{1,2}/\d{1,2}/\d{4}"), "%m/%d/%Y"))
+
+SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS search_hits (
+    drug TEXT, appl_type TEXT, appl_no TEXT, product_no TEXT,
+    {", ".join(f"{c} {'INTEGER' if c in FLAG_COLUMNS else 'TEXT'}" for c in PRODUCT_COLUMNS)},
+    PRIMARY KEY (drug, appl_type, appl_no, product_no)
+);
+CREATE TABLE IF NOT EXISTS products (
+    appl_type TEXT, appl_no TEXT, product_no TEXT,
+    {", ".join(f"{c} {'INTEGER' if c in FLAG_COLUMNS else 'TEXT'}" for c in PRODUCT_COLUMNS)},
+    PRIMARY KEY (appl_type, appl_no, product_no)
+);
+CREATE TABLE IF NOT EXISTS patents (
+    appl_type TEXT, appl_no TEXT, product_no TEXT,
+    {", ".join(f"{c} {'INTEGER' if c in FLAG_COLUMNS else 'TEXT'}" for c in PATENT_COLUMNS)}
+);
+CREATE TABLE IF NOT EXISTS exclusivities (
+    appl_type TEXT, appl_no TEXT, product_no TEXT,
+    {", ".join(f"{c} TEXT" for c in EXCLUSIVITY_COLUMNS)}
+);
+CREATE INDEX IF NOT EXISTS search_hits_appl ON search_hits (appl_no);
+CREATE INDEX IF NOT EXISTS products_appl ON products (appl_no);
+CREATE UNIQUE INDEX IF NOT EXISTS patents_key
+    ON patents (appl_type, appl_no, product_no, patent_no, COALESCE(patent_use_code, ''));
+CREATE INDEX IF NOT EXISTS patents_appl ON patents (appl_no, product_no);
+CREATE INDEX IF NOT EXISTS patents_expiration ON patents (patent_expiration);
+CREATE INDEX IF NOT EXISTS patents_no ON patents (patent_no);
+CREATE UNIQUE INDEX IF NOT EXISTS exclusivities_key
+    ON exclusivities (appl_type, appl_no, product_no, exclusivity_code, COALESCE(exclusivity_expiration, ''));
+CREATE INDEX IF NOT EXISTS exclusivities_appl ON exclusivities (appl_no, product_no);
+CREATE INDEX IF NOT EXISTS exclusivities_expiration ON exclusivities (exclusivity_expiration);
+"""
+TABLES = ("search_hits", "products", "patents", "exclusivities")
+
+
+def field_name(label):
+    return FIELDS.get(re.sub(r"[^a-z0-9]", "", label.lower()))
+
+
+def parse_date(text):
+    """ISO date of the first "Jan 1, 2030" or "01/01/2030" date in `text`, or None."""
+    for pattern, fmt in DATE_FORMATS:
+        match = pattern.search(text or "")
+        if match:
+            try:
+                return datetime.strptime(match.group(), fmt).date().isoformat()
+            except ValueError:
+                continue
+    return None
+
+
+def parse_flag(text):
+    """1 for "Yes"/"Y"/"DS"-style marks, 0 for "No"/"N", None when the cell is blank."""
+    text = (text or "").strip()
+    if not text:
+        return None
+    return 0 if text.lower() in ("n", "no") else 1
+
+
+def split_appl(text):
+    """("N", "020702") from "N020702"; a bare number keeps an empty type and is padded to six digits."""
+    text = (text or "").strip()
+    if text[:1].isalpha():
+        return text[0].upper(), text[1:].strip().zfill(6)
+    return "", text.zfill(6) if text else ""
+
+
+def split_product(text):
+    """A product number padded to three digits ("1" -> "001"), so panels and patent rows join; None if blank."""
+    text = (text or "").strip()
+    return text.zfill(3) if text.isdigit() else text or None
+
+
+def typed_fields(labelled):
+    """Map {page label: text} to {column: typed value}, splitting "Dosage Form;Route" and dropping unknown labels."""
+    fields = {}
+    for label, text in labelled.items():
+        column = field_name(label)
+        if column is None:
+            continue
+        text = (text or "").strip()
+        if column == "dosage_form_route":
+            form, _, route = text.partition(";")
+            fields.setdefault("dosage_form", form.strip() or None)
+            fields.setdefault("route", route.strip() or None)
+        elif column in DATE_COLUMNS:
+            fields[column] = parse_date(text)
+        elif column in FLAG_COLUMNS:
+            fields[column] = parse_flag(text)
+        elif column == "product_no":
+            fields[column] = split_product(text)
+        else:
+            fields[column] = text or None
+    return fields
+
+
+def table_records(table):
+    """Rows of a scraped table (header row first) as typed dicts, or [] for tables without a header row."""
+    if len(table) < 2:
+        return []
+    header = table[0]
+    return [typed_fields(dict(zip(header, row))) for row in table[1:]]
+
+
+class OrangeBookStore:
+    """SQLite tables for the scraped Orange Book: search hits, products, patents and exclusivities.
+
+    Rows are keyed by application (type, number) and product number, with indexes for lookups by
+    application number and by patent or exclusivity expiry. Writing a drug again replaces its search
+    hits and its applications' patents and exclusivities, so replaying journaled results is harmless.
+
+        with OrangeBookStore() as store:
+            store.patents_expiring("2025-01-01", "2026-01-01")
+    """
+
+    def __init__(self, path=STORE_PATH, fresh=False):
+        self.path = path
+        self.db = sqlite3.connect(path)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.executescript(SCHEMA)
+        if fresh:
+            for table in TABLES:
+                self.db.execute(f"DELETE FROM {table}")
+        self.db.commit()
+
+    def insert(self, table, key, columns, fields):
+        names = list(key) + columns
+        self.db.execute(f"INSERT OR REPLACE INTO {table} ({', '.join(names)}) VALUES ({', '.join('?' * len(names))})",
+                        list(key.values()) + [fields.get(c) for c in columns])
+
+    def write_drug(self, drug, result):
+        """Store one drug's scrape: {"overview": search tables, "rows": [process_row results]}."""
+        self.db.execute("DELETE FROM search_hits WHERE drug = ?", (drug,))
+        overview = result["overview"][0] if result["overview"] else []
+        for fields in table_records(overview):
+            appl_type, appl_no = split_appl(fields.pop("appl_no", ""))
+            key = {"drug": drug, "appl_type": appl_type, "appl_no": appl_no, "product_no": fields.get("product_no")}
+            self.insert("search_hits", key, PRODUCT_COLUMNS, fields)
+
+        appls = {(row["appl_type"], row["appl_no"].zfill(6)) for row in result["rows"]}
+        for table in ("patents", "exclusivities"):
+            self.db.executemany(f"DELETE FROM {table} WHERE appl_type = ? AND appl_no = ?", appls)
+        for row in result["rows"]:
+            appl = {"appl_type": row["appl_type"], "appl_no": row["appl_no"].zfill(6)}
+            for n, panel in enumerate(row["products"], 1):
+                fields = typed_fields(panel)
+                # The panel's position stands in only when the panel does not give its own product number
+                product_no = fields.get("product_no") or f"{n:03d}"
+                self.insert("products", {**appl, "product_no": product_no}, PRODUCT_COLUMNS, fields)
+
+            # Patent and exclusivity tables are told apart by their columns, wherever they appeared
+            for table in row["tables"]:
+                records = table_records(table)
+                if not records or not ("patent_no" in records[0] or "exclusivity_code" in records[0]):
+                    continue
+                kind, columns = (("patents", PATENT_COLUMNS) if "patent_no" in records[0]
+                                 else ("exclusivities", EXCLUSIVITY_COLUMNS))
+                for fields in records:
+                    key = {**appl, "product_no": fields.get("product_no") or split_product(row["product_no"])}
+                    self.insert(kind, key, columns, fields)
+        self.db.commit()
+
+    def query(self, sql, params=()):
+        return pd.read_sql_query(sql, self.db, params=params)
+
+    def application(self, appl_no):
+        """{"products", "patents", "exclusivities"} DataFrames for one application number ("020702" or "N020702")."""
+        _, appl_no = split_appl(appl_no)
+        return {table: self.query(f"SELECT * FROM {table} WHERE appl_no = ? ORDER BY product_no", (appl_no,))
+                for table in ("products", "patents", "exclusivities")}
+
+    def patents_expiring(self, start, end):
+        """Patents expiring in [start, end), ISO dates, with the products they cover."""
+        return self.query(
+            "SELECT p.*, d.proprietary_name, d.active_ingredient FROM patents p "
+            "LEFT JOIN products d USING (appl_type, appl_no, product_no) "
+            "WHERE p.patent_expiration >= ? AND p.patent_expiration < ? ORDER BY p.patent_expiration",
+            (start, end))
+
+    def frames(self):
+        """Every table as a DataFrame in a stable order."""
+        return {table: self.query(f"SELECT * FROM {table} ORDER BY {', '.join(self.columns(table))}")
+                for table in TABLES}
+
+    def columns(self, table):
+        return [row[1] for row in self.db.execute(f"PRAGMA table_info({table})")]
+
+    def close(self):
+        self.db.commit()
+        self.db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Query the normalized Orange Book store")
+    parser.add_argument("--db", default=STORE_PATH)
+    parser.add_argument("--appl", help="show the products, patents and exclusivities of an application number")
+    parser.add_argument("--expiring", nargs=2, metavar=("START", "END"), help="patents expiring in [START, END)")
+    args = parser.parse_args()
+    with OrangeBookStore(args.db) as store:
+        if args.appl:
+            for name, df in store.application(args.appl).items():
+                print(f"{name}:\n{df.to_string(index=False)}\n")
+        if args.expiring:
+            print(store.patents_expiring(*args.expiring).to_string(index=False))
@@ -0,0 +1,202 @@
+import asyncio
+import json
+import logging
+import os
+import time
+import aiohttp
+
+from rate_limit import TokenBucket
+from sdf_ingest import file_digest
+
+CONCURRENCY = 6
+REQUESTS_PER_SEC = 4
+QUEUE_SIZE = 64
+CHUNK_SIZE = 256 * 1024
+MAX_RETRIES = 4
+PROGRESS_EVERY = 10.0
+INDEX_NAME = "downloads.json"
+
+logger = logging.getLogger(__name__)
+
+
+class DownloadManager:
+    """Concurrent, resumable file downloads on one pooled session.
+
+    `submit` queues (url, path) jobs on a bounded queue served by `concurrency` workers. Bodies are
+    streamed to `path + ".part"` and renamed into place when complete; an existing .part file is
+    resumed with an HTTP Range request. A destination that already exists (and is not empty) is
+    skipped. A JSON index under `root`, saved after every download, maps URLs to SHA-256 digests and
+    digests to stored files, so a URL is fetched at most once: the same URL submitted for several
+    paths is downloaded once and linked to the others, and identical content found under another
+    URL is hard-linked to the first copy instead of stored again.
+
+        async with DownloadManager("data/pdfs") as downloads:
+            await downloads.submit(url, path)
+    """
+
+    def __init__(self, root, concurrency=CONCURRENCY, rate=REQUESTS_PER_SEC, chunk_size=CHUNK_SIZE):
+        self.root = root
+        self.concurrency = concurrency
+        self.chunk_size = chunk_size
+        self.limiter = TokenBucket(rate)
+        self.index_path = os.path.join(root, INDEX_NAME)
+        self.urls, self.hashes = self.load_index()
+        self.pending = {}
+        self.queue = asyncio.Queue(QUEUE_SIZE)
+        self.session = None
+        self.workers = []
+        self.reporter = None
+        self.downloaded = 0
+        self.linked = 0
+        self.skipped = 0
+        self.failed = 0
+        self.bytes = 0
+        self.started = None
+
+    def load_index(self):
+        if not os.path.exists(self.index_path):
+            return {}, {}
+        with open(self.index_path) as f:
+            index = json.load(f)
+        return index["urls"], index["hashes"]
+
+    def save_index(self):
+        os.makedirs(self.root, exist_ok=True)
+        tmp = self.index_path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump({"urls": self.urls, "hashes": self.hashes}, f)
+        os.replace(tmp, self.index_path)
+
+    async def __aenter__(self):
+        await self.start()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close(wait=exc_type is None)
+
+    async def start(self):
+        connector = aiohttp.TCPConnector(limit=self.concurrency)
+        self.session = aiohttp.ClientSession(connector=connector, timeout=aiohttp.ClientTimeout(total=None, sock_read=60))
+        self.workers = [asyncio.create_task(self.worker()) for _ in range(self.concurrency)]
+        self.reporter = asyncio.create_task(self.report())
+        self.started = time.perf_counter()
+
+    async def close(self, wait=True):
+        """Finish every queued download (unless not `wait`), then stop the workers and save the index.
+
+        Downloads cut short keep their .part file and resume on the next run.
+        """
+        try:
+            if wait:
+                await self.queue.join()
+        finally:
+            for task in self.workers + [self.reporter]:
+                task.cancel()
+            await asyncio.gather(*self.workers, self.reporter, return_exceptions=True)
+            await self.session.close()
+            self.save_index()
+            logger.info(self.progress())
+
+    async def submit(self, url, path):
+        """Queue `url` to be saved at `path`; waits only while the queue is full.
+
+        A URL already queued for another path is not queued again: `path` is added to its targets
+        and linked to the downloaded file once it is complete.
+        """
+        if (os.path.exists(path) and os.path.getsize(path) > 0) or path in self.pending.get(url, ()):
+            self.skipped += 1
+            return
+        if url in self.pending:
+            self.pending[url].append(path)
+            return
+        self.pending[url] = [path]
+        await self.queue.put(url)
+
+    async def worker(self):
+        while True:
+            url = await self.queue.get()
+            path = self.pending[url][0]
+            try:
+                await self.download(url, path)
+                for other in self.pending[url][1:]:
+                    self.store(path, other)
+            except Exception as e:
+                self.failed += 1
+                logger.error(f"Failed to download {url} | {e}")
+            finally:
+                self.pending.pop(url, None)
+                self.queue.task_done()
+
+    async def download(self, url, path):
+        digest = self.urls.get(url)
+        if digest in self.hashes and os.path.exists(self.hashes[digest]):
+            self.store(self.hashes[digest], path)
+            return
+        part = path + ".part"
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        for attempt in range(MAX_RETRIES):
+            try:
+                await self.fetch(url, part)
+                break
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                # Client errors other than 429 will not change on retry.
+                final = isinstance(e, aiohttp.ClientResponseError) and 400 <= e.status < 500 and e.status != 429
+                if final or attempt == MAX_RETRIES - 1:
+                    raise
+                logger.warning(f"Retrying {url} after {e}")
+                await asyncio.sleep(2 ** attempt)
+
+        digest = file_digest(part)
+        self.urls[url] = digest
+        existing = self.hashes.get(digest)
+        if existing and existing != path and os.path.exists(existing):
+            os.remove(part)
+            self.store(existing, path)
+            self.save_index()
+            return
+        os.replace(part, path)
+        self.hashes[digest] = path
+        self.save_index()
+        self.downloaded += 1
+        logger.info(f"Downloaded {os.path.basename(path)}")
+
+    async def fetch(self, url, part):
+        """Stream `url` into `part`, continuing from its current size when the server honours Range."""
+        offset = os.path.getsize(part) if os.path.exists(part) else 0
+        headers = {"Range": f"bytes={offset}-"} if offset else {}
+        await self.limiter.acquire()
+        async with self.session.get(url, headers=headers) as r:
+            if r.status == 416:
+                return
+            r.raise_for_status()
+            mode = "ab" if r.status == 206 else "wb"
+            with open(part, mode) as f:
+                async for chunk in r.content.iter_chunked(self.chunk_size):
+                    f.write(chunk)
+                    self.bytes += len(chunk)
+
+    def store(self, existing, path):
+        """Make `path` a hard link to an already stored copy, falling back to a real copy."""
+        if os.path.abspath(existing) == os.path.abspath(path):
+            return
+        if os.path.exists(path):
+            os.remove(path)
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        try:
+            os.link(existing, path)
+        except OSError:
+            with open(existing, "rb") as src, open(path, "wb") as dst:
+                for block in iter(lambda: src.read(1 << 20), b""):
+                    dst.write(block)
+        self.linked += 1
+
+    async def report(self):
+        while True:
+            await asyncio.sleep(PROGRESS_EVERY)
+            logger.info(self.progress())
+
+    def progress(self):
+        elapsed = time.perf_counter() - self.started if self.started else 0.0
+        rate = self.bytes / elapsed / 1024 ** 2 if elapsed else 0.0
+        return (f"downloads: {self.downloaded} new, {self.linked} deduplicated, {self.skipped} skipped, "
+                f"{self.failed} failed, {self.queue.qsize()} queued, {self.bytes / 1024 ** 2:.1f} MiB at {rate:.2f} MiB/s")
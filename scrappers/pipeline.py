@@ -0,0 +1,193 @@
+import argparse
+import asyncio
+import logging
+import time
+from collections import namedtuple
+
+import chembl_scrapper
+import clinical_trials
+import consolidate
+import scrapper_orangebook as orangebook
+from drug_list import DRUG_LIST_PATH, load_drug_names
+from drug_resolver import DrugResolver
+from http_cache import CACHE_PATH, ResponseCache, format_stats
+from rate_limit import TokenBucket
+
+fda = __import__("scrapper_drugs@fda_full_100")
+
+# Orange Book and Drugs@FDA are both served by accessdata.fda.gov, so they draw on one page-load budget.
+FDA_HOST_RATE = 4
+LOG_FILE = "data/pipeline.log"
+
+logger = logging.getLogger(__name__)
+
+Stage = namedtuple("Stage", ["name", "deps", "run"])
+
+
+class StageSkipped(Exception):
+    pass
+
+
+class PipelineRun:
+    """State shared by every stage of one run: the drugs, the options, one HTTP cache, per-host
+    rate limiters and the DrugBank resolver (set by the resolve stage)."""
+
+    def __init__(self, drugs, resume=False, http=False, use_cache=True, fda_rate=FDA_HOST_RATE, fda_all=False,
+                 chembl_batch=False):
+        self.drugs = drugs
+        self.resume = resume
+        self.http = http
+        self.fda_all = fda_all
+        self.chembl_batch = chembl_batch
+        self.use_cache = use_cache
+        self.cache = ResponseCache(CACHE_PATH) if use_cache else None
+        self.fda_limiter = TokenBucket(fda_rate)
+        self.resolver = None
+        self.timings = {}
+
+    def close(self):
+        if self.cache is not None:
+            print(format_stats(self.cache))
+            self.cache.close()
+
+
+async def resolve(run):
+    run.resolver = await asyncio.to_thread(DrugResolver.load)
+    found = sum(run.resolver.find(drug) is not None for drug in run.drugs)
+    logger.info(f"resolver: {found}/{len(run.drugs)} drugs found in the DrugBank index")
+
+
+async def run_chembl(run):
+    await chembl_scrapper.main(batch=run.chembl_batch, use_cache=run.use_cache, resume=run.resume, drugs=run.drugs,
+                               cache=run.cache, resolver=run.resolver)
+
+
+async def run_clinical_trials(run):
+    await clinical_trials.main(resume=run.resume, drugs=run.drugs)
+
+
+async def run_orangebook(run):
+    orangebook.USE_CACHE = run.use_cache
+    await orangebook.fetch_all_data(run.drugs, http=run.http, resume=run.resume, cache=run.cache,
+                                    limiter=run.fda_limiter)
+
+
+async def run_fda(run):
+    fda.USE_CACHE = run.use_cache
+    if run.fda_all:
+        fda.set_save_dir(fda.FULL_SAVE_DIR)
+    await fda.scrape_fda(http=run.http, resume=run.resume, targets=run.drugs, all_drugs=run.fda_all,
+                         cache=run.cache, limiter=run.fda_limiter)
+
+
+async def run_consolidate(run):
+    sources = [s._replace(path=fda.CSV_FILE) if s.name == "fda" else s for s in consolidate.SOURCES]
+    stats = await asyncio.to_thread(consolidate.consolidate, sources=sources, resolver=run.resolver)
+    logger.info("consolidate:\n" + consolidate.format_stats(stats))
+
+
+# Declared dependencies first; stages without a path between them run concurrently.
+STAGES = [
+    Stage("resolve", (), resolve),
+    Stage("chembl", ("resolve",), run_chembl),
+    Stage("clinical_trials", (), run_clinical_trials),
+    Stage("orangebook", (), run_orangebook),
+    Stage("fda", (), run_fda),
+    Stage("consolidate", ("chembl", "orangebook", "fda"), run_consolidate),
+]
+
+
+def plan(selected, stages=STAGES):
+    """The selected stages plus everything they depend on, in declaration order."""
+    by_name = {stage.name: stage for stage in stages}
+    needed = set()
+
+    def visit(name):
+        if name not in needed:
+            needed.add(name)
+            for dep in by_name[name].deps:
+                visit(dep)
+
+    for name in selected:
+        visit(name)
+    return [stage for stage in stages if stage.name in needed]
+
+
+async def run_stages(stages, run):
+    """Start every stage at once; each waits for its dependencies and is skipped if one of them failed.
+
+    Returns {stage name: None on success, else the exception}. Wall time per stage goes to `run.timings`.
+    """
+    tasks = {}
+
+    async def execute(stage):
+        for dep in stage.deps:
+            try:
+                await tasks[dep]
+            except Exception as e:
+                raise StageSkipped(f"{dep} failed") from e
+        logger.info(f"stage {stage.name} started")
+        started = time.perf_counter()
+        try:
+            await stage.run(run)
+        finally:
+            run.timings[stage.name] = time.perf_counter() - started
+            logger.info(f"stage {stage.name} finished in {run.timings[stage.name]:.1f}s")
+
+    for stage in stages:
+        tasks[stage.name] = asyncio.ensure_future(execute(stage))
+    outcomes = await asyncio.gather(*tasks.values(), return_exceptions=True)
+    return dict(zip(tasks, outcomes))
+
+
+def format_report(outcomes, timings, elapsed):
+    lines = [f"{'stage':<16} {'status':<8} {'seconds':>8}"]
+    for name, outcome in outcomes.items():
+        status = "ok" if outcome is None else "skipped" if isinstance(outcome, StageSkipped) else "failed"
+        seconds = f"{timings[name]:.1f}" if name in timings else "-"
+        lines.append(f"{name:<16} {status:<8} {seconds:>8}" + (f"  {outcome}" if outcome is not None else ""))
+    lines.append(f"wall time {elapsed:.1f}s for {sum(timings.values()):.1f}s of stage time")
+    return "\n".join(lines)
+
+
+async def main(selected, run):
+    stages = plan(selected)
+    started = time.perf_counter()
+    try:
+        outcomes = await run_stages(stages, run)
+    finally:
+        run.close()
+    report = format_report(outcomes, run.timings, time.perf_counter() - started)
+    logger.info("\n" + report)
+    print(report)
+    return outcomes
+
+
+if __name__ == "__main__":
+    names = [stage.name for stage in STAGES]
+    parser = argparse.ArgumentParser(description="Run the scrapers as one pipeline over a shared drug list, cache "
+                                                 "and rate limits")
+    parser.add_argument("stages", nargs="*", metavar="STAGE",
+                        help=f"stages to run, with their dependencies: {', '.join(names)} (default: all)")
+    parser.add_argument("--drug-list", default=DRUG_LIST_PATH, help="CSV with a 'Drug Name' column")
+    parser.add_argument("--limit", type=int, help="only the first N drugs of the list")
+    parser.add_argument("--drug", action="append", help="only this drug (repeatable)")
+    parser.add_argument("--resume", action="store_true", help="continue each source from its job journal")
+    parser.add_argument("--no-cache", action="store_true", help="bypass the on-disk HTTP response cache")
+    parser.add_argument("--http", action="store_true",
+                        help="load Orange Book and Drugs@FDA pages over plain HTTP where the browser is not needed")
+    parser.add_argument("--fda-rate", type=float, default=FDA_HOST_RATE,
+                        help="accessdata.fda.gov page loads per second, shared by orangebook and fda")
+    parser.add_argument("--fda-all", action="store_true", help="crawl every Drugs@FDA drug, not just the list")
+    parser.add_argument("--chembl-batch", action="store_true", help="fetch ChEMBL records in bulk")
+    args = parser.parse_args()
+    unknown = set(args.stages) - set(names)
+    if unknown:
+        parser.error(f"unknown stages: {', '.join(sorted(unknown))}")
+
+    logging.basicConfig(filename=LOG_FILE, filemode="a", format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
+                        level=logging.INFO)
+    drugs = load_drug_names(args.drug_list, args.limit, args.drug)
+    run = PipelineRun(drugs, resume=args.resume, http=args.http, use_cache=not args.no_cache, fda_rate=args.fda_rate,
+                      fda_all=args.fda_all, chembl_batch=args.chembl_batch)
+    asyncio.run(main(args.stages or names, run))
@@ -0,0 +1,87 @@
+import csv
+import os
+
+ROW_GROUP_SIZE = 50_000
+
+
+class CsvRowWriter:
+    def __init__(self, path, columns, append=False):
+        has_header = append and os.path.exists(path) and os.path.getsize(path) > 0
+        self.columns = list(columns)
+        self.file = open(path, "a" if append else "w", newline="", encoding="utf-8")
+        self.writer = csv.DictWriter(self.file, fieldnames=self.columns, extrasaction="ignore")
+        if not has_header:
+            self.writer.writeheader()
+        self.rows_written = 0
+
+    def write_rows(self, rows):
+        self.writer.writerows(rows)
+        self.file.flush()
+        self.rows_written += len(rows)
+
+    def close(self):
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class ParquetRowWriter:
+    """Buffers rows column-wise and emits one Parquet row group every `row_group_size` rows.
+
+    `types` maps column names to pyarrow type aliases ("int64", "double", "bool", ...); other columns are strings.
+    """
+
+    def __init__(self, path, columns, row_group_size=ROW_GROUP_SIZE, types=None):
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError as e:
+            raise ImportError("Parquet output requires pyarrow (pip install pyarrow)") from e
+        self.pa = pa
+        self.columns = list(columns)
+        types = types or {}
+        self.schema = pa.schema([(c, pa.type_for_alias(types.get(c, "string"))) for c in self.columns])
+        self.row_group_size = row_group_size
+        self.buffer = {c: [] for c in self.columns}
+        self.pending = 0
+        self.rows_written = 0
+        self.writer = pq.ParquetWriter(path, self.schema)
+
+    def _flush(self, n):
+        arrays = [self.pa.array(self.buffer[c][:n], type=self.schema.field(c).type) for c in self.columns]
+        self.writer.write_table(self.pa.Table.from_arrays(arrays, schema=self.schema), row_group_size=n)
+        for c in self.columns:
+            del self.buffer[c][:n]
+        self.pending -= n
+        self.rows_written += n
+
+    def write_rows(self, rows):
+        for row in rows:
+            for c in self.columns:
+                self.buffer[c].append(row.get(c))
+        self.pending += len(rows)
+        while self.pending >= self.row_group_size:
+            self._flush(self.row_group_size)
+
+    def close(self):
+        if self.pending:
+            self._flush(self.pending)
+        self.writer.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def open_writer(path, columns, row_group_size=ROW_GROUP_SIZE, types=None, append=False):
+    """Pick a writer from the file extension: `.parquet` -> ParquetRowWriter, anything else -> CSV."""
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    if path.endswith(".parquet"):
+        return ParquetRowWriter(path, columns, row_group_size=row_group_size, types=types)
+    return CsvRowWriter(path, columns, append=append)
@@ -1,232 +1,21 @@
+import argparse
 import asyncio
-from playwright.async_api import async_playwright
-import os
-import csv
-import re
-import aiohttp
-import logging
 
-# --- Constants ---
-DOMAIN = "https://www.accessdata.fda.gov"
-BASE_URL = f"{DOMAIN}/scripts/cder/daf/index.cfm?event=browseByLetter.page&productLetter={{}}&ai=0"
-LETTERS = [chr(i) for i in range(ord('A'), ord('Z') + 1)]
+# The full-site crawl is the drug-list crawler without its drug-list filter, writing to its own directory.
+fda = __import__("scrapper_drugs@fda_full_100")
 
-SAVE_DIR = os.path.join(os.getcwd(), "fda_downloads")
-PDF_DIR = os.path.join(SAVE_DIR, "pdfs")
-CSV_FILE = os.path.join(SAVE_DIR, "fda_all_tables.csv")
-LOG_FILE = os.path.join(SAVE_DIR, "fda_scraper.log")
 
-os.makedirs(PDF_DIR, exist_ok=True)
-
-# --- Logging Setup ---
-os.makedirs(SAVE_DIR, exist_ok=True)
-logging.basicConfig(
-    filename=LOG_FILE,
-    filemode="a",
-    format="%(asctime)s - %(levelname)s - %(message)s",
-    level=logging.INFO
-)
-logger = logging.getLogger(__name__)
-
-
-def extract_appl_no_from_href(href: str) -> str:
-    match = re.search(r"ApplNo=(\d+)", href)
-    return match.group(1).zfill(6) if match else "UNKNOWN"
-
-
-def make_safe_folder_name(name):
-    return re.sub(r"[^\w\-\.]", "_", name)
-
-
-async def download_pdf(page, url, appl_no, drug_name):
-    filename = os.path.basename(url.split("#")[0])
-    safe_name = make_safe_folder_name(drug_name)
-    drug_dir = os.path.join(PDF_DIR, f"{appl_no}_{safe_name}")
-    os.makedirs(drug_dir, exist_ok=True)
-    save_path = os.path.join(drug_dir, filename)
-
-    if os.path.exists(save_path):
-        return  # already downloaded
-
-    try:
-        async with page.expect_download() as download_info:
-            await page.evaluate("""(url) => {
-                const a = document.createElement('a');
-                a.href = url;
-                a.download = '';
-                document.body.appendChild(a);
-                a.click();
-                a.remove();
-            }""", url)
-
-        download = await download_info.value
-        await download.save_as(save_path)
-        print(f"Downloaded PDF: {filename}")
-        logger.info(f"Downloaded PDF: {filename}")
-    except Exception as e:
-        logger.error(f"Failed to download PDF: {url} | {e}")
-        print(f"Failed to download PDF: {url} | {e}")
-
-
-async def extract_all_tables(page, drug_name, appl_no, version, letter):
-    tables = await page.query_selector_all("table")
-    all_data = []
-
-    for i, table in enumerate(tables):
-        rows = await table.query_selector_all("tr")
-        for row in rows:
-            cells = await row.query_selector_all("th, td")
-            row_data = []
-            for cell in cells:
-                link = await cell.query_selector("a")
-                if link:
-                    href = await link.get_attribute("href")
-                    text = await link.inner_text()
-                    if href and href.endswith(".pdf"):
-                        full_url = href if href.startswith("http") else DOMAIN + href
-                        await download_pdf(page, full_url, appl_no, drug_name)
-                        row_data.append(f"{text} ({full_url})")
-                    else:
-                        row_data.append(text)
-                else:
-                    row_data.append(await cell.inner_text())
-            if row_data:
-                all_data.append([drug_name, appl_no, version, letter, f"Table{i+1}"] + row_data)
-
-    return all_data
-
-
-async def extract_and_download_pdfs(page, appl_no, drug_name):
-    logger.info(f"Extracting PDFs for {drug_name} | Application: {appl_no}")
-    print(f"Extracting PDFs for {drug_name} | Application: {appl_no}")
-    try:
-        links = await page.locator("a").all()
-        for anchor in links:
-            try:
-                text = (await anchor.inner_text()).strip().lower()
-                if "pdf" in text or ".pdf" in (await anchor.get_attribute("href") or ""):
-                    href = await anchor.get_attribute("href")
-
-                    if not href:
-                        continue
-
-                    if href.startswith("/"):
-                        href = f"https://www.fda.gov{href}"
-                    elif not href.startswith("http"):
-                        continue
-
-                    filename = href.split("/")[-1]
-                    safe_name = f"{drug_name.replace(' ', '_')}_{appl_no}_{filename}"
-                    save_path = os.path.join("data", "fda_drugs", "pdfs", safe_name)
-
-                    if os.path.exists(save_path):
-                        continue
-
-                    logger.info(f"Downloading PDF: {href}")
-                    print(f" Downloading PDF: {href}")
-                    async with aiohttp.ClientSession() as session:
-                        async with session.get(href, timeout=aiohttp.ClientTimeout(total=30)) as response:
-                            if response.status == 200:
-                                with open(save_path, "wb") as f:
-                                    f.write(await response.read())
-                            else:
-                                logger.warning(f"Failed to download {href} | Status: {response.status}")
-                                print(f"Failed to download {href} | Status: {response.status}")
-            except Exception as e:
-                logger.error(f"Error extracting/downloading individual PDF: {e}")
-                print(f"Error extracting/downloading individual PDF: {e}")
-    except Exception as e:
-        logger.error(f"Error parsing PDF links for {drug_name} ({appl_no}): {e}")
-        print(f"Error parsing PDF links for {drug_name} ({appl_no}): {e}")
-
-
-async def scrape_fda():
-    all_data = []
-
-    async with async_playwright() as p:
-        browser = await p.firefox.launch(headless=True)
-        context = await browser.new_context()
-        page = await context.new_page()
-
-        for letter in LETTERS:
-            url = BASE_URL.format(letter)
-            print(f"\n--- Visiting letter '{letter}' page: {url}")
-            logger.info(f"Visiting letter '{letter}' page: {url}")
-            await page.goto(url)
-
-            try:
-                await page.wait_for_selector("table", timeout=5000)
-            except:
-                logger.warning(f"No table found for letter {letter}")
-                print(f"No table found for letter {letter}")
-                continue
-
-            drug_links = await page.query_selector_all("a[href*='event=overview.process']")
-            print(f"Found {len(drug_links)} drugs for letter '{letter}'")
-            logger.info(f"Found {len(drug_links)} drugs for letter '{letter}'")
-
-            for index, link in enumerate(drug_links):
-                drug_name = await link.inner_text()
-                href = await link.get_attribute("href")
-                if not href:
-                    continue
-
-                appl_no = extract_appl_no_from_href(href)
-                overview_url = DOMAIN + href
-                print(f"\n>> {letter} {index+1}/{len(drug_links)}: {drug_name} ({appl_no})")
-                logger.info(f">> {letter} {index+1}/{len(drug_links)}: {drug_name} ({appl_no})")
-
-                overview_page = await context.new_page()
-                await overview_page.goto(overview_url)
-
-                extracted = await extract_all_tables(overview_page, drug_name, appl_no, "Overview", letter)
-                all_data.extend(extracted)
-
-                await extract_and_download_pdfs(overview_page, appl_no, drug_name)
-
-                try:
-                    await overview_page.wait_for_selector("a[href*='event=drugDetails.process']", timeout=3000)
-                    detail_links = await overview_page.query_selector_all("a[href*='event=drugDetails.process']")
-                    print(f"  Found {len(detail_links)} detail versions")
-                    logger.info(f"  Found {len(detail_links)} detail versions")
-
-                    for detail in detail_links:
-                        version_name = await detail.inner_text()
-                        detail_href = await detail.get_attribute("href")
-                        if not detail_href:
-                            continue
-
-                        detail_url = DOMAIN + detail_href
-                        detail_page = await context.new_page()
-                        await detail_page.goto(detail_url)
-
-                        detail_data = await extract_all_tables(detail_page, drug_name, appl_no, version_name, letter)
-                        all_data.extend(detail_data)
-
-                        await extract_and_download_pdfs(detail_page, appl_no, drug_name)
-                        await detail_page.close()
-                except:
-                    print(f"  No detail links found for {drug_name}")
-                    logger.warning(f"No detail links found for {drug_name}")
-
-                await overview_page.close()
-
-        await browser.close()
-
-    if all_data:
-        os.makedirs(SAVE_DIR, exist_ok=True)
-        with open(CSV_FILE, "w", newline="", encoding="utf-8") as f:
-            writer = csv.writer(f)
-            writer.writerow(["DrugName", "ApplNo", "Version", "Letter", "TableID"] +
-                            [f"Col{i+1}" for i in range(max(len(row) - 5 for row in all_data))])
-            writer.writerows(all_data)
-
-        print(f"All data saved to: {CSV_FILE}")
-        logger.info(f"All data saved to: {CSV_FILE}")
-
-    logger.info("FDA scraping completed.")
-    print("FDA scraping completed.")
+async def scrape_fda(resume=False, **kwargs):
+    fda.set_save_dir(fda.FULL_SAVE_DIR)
+    return await fda.scrape_fda(resume=resume, all_drugs=True, **kwargs)
 
 
 if __name__ == "__main__":
-    asyncio.run(scrape_fda())
+    parser = argparse.ArgumentParser(description="Scrape Drugs@FDA tables for every application")
+    parser.add_argument("--resume", action="store_true", help="skip the drugs finished by an interrupted run")
+    parser.add_argument("--workers", type=int, default=fda.POOL_SIZE, help="number of concurrent browser contexts")
+    parser.add_argument("--http", action="store_true", help="fetch pages over plain HTTP instead of Firefox")
+    args = parser.parse_args()
+    fda.set_save_dir(fda.FULL_SAVE_DIR)
+    fda.configure_logging()
+    asyncio.run(scrape_fda(resume=args.resume, pool_size=args.workers, http=args.http))
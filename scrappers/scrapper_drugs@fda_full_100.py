@@ -1,48 +1,67 @@
+import argparse
 import asyncio
+import contextlib
+import time
 from playwright.async_api import async_playwright
 import os
 import csv
 import re
-import pandas as pd
-import aiohttp
 import logging
 
-# --- Excel Setup ---
-CSV_PATH = "data/drug_list.csv"
+from dom_tables import read_tables
+from drug_list import load_drug_names
+from fda_index import INDEX_PATH, INDEX_TTL, LetterIndex, target_letters
+from http_cache import CACHE_PATH, CachedSession, ResponseCache, format_stats, install_playwright_cache
+from http_page import HttpPage, open_session
+from job_journal import JobJournal
+from pdf_downloads import DownloadManager
+from rate_limit import TokenBucket
 
-def normalize_name(name: str) -> str:
-    """Convert name to uppercase, remove parentheses and punctuation."""
-    name = str(name)
-    name = re.sub(r"\(.*?\)", "", name)  # remove text in ()
-    name = re.sub(r"[^\w\s]", "", name)  # remove punctuation
-    return name.strip().upper()
-
-drug_df = pd.read_csv(CSV_PATH)
-TARGET_DRUGS = set(drug_df["Drug Name"].astype(str).map(normalize_name))
+# Drug-list names match letter links exactly (fda_index.exact_key) unless FUZZY_MATCH is set, in which
+# case salt forms and near misses scoring at least MATCH_MIN_SCORE are crawled too.
+FUZZY_MATCH = False
+MATCH_MIN_SCORE = 0.9
 
 # --- Constants ---
 DOMAIN = "https://www.accessdata.fda.gov"
 BASE_URL = f"{DOMAIN}/scripts/cder/daf/index.cfm?event=browseByLetter.page&productLetter={{}}&ai=0"
 LETTERS = [chr(i) for i in range(ord('A'), ord('Z') + 1)]
+USE_CACHE = True
+POOL_SIZE = 4
+REQUESTS_PER_SEC = 4
 
 SAVE_DIR = os.path.join(os.getcwd(), "data/fda_downloads_100")
 PDF_DIR = os.path.join(SAVE_DIR, "pdfs")
 CSV_FILE = os.path.join(SAVE_DIR, "fda_all_tables.csv")
-
-os.makedirs(PDF_DIR, exist_ok=True)
-
-# --- Logging Setup ---
+JOURNAL_PATH = os.path.join(SAVE_DIR, "journal.jsonl")
 LOG_FILE = os.path.join(SAVE_DIR, "fda_scraper.log")
-os.makedirs(SAVE_DIR, exist_ok=True)
-logging.basicConfig(
-    filename=LOG_FILE,
-    filemode='a',
-    format="%(asctime)s - %(levelname)s - %(message)s",
-    level=logging.INFO
-)
+LABEL_DIR = os.path.join("data", "fda_drugs", "pdfs")
+# Where a crawl of every drug (no drug-list filter) is kept, apart from the drug-list crawl above.
+FULL_SAVE_DIR = os.path.join(os.getcwd(), "fda_downloads")
+
 logger = logging.getLogger(__name__)
 
 
+def set_save_dir(save_dir):
+    """Point the CSV, PDFs, journal and log at `save_dir`."""
+    global SAVE_DIR, PDF_DIR, CSV_FILE, JOURNAL_PATH, LOG_FILE
+    SAVE_DIR = save_dir
+    PDF_DIR = os.path.join(save_dir, "pdfs")
+    CSV_FILE = os.path.join(save_dir, "fda_all_tables.csv")
+    JOURNAL_PATH = os.path.join(save_dir, "journal.jsonl")
+    LOG_FILE = os.path.join(save_dir, "fda_scraper.log")
+
+
+def configure_logging():
+    os.makedirs(SAVE_DIR, exist_ok=True)
+    logging.basicConfig(
+        filename=LOG_FILE,
+        filemode='a',
+        format="%(asctime)s - %(levelname)s - %(message)s",
+        level=logging.INFO
+    )
+
+
 def extract_appl_no_from_href(href: str) -> str:
     match = re.search(r"ApplNo=(\d+)", href)
     return match.group(1).zfill(6) if match else "UNKNOWN"
@@ -52,62 +71,37 @@ def make_safe_folder_name(name):
     return re.sub(r"[^\w\-\.]", "_", name)
 
 
-async def download_pdf(page, url, appl_no, drug_name):
+async def download_pdf(downloads, url, appl_no, drug_name):
     filename = os.path.basename(url.split("#")[0])
     safe_name = make_safe_folder_name(drug_name)
-    drug_dir = os.path.join(PDF_DIR, f"{appl_no}_{safe_name}")
-    os.makedirs(drug_dir, exist_ok=True)
-    save_path = os.path.join(drug_dir, filename)
-
-    if os.path.exists(save_path):
-        return
-
-    try:
-        async with page.expect_download() as download_info:
-            await page.evaluate("""(url) => {
-                const a = document.createElement('a');
-                a.href = url;
-                a.download = '';
-                document.body.appendChild(a);
-                a.click();
-                a.remove();
-            }""", url)
-        download = await download_info.value
-        await download.save_as(save_path)
-        logger.info(f"Downloaded PDF: {filename}")
-    except Exception as e:
-        logger.error(f"Failed to download PDF: {url} | {e}")
+    save_path = os.path.join(PDF_DIR, f"{appl_no}_{safe_name}", filename)
+    await downloads.submit(url, save_path)
 
 
-async def extract_all_tables(page, drug_name, appl_no, version, letter):
-    tables = await page.query_selector_all("table")
+async def extract_all_tables(page, drug_name, appl_no, version, letter, downloads):
     all_data = []
 
-    for i, table in enumerate(tables):
-        rows = await table.query_selector_all("tr")
-        for row in rows:
-            cells = await row.query_selector_all("th, td")
+    for i, rows in enumerate(await read_tables(page)):
+        for cells in rows:
             row_data = []
             for cell in cells:
-                link = await cell.query_selector("a")
-                if link:
-                    href = await link.get_attribute("href")
-                    text = await link.inner_text()
-                    if href and href.endswith(".pdf"):
-                        full_url = href if href.startswith("http") else DOMAIN + href
-                        await download_pdf(page, full_url, appl_no, drug_name)
-                        row_data.append(f"{text} ({full_url})")
-                    else:
-                        row_data.append(text)
+                if cell["link"] is None:
+                    row_data.append(cell["text"])
+                    continue
+                href = cell["href"]
+                if href and href.endswith(".pdf"):
+                    full_url = href if href.startswith("http") else DOMAIN + href
+                    await download_pdf(downloads, full_url, appl_no, drug_name)
+                    row_data.append(f"{cell['link']} ({full_url})")
                 else:
-                    row_data.append(await cell.inner_text())
+                    row_data.append(cell["link"])
             if row_data:
                 all_data.append([drug_name, appl_no, version, letter, f"Table{i+1}"] + row_data)
 
     return all_data
 
 
-async def extract_and_download_pdfs(page, appl_no, drug_name):
+async def extract_and_download_pdfs(page, appl_no, drug_name, downloads):
     logger.info(f"Extracting PDFs for {drug_name} | Application: {appl_no}")
     try:
         links = await page.locator("a").all()
@@ -127,98 +121,166 @@ async def extract_and_download_pdfs(page, appl_no, drug_name):
 
                     filename = href.split("/")[-1]
                     safe_name = f"{drug_name.replace(' ', '_')}_{appl_no}_{filename}"
-                    save_path = os.path.join("data", "fda_drugs", "pdfs", safe_name)
-
-                    if os.path.exists(save_path):
-                        continue
-
-                    logger.info(f"Downloading PDF: {href}")
-                    async with aiohttp.ClientSession() as session:
-                        async with session.get(href, timeout=aiohttp.ClientTimeout(total=30)) as response:
-                            if response.status == 200:
-                                with open(save_path, "wb") as f:
-                                    f.write(await response.read())
-                            else:
-                                logger.warning(f"Failed to download {href} | Status: {response.status}")
+                    await downloads.submit(href, os.path.join(LABEL_DIR, safe_name))
             except Exception as e:
                 logger.error(f"Error extracting/downloading individual PDF: {e}")
     except Exception as e:
         logger.error(f"Error parsing PDF links for {drug_name} ({appl_no}): {e}")
 
 
-async def scrape_fda():
-    all_data = []
-
-    async with async_playwright() as p:
-        browser = await p.firefox.launch(headless=True)
-        context = await browser.new_context()
-        page = await context.new_page()
-
-        for letter in LETTERS:
-            url = BASE_URL.format(letter)
-            logger.info(f"\n--- Visiting letter '{letter}' page: {url}")
-            await page.goto(url)
-
-            try:
-                await page.wait_for_selector("table", timeout=5000)
-            except:
-                logger.warning(f"No table found for letter {letter}")
-                continue
-
-            drug_links = await page.query_selector_all("a[href*='event=overview.process']")
-            logger.info(f"Found {len(drug_links)} drugs for letter '{letter}'")
-
-            for index, link in enumerate(drug_links):
-                raw_name = await link.inner_text()
-                cleaned_name = raw_name.strip()
-                norm_name = normalize_name(cleaned_name)
-
-                if norm_name not in TARGET_DRUGS:
-                    continue
-
-                href = await link.get_attribute("href")
-                if not href:
-                    continue
-
-                appl_no = extract_appl_no_from_href(href)
-                overview_url = DOMAIN + href
-                logger.info(f">> {letter} {index+1}/{len(drug_links)}: {cleaned_name} ({appl_no})")
-
-                overview_page = await context.new_page()
-                await overview_page.goto(overview_url)
-
-                extracted = await extract_all_tables(overview_page, cleaned_name, appl_no, "Overview", letter)
-                all_data.extend(extracted)
-
-                await extract_and_download_pdfs(overview_page, appl_no, cleaned_name)
-
-                try:
-                    await overview_page.wait_for_selector("a[href*='event=drugDetails.process']", timeout=3000)
-                    detail_links = await overview_page.query_selector_all("a[href*='event=drugDetails.process']")
-                    logger.info(f"  Found {len(detail_links)} detail versions")
+async def goto(page, limiter, url):
+    await limiter.acquire()
+    await page.goto(url)
 
-                    for detail in detail_links:
-                        version_name = await detail.inner_text()
-                        detail_href = await detail.get_attribute("href")
-                        if not detail_href:
-                            continue
 
-                        detail_url = DOMAIN + detail_href
-                        detail_page = await context.new_page()
-                        await detail_page.goto(detail_url)
+def overview_jobs(index, letter, targets):
+    """Overview jobs for a letter's indexed links matching `targets` (all links if None), keyed by page position."""
+    entries = index.entries(letter)
+    if targets is None:
+        positions = range(len(entries))
+    else:
+        positions = index.matches(letter, targets, MATCH_MIN_SCORE if FUZZY_MATCH else None)
+    jobs = []
+    for position in positions:
+        entry = entries[position]
+        logger.info(f">> {letter} {position+1}/{len(entries)}: {entry['name']} ({entry['appl_no']})")
+        jobs.append({"kind": "overview", "key": (letter, position), "letter": letter, "url": DOMAIN + entry["href"],
+                     "drug": entry["name"], "appl_no": entry["appl_no"], "version": "Overview"})
+    return jobs
 
-                        detail_data = await extract_all_tables(detail_page, cleaned_name, appl_no, version_name, letter)
-                        all_data.extend(detail_data)
 
-                        await extract_and_download_pdfs(detail_page, appl_no, cleaned_name)
-                        await detail_page.close()
-                except:
-                    logger.warning(f"  No detail links found for {cleaned_name}")
-
-                await overview_page.close()
-
-        await browser.close()
+async def crawl_letter(page, limiter, job, index, targets):
+    """Read every drug link on a letter page into `index` and return the overview jobs for the matches."""
+    letter = job["letter"]
+    logger.info(f"\n--- Visiting letter '{letter}' page: {job['url']}")
+    await goto(page, limiter, job["url"])
 
+    try:
+        await page.wait_for_selector("table", timeout=5000)
+    except:
+        logger.warning(f"No table found for letter {letter}")
+        return []
+
+    drug_links = await page.query_selector_all("a[href*='event=overview.process']")
+    logger.info(f"Found {len(drug_links)} drugs for letter '{letter}'")
+
+    entries = []
+    for link in drug_links:
+        href = await link.get_attribute("href")
+        entries.append({"name": (await link.inner_text()).strip(), "appl_no": extract_appl_no_from_href(href),
+                        "href": href})
+    index.update(letter, entries)
+    return overview_jobs(index, letter, targets)
+
+
+async def crawl_overview(page, limiter, job, downloads):
+    """Return the overview page's rows and a detail job for each of its versions."""
+    await goto(page, limiter, job["url"])
+    rows = await extract_all_tables(page, job["drug"], job["appl_no"], "Overview", job["letter"], downloads)
+    await extract_and_download_pdfs(page, job["appl_no"], job["drug"], downloads)
+
+    jobs = []
+    try:
+        await page.wait_for_selector("a[href*='event=drugDetails.process']", timeout=3000)
+        detail_links = await page.query_selector_all("a[href*='event=drugDetails.process']")
+        logger.info(f"  Found {len(detail_links)} detail versions")
+
+        for index, detail in enumerate(detail_links):
+            version_name = await detail.inner_text()
+            detail_href = await detail.get_attribute("href")
+            if not detail_href:
+                continue
+            jobs.append({**job, "kind": "detail", "key": job["key"] + (index,), "url": DOMAIN + detail_href,
+                         "version": version_name})
+    except:
+        logger.warning(f"  No detail links found for {job['drug']}")
+    return rows, jobs
+
+
+async def crawl_detail(page, limiter, job, downloads):
+    await goto(page, limiter, job["url"])
+    rows = await extract_all_tables(page, job["drug"], job["appl_no"], job["version"], job["letter"], downloads)
+    await extract_and_download_pdfs(page, job["appl_no"], job["drug"], downloads)
+    return rows
+
+
+class SubmittedDownloads:
+    """Passes submit() on to a DownloadManager and remembers every [url, path] it was given."""
+
+    def __init__(self, downloads):
+        self.downloads = downloads
+        self.submitted = []
+
+    async def submit(self, url, path):
+        self.submitted.append([url, path])
+        await self.downloads.submit(url, path)
+
+
+async def run_job(page, limiter, job, downloads, index, targets):
+    """Crawl one job and return {"rows": its table rows, "jobs": the jobs it discovered,
+    "pdfs": the [url, path] downloads it submitted}."""
+    downloads = SubmittedDownloads(downloads)
+    if job["kind"] == "letter":
+        done = {"rows": [], "jobs": await crawl_letter(page, limiter, job, index, targets)}
+    elif job["kind"] == "overview":
+        rows, jobs = await crawl_overview(page, limiter, job, downloads)
+        done = {"rows": rows, "jobs": jobs}
+    else:
+        done = {"rows": await crawl_detail(page, limiter, job, downloads), "jobs": []}
+    return {**done, "pdfs": downloads.submitted}
+
+
+async def worker(page, limiter, queue, results, downloads, journal, index, targets):
+    """Take (letter | overview | detail) jobs off the shared queue on a single reused page.
+
+    Finished jobs are journaled with their rows, child jobs and PDF downloads; a job already in the
+    journal is replayed from it instead of being crawled again. Replaying submits its PDFs again,
+    since a run can stop before they finish downloading; files already saved are skipped.
+    """
+    while True:
+        job = await queue.get()
+        try:
+            done = journal.get(job["key"])
+            if done is None:
+                done = await run_job(page, limiter, job, downloads, index, targets)
+                journal.record(job["key"], done)
+            else:
+                for url, path in done.get("pdfs", ()):
+                    await downloads.submit(url, path)
+            if job["kind"] != "letter":
+                results.append((job["key"], done["rows"]))
+            for child in done["jobs"]:
+                queue.put_nowait({**child, "key": tuple(child["key"])})
+        except Exception as e:
+            logger.error(f"{job['kind']} job failed for {job['url']}: {e}")
+        finally:
+            queue.task_done()
+
+
+@contextlib.asynccontextmanager
+async def open_pages(pool_size, cache, http=False):
+    """Yield `pool_size` pages: browser pages in separate contexts, or HttpPages on one pooled session."""
+    if http:
+        async with open_session(pool_size) as session:
+            if cache is not None:
+                session = CachedSession(session, cache)
+            yield [HttpPage(session) for _ in range(pool_size)]
+        return
+    async with async_playwright() as p:
+        browser = await p.firefox.launch(headless=True)
+        try:
+            pages = []
+            for _ in range(pool_size):
+                context = await browser.new_context()
+                if cache is not None:
+                    await install_playwright_cache(context, cache)
+                pages.append(await context.new_page())
+            yield pages
+        finally:
+            await browser.close()
+
+
+def save_rows(all_data):
     if all_data:
         os.makedirs(SAVE_DIR, exist_ok=True)
         with open(CSV_FILE, "w", newline="", encoding="utf-8") as f:
@@ -228,8 +290,87 @@ async def scrape_fda():
             writer.writerows(all_data)
         logger.info("Saved extracted data to CSV.")
 
-    logger.info("FDA scraping completed and saved.")
+
+async def scrape_fda(letters=LETTERS, pool_size=POOL_SIZE, rate=REQUESTS_PER_SEC, http=False, resume=False,
+                     refresh_index=False, index_ttl=INDEX_TTL, targets=None, all_drugs=False, cache=None, limiter=None):
+    """Crawl Drugs@FDA with `pool_size` browser contexts pulling from one job queue.
+
+    `targets` are the drug names to crawl, by default the drug list; `all_drugs` crawls every drug
+    on the site instead. Only the letters the targets start with are visited. A letter read within
+    `index_ttl` seconds comes from the LetterIndex at INDEX_PATH without loading its page (unless
+    `refresh_index`); other letter pages are read into the index. Either way the matching drugs
+    become overview jobs, and overview pages enqueue their detail versions. Results are
+    re-ordered by job key, so the CSV matches a serial crawl. On cancellation the workers are
+    stopped and whatever was collected is still written.
+
+    With `http`, the pages are fetched with plain GETs on a pooled session and parsed with lxml
+    instead of being rendered in Firefox; cell text then follows http_page.inner_text.
+    Every finished job is journaled; with `resume`, jobs from an interrupted run are not crawled again.
+    A `cache` or `limiter` passed in is shared with the caller, who also closes the cache.
+    """
+    # From here on, targets of None means no filter
+    targets = None if all_drugs else targets or load_drug_names()
+    queue = asyncio.Queue()
+    index = LetterIndex(INDEX_PATH, index_ttl)
+    wanted = letters if targets is None else target_letters(targets, letters)
+    for letter in wanted:
+        if index.fresh(letter) and not refresh_index:
+            for job in overview_jobs(index, letter, targets):
+                queue.put_nowait(job)
+        else:
+            queue.put_nowait({"kind": "letter", "key": (letter,), "letter": letter, "url": BASE_URL.format(letter)})
+    logger.info(f"{len(wanted)} of {len(letters)} letters hold target names; "
+                f"{queue.qsize()} jobs queued from the letter index and stale letters")
+    limiter = limiter or TokenBucket(rate)
+    results = []
+    started = time.perf_counter()
+
+    own_cache = cache is None and USE_CACHE
+    if own_cache:
+        cache = ResponseCache(CACHE_PATH)
+    journal = JobJournal(JOURNAL_PATH, resume)
+    try:
+        async with DownloadManager(PDF_DIR) as downloads, open_pages(pool_size, cache, http) as pages:
+            workers = [asyncio.create_task(worker(page, limiter, queue, results, downloads, journal, index, targets))
+                       for page in pages]
+            try:
+                await queue.join()
+            finally:
+                for w in workers:
+                    w.cancel()
+                await asyncio.gather(*workers, return_exceptions=True)
+    finally:
+        journal.close()
+        if own_cache:
+            logger.info(format_stats(cache))
+            cache.close()
+        all_data = [row for _, rows in sorted(results, key=lambda r: r[0]) for row in rows]
+        save_rows(all_data)
+
+    elapsed = time.perf_counter() - started
+    logger.info(f"FDA scraping completed and saved: {len(results)} drug pages in {elapsed:.1f}s "
+                f"({len(results) / elapsed if elapsed else 0:.2f} pages/sec) with {pool_size} workers.")
+    return all_data
 
 
 if __name__ == "__main__":
-    asyncio.run(scrape_fda())
+    parser = argparse.ArgumentParser(description="Scrape Drugs@FDA tables for the drugs in data/drug_list.csv")
+    parser.add_argument("--workers", type=int, default=POOL_SIZE, help="number of concurrent browser contexts")
+    parser.add_argument("--rate", type=float, default=REQUESTS_PER_SEC, help="page loads per second")
+    parser.add_argument("--http", action="store_true", help="fetch pages over plain HTTP instead of Firefox")
+    parser.add_argument("--resume", action="store_true", help="skip the pages finished by an interrupted run")
+    parser.add_argument("--refresh-index", action="store_true",
+                        help="reload the letter pages even if the cached letter index is still fresh")
+    parser.add_argument("--index-ttl", type=float, default=INDEX_TTL / 3600, help="hours before a letter is reloaded")
+    parser.add_argument("--all-drugs", action="store_true",
+                        help="crawl every drug on the site into FULL_SAVE_DIR instead of the drug-list matches")
+    parser.add_argument("--fuzzy", action="store_true",
+                        help="also crawl salt forms and near-miss names of the drug list, not just exact matches")
+    args = parser.parse_args()
+    FUZZY_MATCH = args.fuzzy
+    if args.all_drugs:
+        set_save_dir(FULL_SAVE_DIR)
+    configure_logging()
+    asyncio.run(scrape_fda(pool_size=args.workers, rate=args.rate, http=args.http, resume=args.resume,
+                           refresh_index=args.refresh_index, index_ttl=args.index_ttl * 3600,
+                           all_drugs=args.all_drugs))
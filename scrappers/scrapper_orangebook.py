@@ -1,17 +1,29 @@
+import argparse
 import asyncio
-import pandas as pd
 from playwright.async_api import async_playwright
-import csv
 import os
-import json
+import lxml.html
 
-# Load drug list
-drugs_df = pd.read_csv("data/drug_list.csv")
-drug_names = drugs_df['Drug Name'].dropna().astype(str).tolist()
+from dom_tables import read_tables
+from drug_list import load_drug_names
+from http_cache import CACHE_PATH, CachedSession, ResponseCache, format_stats, install_playwright_cache
+from http_page import HttpPage, open_session, select
+from job_journal import JobJournal
+from orangebook_store import STORE_PATH, OrangeBookStore
+from rate_limit import TokenBucket
 
-# Setup output folders and logging
-os.makedirs("output", exist_ok=True)
-log_file = open("output/error_log.txt", "w")
+USE_CACHE = True
+OUTPUT_PATH = STORE_PATH
+JOURNAL_PATH = "data/orangebook_journal.jsonl"
+OB_URL = "https://www.accessdata.fda.gov/scripts/cder/ob"
+SEARCH_URL = f"{OB_URL}/index.cfm"
+CONTEXTS = 4
+ROW_CONCURRENCY = 4
+REQUESTS_PER_SEC = 4
+ERROR_LOG = "output/error_log.txt"
+
+# Opened by fetch_all_data
+log_file = None
 
 def log_error(drug, context, message):
     log_file.write(f"[ERROR] {drug} [{context}]: {message}\n")
@@ -19,160 +31,243 @@ def log_error(drug, context, message):
 
 async def extract_all_tables(page):
     try:
-        tables = await page.query_selector_all("table")
         all_tables = []
-        for table in tables:
-            table_rows = []
-            rows = await table.query_selector_all("tr")
-            for row in rows:
-                cols = await row.query_selector_all("td")
-                if not cols:
-                    cols = await row.query_selector_all("th")
-                row_data = [await col.inner_text() for col in cols]
-                table_rows.append(row_data)
+        for rows in await read_tables(page, ("td", "th")):
+            table_rows = [[cell["text"] for cell in cells] for cells in rows]
             if table_rows:
                 all_tables.append(table_rows)
-        print(all_tables)
         return all_tables
     except Exception as e:
         return []
 
+def inner_html_text(text):
+    """`text` escaped the way a browser serializes a text node in innerHTML."""
+    return text.replace("&", "&amp;").replace("<", "&lt;").replace(">", "&gt;").replace("\xa0", "&nbsp;")
+
+
+def parse_product_panels(root):
+    """Read the `<strong>key:</strong> value` lines of every accordion panel under the lxml element `root`.
+
+    A line runs up to the next <br>. Its first <strong> gives the key, without colons, and the text
+    right after that tag gives the value, without non-breaking spaces. Lines missing either are
+    skipped, and so are panels with no lines. Keys and values keep their innerHTML escaping
+    (`&amp;` stays `&amp;`), as the click-and-slice extraction returned them.
+    """
+    data_list = []
+    for panel in select(root, ".ui-accordion-content"):
+        product_data = {}
+        keyed = False
+        for el in panel.iterdescendants():
+            if el.tag == "br":
+                keyed = False
+            elif el.tag == "strong" and not keyed:
+                keyed = True
+                key = inner_html_text(el.text_content()).strip().replace(":", "")
+                val = inner_html_text(el.tail or "").replace("&nbsp;", "").strip()
+                if key and val:
+                    product_data[key] = val
+        if product_data:
+            data_list.append(product_data)
+    return data_list
+
+
 async def extract_text_info(page):
     try:
-        data_list = []
-
-        # Expand all dropdowns
-        headers = await page.query_selector_all('.ui-accordion-header')
-        for header in headers:
-            try:
-                await header.click()
-                await page.wait_for_timeout(200)  # small delay for UI update
-            except:
-                continue
-
-        # Now extract from all open panels
-        panels = await page.query_selector_all('.ui-accordion-content')
-        for panel in panels:
-            product_data = {}
-            html = await panel.inner_html()
-            lines = html.split("<br>")
-            for line in lines:
-                if "<strong>" in line:
-                    try:
-                        key = line.split("<strong>")[1].split("</strong>")[0].strip().replace(":", "")
-                        val_part = line.split("</strong>")[1]
-                        val = (
-                            val_part.replace("&nbsp;", "")
-                            .replace("<br>", "")
-                            .strip()
-                            .split("<")[0]  # remove trailing tags
-                        )
-                        if key and val:
-                            product_data[key] = val
-                    except Exception:
-                        continue
-            if product_data:
-                data_list.append(product_data)
-        print(data_list)
+        # Collapsed accordion panels are in the markup too, so parse the page as-is instead of clicking each open
+        root = page.el if isinstance(page, HttpPage) else lxml.html.document_fromstring(await page.content())
+        data_list = parse_product_panels(root)
         return data_list
     except Exception as e:
         print("text extract error:", e)
         return []
 
-async def fetch_all_data():
+async def goto(page, limiter, url):
+    await limiter.acquire()
+    await page.goto(url)
+    await page.wait_for_load_state('domcontentloaded')
+
+
+async def search_drug(page, limiter, drug):
+    """Submit the Orange Book search for `drug` and return its overview tables, or None on failure."""
+    try:
+        await limiter.acquire()
+        await page.goto(SEARCH_URL)
+        await page.fill('input[name="drugname"]', drug)
+        await page.click("input#Submit")
+        await page.wait_for_load_state('networkidle')
+    except Exception as e:
+        log_error(drug, "search_page", str(e))
+        return None
+
+    # Extract overview table to get Appl_Type and Appl_No
+    try:
+        overview_tables = await extract_all_tables(page)
+        if not overview_tables or len(overview_tables[0]) < 2:
+            log_error(drug, "overview", "No valid overview table found")
+            return None
+    except Exception as e:
+        log_error(drug, "overview_extract", str(e))
+        return None
+    return overview_tables
+
+
+async def fetch_product(open_page, limiter, drug, product_url):
+    page = await open_page()
+    try:
+        await goto(page, limiter, product_url)
+        return await extract_text_info(page), await extract_all_tables(page)
+    except Exception as e:
+        log_error(drug, "product_page", str(e))
+        return {}, []
+    finally:
+        await page.close()
+
+
+async def fetch_patent(open_page, limiter, drug, patent_url):
+    page = await open_page()
+    try:
+        await goto(page, limiter, patent_url)
+        return await extract_all_tables(page)
+    except Exception as e:
+        log_error(drug, "patent_page", str(e))
+        return []
+    finally:
+        await page.close()
+
+
+async def process_row(open_page, limiter, row_sem, drug, row_data):
+    """Fetch one application row's product and patent pages side by side; None for rows without an ApplNo."""
+    application_number = row_data.get("Appl. No.") or row_data.get("Application Number") or ""
+    appl_type = application_number[0] if application_number else ""
+    appl_no = application_number[1:] if len(application_number) > 1 else ""
+    prod_no = row_data.get("Product No") or "001"
+    table_id = row_data.get("TableID", "").strip()
+
+    if not appl_no or not appl_type:
+        return None
+
+    # Product page with anchor (fragment)
+    product_url = f"{OB_URL}/results_product.cfm?Appl_Type={appl_type}&Appl_No={appl_no}"
+    if table_id:
+        product_url += f"#{table_id}"
+    patent_url = f"{OB_URL}/patent_info.cfm?Product_No={prod_no}&Appl_No={appl_no}&Appl_type={appl_type}"
+
+    async with row_sem:
+        (product_text, product_tables), patent_tables = await asyncio.gather(
+            fetch_product(open_page, limiter, drug, product_url),
+            fetch_patent(open_page, limiter, drug, patent_url),
+        )
+
+    return {
+        "appl_type": appl_type,
+        "appl_no": appl_no,
+        "product_no": prod_no,
+        "products": product_text,
+        "tables": product_tables + patent_tables,
+    }
+
+
+async def process_drug(search_page, open_page, limiter, row_sem, drug):
+    """Search one drug and fetch all its application rows concurrently.
+
+    Returns {"overview": the search result tables, "rows": one process_row result per application
+    row}, or None if the search failed.
+    """
+    print(f"Processing: {drug}")
+    overview_tables = await search_drug(search_page, limiter, drug)
+    if overview_tables is None:
+        return None
+
+    headers = overview_tables[0][0]
+
+    async def row_task(row):
+        try:
+            return await process_row(open_page, limiter, row_sem, drug, dict(zip(headers, row)))
+        except Exception as e:
+            log_error(drug, "row_processing", str(e))
+            return None
+
+    rows = await asyncio.gather(*(row_task(row) for row in overview_tables[0][1:]))
+    return {"overview": overview_tables, "rows": [r for r in rows if r is not None]}
+
+
+async def fetch_all_data(drugs=None, http=False, resume=False, contexts=CONTEXTS, row_concurrency=ROW_CONCURRENCY,
+                         rate=REQUESTS_PER_SEC, cache=None, limiter=None):
+    """Scrape `drugs` (default: the drug list) with `contexts` searches in flight, each in its own browser context.
+
+    Each application row's product and patent pages load in parallel, at most `row_concurrency`
+    rows per drug at a time, and every page load shares one `rate` per-second budget for the host.
+    With `http`, product and patent pages come over plain HTTP; only the search form uses Firefox.
+    Each finished drug is written to the OrangeBookStore at OUTPUT_PATH as it completes.
+    A `cache` or `limiter` passed in is shared with the caller, who also closes the cache.
+    """
+    global log_file
+    drugs = load_drug_names() if drugs is None else drugs
+    os.makedirs(os.path.dirname(ERROR_LOG) or ".", exist_ok=True)
+    log_file = open(ERROR_LOG, "a" if resume else "w")
+    own_cache = cache is None and USE_CACHE
     async with async_playwright() as p:
         browser = await p.firefox.launch(headless=True)
-        context = await browser.new_context()
-        page = await context.new_page()
+        if own_cache:
+            cache = ResponseCache(CACHE_PATH)
+        # The search is a form POST and needs the browser; product and patent pages are static HTML.
+        session = open_session(contexts * row_concurrency * 2) if http else None
+        if session is not None and cache is not None:
+            session = CachedSession(session, cache)
+        limiter = limiter or TokenBucket(rate)
+        journal = JobJournal(JOURNAL_PATH, resume)
+        store = OrangeBookStore(OUTPUT_PATH, fresh=not resume)
+        queue = asyncio.Queue()
+        for drug in drugs:
+            if (drug,) in journal:
+                store.write_drug(drug, journal.get((drug,)))
+            else:
+                queue.put_nowait(drug)
 
-        results = []
+        async def worker():
+            context = await browser.new_context()
+            if cache is not None:
+                await install_playwright_cache(context, cache)
+            search_page = await context.new_page()
 
-        for drug in drug_names:
-            print(f"Processing: {drug}")
-            try:
-                await page.goto("https://www.accessdata.fda.gov/scripts/cder/ob/index.cfm")
-                await page.fill('input[name="drugname"]', drug)
-                await page.click("input#Submit")
-                await page.wait_for_load_state('networkidle')
-            except Exception as e:
-                log_error(drug, "search_page", str(e))
-                continue
-
-            # Extract overview table to get Appl_Type and Appl_No
+            async def open_page():
+                return HttpPage(session) if http else await context.new_page()
+
+            row_sem = asyncio.Semaphore(row_concurrency)
             try:
-                overview_tables = await extract_all_tables(page)
-                if not overview_tables or len(overview_tables[0]) < 2:
-                    log_error(drug, "overview", "No valid overview table found")
-                    continue
-            except Exception as e:
-                log_error(drug, "overview_extract", str(e))
-                continue
-
-            headers = overview_tables[0][0]
-            for row in overview_tables[0][1:]:
-                try:
-                    row_data = dict(zip(headers, row))
-                    application_number = row_data.get("Appl. No.") or row_data.get("Application Number") or ""
-                    appl_type = application_number[0] if application_number else ""
-                    appl_no = application_number[1:] if len(application_number) > 1 else ""
-                    prod_no = row_data.get("Product No") or "001"
-                    table_id = row_data.get("TableID", "").strip()
-
-                    print(appl_no ," ", appl_type)
-                    if not appl_no or not appl_type:
-                        continue
-
-                    # Product page with anchor (fragment)
-                    product_url = f"https://www.accessdata.fda.gov/scripts/cder/ob/results_product.cfm?Appl_Type={appl_type}&Appl_No={appl_no}"
-                    if table_id:
-                        product_url += f"#{table_id}"
-
-
-                    if not appl_no or not appl_type:
-                        continue
-
-                    # Product page
-                    try:
-                        await page.goto(product_url)
-                        await page.wait_for_load_state('domcontentloaded')
-                        product_text = await extract_text_info(page)
-                        product_tables = await extract_all_tables(page)
-                    except Exception as e:
-                        log_error(drug, "product_page", str(e))
-                        product_text = {}
-                        product_tables = []
-
-                    # Patent page
-                    try:
-                        patent_url = f"https://www.accessdata.fda.gov/scripts/cder/ob/patent_info.cfm?Product_No={prod_no}&Appl_No={appl_no}&Appl_type={appl_type}"
-                        await page.goto(patent_url)
-                        await page.wait_for_load_state('domcontentloaded')
-                        patent_tables = await extract_all_tables(page)
-                    except Exception as e:
-                        log_error(drug, "patent_page", str(e))
-                        patent_tables = []
-
-                    results.append({
-                        "Drug Name": drug,
-                        "Appl_No": appl_no,
-                        "Appl_Type": appl_type,
-                        "Product_No": prod_no,
-                        "Product_Text_Info": json.dumps(product_text),  # now a list
-                        "Product_Tables": json.dumps(product_tables),
-                        "Patent_Tables": json.dumps(patent_tables),
-                        "Overview_Tables": json.dumps(overview_tables)
-                    })
-
-                except Exception as e:
-                    log_error(drug, "row_processing", str(e))
-                    continue
-
-        # Save data
-        df = pd.DataFrame(results)
-        df.to_csv("data/orangebook.csv", index=False)
-
-        await browser.close()
-        log_file.close()
+                while not queue.empty():
+                    drug = queue.get_nowait()
+                    drug_results = await process_drug(search_page, open_page, limiter, row_sem, drug)
+                    if drug_results is not None:
+                        store.write_drug(drug, drug_results)
+                        journal.record((drug,), drug_results)
+            finally:
+                await context.close()
+
+        try:
+            await asyncio.gather(*(worker() for _ in range(contexts)))
+        finally:
+            journal.close()
+            store.close()
+
+            await browser.close()
+            if session is not None:
+                await session.close()
+            if own_cache:
+                print(format_stats(cache))
+                cache.close()
+            log_file.close()
 
 if __name__ == '__main__':
-    asyncio.run(fetch_all_data())
+    parser = argparse.ArgumentParser(description="Scrape Orange Book products and patents for data/drug_list.csv")
+    parser.add_argument("--http", action="store_true",
+                        help="fetch product and patent pages over plain HTTP; only the search uses Firefox")
+    parser.add_argument("--resume", action="store_true",
+                        help="continue an interrupted run, reusing the drugs recorded in the job journal")
+    parser.add_argument("--contexts", type=int, default=CONTEXTS, help="drugs searched at once")
+    parser.add_argument("--row-concurrency", type=int, default=ROW_CONCURRENCY,
+                        help="application rows per drug whose product and patent pages load at once")
+    parser.add_argument("--rate", type=float, default=REQUESTS_PER_SEC, help="page loads per second")
+    args = parser.parse_args()
+    asyncio.run(fetch_all_data(http=args.http, resume=args.resume, contexts=args.contexts,
+                               row_concurrency=args.row_concurrency, rate=args.rate))
@@ -0,0 +1,262 @@
+import argparse
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from sdf_ingest import file_digest, load_sdf
+from table_cache import load_table, source_state
+
+INDEX_DIR = "data/similarity"
+SDF_PATH = "data/open structures.sdf"
+CHEMBL_PATH = "chembl.csv"
+RADIUS = 2
+BITS = 2048
+CHUNK_SIZE = 2000
+# Index rows scanned by every query of a batch before moving on, so they stay in cache (2048 x 256 B).
+ROW_BLOCK = 2048
+TOP_K = 10
+
+
+def fingerprint_chunk(smiles, radius=RADIUS, bits=BITS):
+    """Morgan fingerprints of `smiles` packed into (n, bits // 64) uint64 rows, plus a mask of the
+    SMILES RDKit could parse (unparsable rows are all zero)."""
+    from rdkit import Chem, RDLogger
+    from rdkit.Chem import rdFingerprintGenerator
+
+    RDLogger.DisableLog("rdApp.*")
+    generator = rdFingerprintGenerator.GetMorganGenerator(radius=radius, fpSize=bits)
+    packed = np.zeros((len(smiles), bits // 64), dtype=np.uint64)
+    valid = np.zeros(len(smiles), dtype=bool)
+    for i, s in enumerate(smiles):
+        mol = Chem.MolFromSmiles(s) if s else None
+        if mol is None:
+            continue
+        bitmap = generator.GetFingerprintAsNumPy(mol).astype(np.uint8)
+        packed[i] = np.packbits(bitmap, bitorder="little").view("<u8")
+        valid[i] = True
+    return packed, valid
+
+
+def fingerprints(smiles, radius=RADIUS, bits=BITS, workers=None):
+    """fingerprint_chunk over CHUNK_SIZE slices of `smiles` in a process pool."""
+    chunks = [smiles[i:i + CHUNK_SIZE] for i in range(0, len(smiles), CHUNK_SIZE)]
+    if len(chunks) <= 1:
+        return fingerprint_chunk(smiles, radius, bits)
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        parts = list(pool.map(fingerprint_chunk, chunks, [radius] * len(chunks), [bits] * len(chunks)))
+    return np.concatenate([p for p, _ in parts]), np.concatenate([v for _, v in parts])
+
+
+def tanimoto(fps, counts, query, query_count):
+    """Tanimoto similarity of one packed fingerprint against every row of `fps`."""
+    common = np.bitwise_count(fps & query).sum(axis=1, dtype=np.uint32)
+    union = counts + np.uint32(query_count) - common
+    return np.divide(common, union, out=np.zeros(len(fps), dtype=np.float32), where=union > 0)
+
+
+def top_k(scores, k):
+    k = min(k, len(scores))
+    if k <= 0:
+        return np.empty(0, dtype=np.intp)
+    best = np.argpartition(scores, -k)[-k:]
+    return best[np.argsort(scores[best], kind="stable")[::-1]]
+
+
+class SimilarityIndex:
+    """Packed Morgan fingerprints of a set of molecules, searched by Tanimoto similarity.
+
+    The index is a directory holding `fingerprints.npy` ((n, bits // 64) uint64), `counts.npy`
+    (set bits per row) and `meta.json` (IDs, SMILES, fingerprint parameters, source states).
+    The arrays are memory-mapped, so opening is instant and every worker process of
+    `search_many` shares one copy in the page cache.
+
+        index = SimilarityIndex.open()
+        for chembl_id, score in index.search("CC(=O)Oc1ccccc1C(=O)O", k=5):
+            ...
+    """
+
+    def __init__(self, ids, smiles, fps, counts, radius=RADIUS, bits=BITS, path=None):
+        self.ids = ids
+        self.smiles = smiles
+        self.fps = fps
+        self.counts = counts
+        self.radius = radius
+        self.bits = bits
+        self.path = path
+        self.positions = {id_: i for i, id_ in enumerate(ids)}
+
+    @classmethod
+    def build(cls, ids, smiles, path=INDEX_DIR, radius=RADIUS, bits=BITS, workers=None, sources=None):
+        """Fingerprint `smiles` and write the index to `path`; molecules RDKit cannot parse are dropped."""
+        fps, valid = fingerprints(list(smiles), radius, bits, workers)
+        ids = [i for i, ok in zip(ids, valid) if ok]
+        smiles = [s for s, ok in zip(smiles, valid) if ok]
+        fps = np.ascontiguousarray(fps[valid])
+        counts = np.bitwise_count(fps).sum(axis=1, dtype=np.uint32)
+        os.makedirs(path, exist_ok=True)
+        for name, array in (("fingerprints", fps), ("counts", counts)):
+            target = os.path.join(path, f"{name}.npy")
+            with open(target + ".tmp", "wb") as f:
+                np.save(f, array, allow_pickle=False)
+            os.replace(target + ".tmp", target)
+        cls(ids, smiles, fps, counts, radius, bits, path).write_meta(sources or {})
+        return cls.open(path)
+
+    @classmethod
+    def open(cls, path=INDEX_DIR):
+        with open(os.path.join(path, "meta.json"), encoding="utf-8") as f:
+            meta = json.load(f)
+        fps = np.load(os.path.join(path, "fingerprints.npy"), mmap_mode="r")
+        counts = np.load(os.path.join(path, "counts.npy"), mmap_mode="r")
+        index = cls(meta["ids"], meta["smiles"], fps, counts, meta["radius"], meta["bits"], path)
+        index.sources = meta["sources"]
+        return index
+
+    def write_meta(self, sources):
+        meta = {"ids": self.ids, "smiles": self.smiles, "radius": self.radius, "bits": self.bits, "sources": sources}
+        tmp = os.path.join(self.path, "meta.json.tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+        os.replace(tmp, os.path.join(self.path, "meta.json"))
+        self.sources = sources
+
+    def __len__(self):
+        return len(self.ids)
+
+    def query_fingerprint(self, query):
+        """The packed fingerprint of an indexed ID or a SMILES string, or None if neither."""
+        if query in self.positions:
+            return np.asarray(self.fps[self.positions[query]])
+        packed, valid = fingerprint_chunk([query], self.radius, self.bits)
+        return packed[0] if valid[0] else None
+
+    def search(self, query, k=TOP_K):
+        """The `k` most similar molecules to `query` (ID or SMILES) as [(id, tanimoto)], best first."""
+        fp = self.query_fingerprint(query)
+        if fp is None:
+            return []
+        scores = tanimoto(self.fps, self.counts, fp, np.bitwise_count(fp).sum())
+        return [(self.ids[i], float(scores[i])) for i in top_k(scores, k)]
+
+    def search_block(self, queries, k=TOP_K):
+        """search() for several queries in one pass over the index, ROW_BLOCK rows at a time."""
+        fps = [self.query_fingerprint(q) for q in queries]
+        usable = [i for i, fp in enumerate(fps) if fp is not None]
+        common = np.empty((len(usable), len(self)), dtype=np.uint32)
+        for start in range(0, len(self), ROW_BLOCK):
+            rows = self.fps[start:start + ROW_BLOCK]
+            for row, i in enumerate(usable):
+                np.bitwise_count(rows & fps[i]).sum(axis=1, dtype=np.uint32, out=common[row, start:start + ROW_BLOCK])
+        results = [[] for _ in queries]
+        for row, i in enumerate(usable):
+            union = self.counts + np.uint32(np.bitwise_count(fps[i]).sum()) - common[row]
+            scores = np.divide(common[row], union, out=np.zeros(len(self), dtype=np.float32), where=union > 0)
+            results[i] = [(self.ids[j], float(scores[j])) for j in top_k(scores, k)]
+        return results
+
+
+# Opened once per search_many worker process.
+worker_index = None
+
+
+def open_worker(path):
+    global worker_index
+    worker_index = SimilarityIndex.open(path)
+
+
+def search_chunk(queries, k):
+    return worker_index.search_block(queries, k)
+
+
+def search_many(queries, path=INDEX_DIR, k=TOP_K, workers=None):
+    """search() for many queries, split across a process pool that memory-maps the index at `path`."""
+    workers = workers or os.cpu_count() or 1
+    size = max(1, -(-len(queries) // workers))
+    chunks = [queries[i:i + size] for i in range(0, len(queries), size)]
+    with ProcessPoolExecutor(max_workers=workers, initializer=open_worker, initargs=(path,)) as pool:
+        return [hit for part in pool.map(search_chunk, chunks, [k] * len(chunks)) for hit in part]
+
+
+def describe_source(path):
+    return {"sha256": file_digest(path), **source_state(path)}
+
+
+def source_unchanged(path, recorded):
+    """Whether `path` still matches its `recorded` describe_source(): same mtime and size, or,
+    when only the mtime moved, the same SHA-256, in which case `recorded` takes the new mtime."""
+    state = source_state(path)
+    if all(recorded.get(k) == v for k, v in state.items()):
+        return True
+    if recorded.get("size") != state["size"] or recorded.get("sha256") != file_digest(path):
+        return False
+    recorded.update(state)
+    return True
+
+
+def source_molecules(sdf_path=SDF_PATH, chembl_path=CHEMBL_PATH):
+    """(ids, smiles, {path: describe_source(path)}) for the DrugBank structures SDF and ChEMBL
+    output that exist."""
+    ids, smiles, sources = [], [], {}
+    if os.path.exists(sdf_path):
+        df = load_sdf(sdf_path)
+        df = df[df["SMILES"].astype(bool)]
+        ids += df["DRUGBANK_ID"].astype(str).tolist()
+        smiles += df["SMILES"].tolist()
+        sources[sdf_path] = describe_source(sdf_path)
+    if os.path.exists(chembl_path):
+        df = load_table(chembl_path, columns=["chembl_id", "canonical_smiles"], dtype=str, keep_default_na=False)
+        df = df[(df["canonical_smiles"] != "") & (df["chembl_id"] != "")].drop_duplicates("chembl_id")
+        ids += df["chembl_id"].tolist()
+        smiles += df["canonical_smiles"].tolist()
+        sources[chembl_path] = describe_source(chembl_path)
+    return ids, smiles, sources
+
+
+def load_index(path=INDEX_DIR, sdf_path=SDF_PATH, chembl_path=CHEMBL_PATH, refresh=False, workers=None):
+    """Open the index at `path`, rebuilding it first if the source files changed since it was built.
+
+    Sources are compared by mtime and size, and hashed only when those differ.
+    """
+    existing = [p for p in (sdf_path, chembl_path) if os.path.exists(p)]
+    if not refresh and os.path.exists(os.path.join(path, "meta.json")):
+        index = SimilarityIndex.open(path)
+        recorded = {p: dict(state) for p, state in index.sources.items()}
+        if set(recorded) == set(existing) and all(source_unchanged(p, recorded[p]) for p in existing):
+            if recorded != index.sources:
+                index.write_meta(recorded)
+            return index
+    ids, smiles, sources = source_molecules(sdf_path, chembl_path)
+    return SimilarityIndex.build(ids, smiles, path, workers=workers, sources=sources)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Find the molecules most similar to a SMILES string or indexed ID "
+                                                 "(DrugBank or ChEMBL) by Morgan-fingerprint Tanimoto")
+    parser.add_argument("queries", nargs="*", metavar="QUERY", help="SMILES strings or indexed IDs")
+    parser.add_argument("-k", type=int, default=TOP_K, help="results per query")
+    parser.add_argument("--index", default=INDEX_DIR)
+    parser.add_argument("--sdf", default=SDF_PATH, help="DrugBank structures SDF")
+    parser.add_argument("--chembl", default=CHEMBL_PATH, help="chembl_scrapper output with canonical_smiles")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--refresh", action="store_true", help="rebuild the index even if its sources are unchanged")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    index = load_index(args.index, args.sdf, args.chembl, args.refresh, args.workers)
+    print(f"{len(index)} molecules ({index.bits}-bit radius-{index.radius} Morgan) in "
+          f"{time.perf_counter() - started:.2f}s")
+    started = time.perf_counter()
+    if len(args.queries) > 1:
+        results = search_many(args.queries, args.index, args.k, args.workers)
+    else:
+        results = [index.search(q, args.k) for q in args.queries]
+    elapsed = time.perf_counter() - started
+    for query, hits in zip(args.queries, results):
+        print(query)
+        for id_, score in hits:
+            print(f"  {score:.3f}  {id_:<14} {index.smiles[index.positions[id_]]}")
+    if args.queries:
+        print(f"{len(args.queries)} queries in {elapsed * 1000:.1f} ms")
@@ -0,0 +1,127 @@
+import argparse
+import glob
+import hashlib
+import os
+import sqlite3
+import zlib
+
+STORE_PATH = "data/structures.sqlite"
+COMPRESSION_LEVEL = 9
+MMAP_SIZE = 256 * 1024 ** 2
+
+
+class StructureStore:
+    """Content-addressed, compressed store for structure images (SVG text or PNG bytes) keyed by ID.
+
+    Bodies live once each in a `blobs` table under the SHA-256 of their text, zlib-compressed;
+    an `ids` table maps each ID to its blob, so identical depictions under different IDs cost one
+    row. The database is read through SQLite's memory-mapped I/O, and `readonly` opens it for
+    serving without taking write locks.
+
+        with StructureStore() as store:
+            if cid not in store:
+                store.put(cid, svg)
+    """
+
+    def __init__(self, path=STORE_PATH, readonly=False):
+        self.path = path
+        if readonly:
+            self.db = sqlite3.connect(f"file:{path}?mode=ro", uri=True, check_same_thread=False)
+        else:
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            self.db = sqlite3.connect(path, check_same_thread=False)
+            self.db.execute("PRAGMA journal_mode=WAL")
+            self.db.execute("PRAGMA synchronous=NORMAL")
+            self.db.execute("""
+                CREATE TABLE IF NOT EXISTS blobs (
+                    hash TEXT PRIMARY KEY,
+                    data BLOB,
+                    size INTEGER
+                )
+            """)
+            self.db.execute("CREATE TABLE IF NOT EXISTS ids (id TEXT PRIMARY KEY, hash TEXT)")
+            self.db.commit()
+        self.db.execute(f"PRAGMA mmap_size={MMAP_SIZE}")
+        self.added = 0
+        self.deduplicated = 0
+
+    def __contains__(self, key):
+        return self.db.execute("SELECT 1 FROM ids WHERE id = ?", (key,)).fetchone() is not None
+
+    def __len__(self):
+        return self.db.execute("SELECT COUNT(*) FROM ids").fetchone()[0]
+
+    def put(self, key, data):
+        """Store `data` (text or bytes) under `key`, reusing the blob if the same content is already stored."""
+        raw = data.encode("utf-8") if isinstance(data, str) else data
+        digest = hashlib.sha256(raw).hexdigest()
+        if self.db.execute("SELECT 1 FROM blobs WHERE hash = ?", (digest,)).fetchone():
+            self.deduplicated += 1
+        else:
+            self.db.execute("INSERT INTO blobs VALUES (?, ?, ?)",
+                            (digest, zlib.compress(raw, COMPRESSION_LEVEL), len(raw)))
+            self.added += 1
+        self.db.execute("INSERT OR REPLACE INTO ids VALUES (?, ?)", (key, digest))
+        self.db.commit()
+        return digest
+
+    def get_bytes(self, key):
+        row = self.db.execute("SELECT b.data FROM ids i JOIN blobs b USING (hash) WHERE i.id = ?", (key,)).fetchone()
+        return zlib.decompress(row[0]) if row else None
+
+    def get(self, key):
+        data = self.get_bytes(key)
+        return data.decode("utf-8") if data is not None else None
+
+    def ids(self):
+        return [row[0] for row in self.db.execute("SELECT id FROM ids ORDER BY id")]
+
+    def import_dir(self, directory, pattern="*.svg"):
+        """Add every `{id}.svg` file under `directory`; returns the number of files read."""
+        paths = sorted(glob.glob(os.path.join(directory, pattern)))
+        for path in paths:
+            with open(path, encoding="utf-8") as f:
+                self.put(os.path.splitext(os.path.basename(path))[0], f.read())
+        return len(paths)
+
+    def stats(self):
+        ids = len(self)
+        blobs, raw, stored = self.db.execute(
+            "SELECT COUNT(*), COALESCE(SUM(size), 0), COALESCE(SUM(LENGTH(data)), 0) FROM blobs").fetchone()
+        pages = self.db.execute("PRAGMA page_count").fetchone()[0] * self.db.execute("PRAGMA page_size").fetchone()[0]
+        return {"ids": ids, "blobs": blobs, "raw_bytes": raw, "stored_bytes": stored, "file_bytes": pages}
+
+    def close(self):
+        self.db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def format_stats(store):
+    s = store.stats()
+    return (f"structures: {s['ids']} ids, {s['blobs']} unique images, {s['raw_bytes'] / 2**20:.1f} MiB of SVG "
+            f"stored in {s['stored_bytes'] / 2**20:.1f} MiB ({s['file_bytes'] / 2**20:.1f} MiB file); "
+            f"{store.added} added, {store.deduplicated} deduplicated this run")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Import, export or inspect the packed structure store")
+    parser.add_argument("--db", default=STORE_PATH)
+    parser.add_argument("--import-dir", action="append", default=[], metavar="DIR",
+                        help="add the {id}.svg files in DIR (repeatable)")
+    parser.add_argument("--export", nargs=2, metavar=("ID", "PATH"), help="write one structure back out as SVG")
+    args = parser.parse_args()
+    with StructureStore(args.db) as store:
+        for directory in args.import_dir:
+            print(f"{directory}: {store.import_dir(directory)} files")
+        if args.export:
+            svg = store.get(args.export[0])
+            if svg is None:
+                parser.error(f"{args.export[0]} is not in {args.db}")
+            with open(args.export[1], "w", encoding="utf-8") as f:
+                f.write(svg)
+        print(format_stats(store))
@@ -0,0 +1,116 @@
+import argparse
+import hashlib
+import json
+import os
+import time
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+from pyarrow import feather
+
+from sdf_ingest import CACHE_DIR, file_digest
+
+SIDECAR_VERSION = 1
+EXCEL_SUFFIXES = (".xlsx", ".xlsm", ".xls")
+
+
+def read_source(path, **options):
+    if path.lower().endswith(EXCEL_SUFFIXES):
+        return pd.read_excel(path, **options)
+    return pd.read_csv(path, **options)
+
+
+def arrow_safe(df):
+    """Object columns Arrow cannot type (a workbook column mixing numbers and text) become str."""
+    for column in df.columns[df.dtypes == object]:
+        try:
+            pa.array(df[column], from_pandas=True)
+        except (pa.ArrowInvalid, pa.ArrowTypeError):
+            df[column] = df[column].map(lambda v: v if pd.isna(v) else str(v))
+    return df
+
+
+def sidecar_paths(path, options, cache_dir=CACHE_DIR):
+    """The Arrow file and manifest caching `path` as read with `options`."""
+    key = hashlib.sha256(json.dumps([os.path.abspath(path), options], sort_keys=True, default=str).encode()).hexdigest()
+    stem = os.path.basename(path).replace(" ", "_")
+    base = os.path.join(cache_dir, f"{stem}-{key[:16]}")
+    return base + ".arrow", base + ".json"
+
+
+def source_state(path):
+    st = os.stat(path)
+    return {"mtime_ns": st.st_mtime_ns, "size": st.st_size}
+
+
+def sidecar_valid(path, manifest_path):
+    """Whether the manifest still describes `path`: same mtime and size, or, when only the mtime
+    moved (a copy or checkout), the same SHA-256, in which case the manifest's mtime is updated."""
+    if not os.path.exists(manifest_path):
+        return False
+    with open(manifest_path, encoding="utf-8") as f:
+        manifest = json.load(f)
+    if manifest.get("version") != SIDECAR_VERSION:
+        return False
+    state = source_state(path)
+    if all(manifest.get(k) == v for k, v in state.items()):
+        return True
+    if manifest.get("size") != state["size"] or manifest.get("sha256") != file_digest(path):
+        return False
+    write_manifest(manifest_path, {**manifest, **state})
+    return True
+
+
+def write_manifest(manifest_path, manifest):
+    tmp = manifest_path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(tmp, manifest_path)
+
+
+def build_sidecar(path, arrow_path, manifest_path, options):
+    state = source_state(path)
+    digest = file_digest(path)
+    table = pa.Table.from_pandas(arrow_safe(read_source(path, **options)), preserve_index=False)
+    os.makedirs(os.path.dirname(arrow_path), exist_ok=True)
+    tmp = arrow_path + ".tmp"
+    # Uncompressed so later loads can map the buffers straight from the page cache.
+    feather.write_feather(table, tmp, compression="uncompressed")
+    os.replace(tmp, arrow_path)
+    write_manifest(manifest_path, {"version": SIDECAR_VERSION, "source": path, "options": repr(options),
+                                   "sha256": digest, "rows": table.num_rows, **state})
+
+
+def load_table(path, columns=None, cache_dir=CACHE_DIR, refresh=False, **options):
+    """Read a CSV or Excel file through a typed Arrow sidecar under `cache_dir`.
+
+    The first load parses the source with pandas (`options` go to read_csv/read_excel and are part
+    of the cache key) and writes an uncompressed Arrow IPC copy. Later loads check the source's
+    mtime and size, falling back to its SHA-256 when only the mtime changed, and memory-map the
+    sidecar, reading only `columns` when given.
+
+        vocab = load_table("data/drugbank vocabulary.csv", columns=["DrugBank ID", "UNII"])
+    """
+    arrow_path, manifest_path = sidecar_paths(path, options, cache_dir)
+    if refresh or not os.path.exists(arrow_path) or not sidecar_valid(path, manifest_path):
+        build_sidecar(path, arrow_path, manifest_path, options)
+    table = feather.read_table(arrow_path, columns=columns, memory_map=True)
+    df = table.to_pandas()
+    # Arrow hands missing strings back as None; pandas readers give NaN.
+    for column in df.columns[df.dtypes == object]:
+        df[column] = df[column].where(df[column].notna(), np.nan)
+    return df
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build or refresh the Arrow sidecars of CSV and Excel inputs")
+    parser.add_argument("paths", nargs="*", default=["data/drug_list.csv", "data/drugbank vocabulary.csv",
+                                                     "data/medicines_output_medicines_en.xlsx"])
+    parser.add_argument("--column", action="append", help="only load this column (repeatable)")
+    parser.add_argument("--refresh", action="store_true", help="rebuild even if the sidecar is current")
+    args = parser.parse_args()
+    for path in args.paths:
+        started = time.perf_counter()
+        df = load_table(path, columns=args.column, refresh=args.refresh)
+        print(f"{path}: {len(df)} rows, {len(df.columns)} columns in {time.perf_counter() - started:.3f}s")